@@ -2,24 +2,37 @@ from qfluentwidgets import FluentWindow, NavigationItemPosition
 from qfluentwidgets import FluentIcon as FIF
 from app.ui.widgets.room_management_widget import RoomManagementWidget
 from app.ui.widgets.join_room_widget import JoinRoomWidget
-from app.ui.widgets.camera_preview_widget import CameraPreviewWidget
-from app.ui.widgets.microphone_widget import MicrophoneWidget
-from app.ui.widgets.audio_publisher_widget import AudioPublisherWidget
-from app.services.livekit_service import join_livekit_room
+from app.core.reconnect import ReconnectPolicy, should_reconnect
+from app.core.session_manager import SessionManager
+from app.core.subscription_policy import SubscriptionEngine, SubscriptionPolicy, VIDEO_VISIBLE
+from app.core.track_index import TrackIndex
+from app.services.latency_probe import PROBE_TOPIC
+from app.services.history_store import HistoryStore
+from app.services.speaker_detector import SpeakerDetector
+from app.services.livekit_service import make_access_token, prewarm_connection
+from app.services.media_workers import MediaWorkerPool, media_worker_count, worker_credentials
+from app.ui.lazy_page import LazyPage
+from app.ui.qt_bridge import QtBridge
+from app.utils.lazy_import import lazy_import
 from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.utils.loop_monitor import LoopMonitor
+from app.utils.media_loop import MediaLoop
+from app.utils.resource_usage import format_bytes
 from livekit.rtc import ChatManager, TrackKind
 import asyncio
 import traceback
 from livekit import rtc
 from livekit.rtc import Room, RemoteParticipant, RemoteTrackPublication, RemoteAudioTrack, RemoteVideoTrack, TrackKind
 from app.ui.widgets.subscribed_tracks_widget import SubscribedTracksWidget
-from PyQt5.QtMultimedia import QAudioOutput, QAudioFormat
-from PyQt5.QtCore import QBuffer, QByteArray, QMetaObject, Qt, Q_ARG
-import numpy as np
+from PyQt5.QtCore import QBuffer, QByteArray, QMetaObject, Qt, Q_ARG, QTimer
 import wave
 import os
+import time
 from datetime import datetime
 
+np = lazy_import('numpy')
+
 class LiveKitManager(FluentWindow):
     def __init__(self):
         super().__init__()
@@ -33,20 +46,26 @@ class LiveKitManager(FluentWindow):
         self.join_room = JoinRoomWidget(self)
         self.join_room.setObjectName("joinRoomWidget")
 
-        self.camera_preview = CameraPreviewWidget(self)
+        # 摄像头、麦克风、音频发布页面第一次打开时才构建 (以及导入 QtMultimedia、pydub)，
+        # 构建前的房间状态更新会在构建后补上
+        self.camera_preview = LazyPage(self.create_camera_preview, self, deferred=('update_room_status',))
         self.camera_preview.setObjectName("cameraPreviewWidget")
 
-        self.microphone_widget = MicrophoneWidget(self)
+        self.microphone_widget = LazyPage(self.create_microphone_widget, self, deferred=('update_room_status',))
         self.microphone_widget.setObjectName("microphoneWidget")
 
-        self.audio_publisher = AudioPublisherWidget(self)
+        self.audio_publisher = LazyPage(self.create_audio_publisher, self, deferred=('update_room_status',))
         self.audio_publisher.setObjectName("audioPublisherWidget")
 
+        self.screen_share = LazyPage(self.create_screen_share, self, deferred=('update_room_status',))
+        self.screen_share.setObjectName("screenShareWidget")
+
         self.addSubInterface(self.room_management, icon=FIF.HOME, text="房间管理")
         self.addSubInterface(self.join_room, icon=FIF.VIDEO, text="加入房间")
         self.addSubInterface(self.camera_preview, icon=FIF.CAMERA, text="摄像头预览")
         self.addSubInterface(self.microphone_widget, icon=FIF.MICROPHONE, text="麦克风")
         self.addSubInterface(self.audio_publisher, icon=FIF.MUSIC, text="布音频")
+        self.addSubInterface(self.screen_share, icon=FIF.PROJECTOR, text="屏幕共享")
 
         # 设置侧边栏样式
         self.navigationInterface.setExpandWidth(200)
@@ -55,9 +74,51 @@ class LiveKitManager(FluentWindow):
         # 连接信号到槽
         self.join_room.join_room_signal.connect(self.on_join_room)
         self.join_room.refresh_signal.connect(self.refresh_room_info)  # 连接刷新信号
-        self.current_room = None
         self.room_connected = False
-        self.chat_manager = None
+
+        # 可以同时连接多个房间，每个房间的事件、轨道索引和媒体任务由各自的会话维护；
+        # 已订阅轨道页面 (渲染与音频输出) 由所有房间共享。
+        # Room 和所有音视频流的消费都在独立的媒体线程上，房间事件经 bridge 按顺序转到界面线程处理
+        self.media = MediaLoop()
+        self.media.start()
+        self.bridge = QtBridge(self)
+        self.sessions = SessionManager(loop=self.media.loop, post=self.bridge.post)
+        # 开启后播放的轨道由独立的工作进程订阅和解码 (见 media_workers_for)
+        self.worker_processes = media_worker_count()
+        self._empty_track_index = TrackIndex()
+        self.join_room.switch_room_signal.connect(self.on_switch_room)
+        self.join_room.leave_room_signal.connect(self.on_leave_room)
+
+        # 断线后自动重连；加入前可以预热连接
+        self.reconnect_policy = ReconnectPolicy()
+        self.media_session_key = None
+        self.prewarmed = None
+        self.prewarm_task = None
+        self.join_room.prewarm_signal.connect(self.on_prewarm)
+
+        # 订阅策略：定期按发言者/可见画面重新评估 (滞回在引擎内部处理)
+        self.subscription_timer = QTimer(self)
+        self.subscription_timer.timeout.connect(self.apply_all_subscription_policies)
+        self.subscription_timer.start(1000)
+
+        # 本地发言者检测：所有已订阅音频轨道每 100ms 做一次能量排名 (在媒体线程上创建和运行，见 detect_speakers)
+        self.speaker_detector = None
+
+        # 定期统计每个房间的内存与 CPU 开销
+        self.resource_timer = QTimer(self)
+        self.resource_timer.timeout.connect(self.update_resource_report)
+        self.resource_timer.start(5000)
+
+        # 聊天和房间事件持久化到本地 SQLite
+        self.history = HistoryStore()
+        self.history.start()
+        self.join_room.load_history_signal.connect(self.on_load_history)
+
+        # 房间事件只标记参与者表格为脏，同一 UI 帧内的多个事件合并成一次刷新
+        self.participants_update_timer = QTimer(self)
+        self.participants_update_timer.setSingleShot(True)
+        self.participants_update_timer.setInterval(16)
+        self.participants_update_timer.timeout.connect(self.flush_participants_update)
 
         # 连接阅号
         self.join_room.subscribe_track_signal.connect(self.on_subscribe_track)
@@ -69,120 +130,502 @@ class LiveKitManager(FluentWindow):
 
         self.audio_output = None
         self.audio_buffer = None
-        self.audio_tasks = {}
-        self.video_tasks = {}
 
         self.loop = asyncio.get_event_loop()
 
+        # 音视频和界面共用一个 qasync 事件循环，持续监控循环延迟并记录慢回调
+        self.loop_monitor = LoopMonitor()
+        self.loop_monitor.start(self.loop)
+        self.loop_monitor_page = LazyPage(self.create_loop_monitor_page, self)
+        self.loop_monitor_page.setObjectName("loopMonitorWidget")
+        self.addSubInterface(self.loop_monitor_page, icon=FIF.SPEED_HIGH, text="事件循环",
+                             position=NavigationItemPosition.BOTTOM)
+
         self.subscribed_tracks.play_track_signal.connect(self.on_play_track)
         self.subscribed_tracks.record_track_signal.connect(self.on_record_track)
         self.subscribed_tracks.stop_track_signal.connect(self.stop_track)
 
+        self.media.submit(self.detect_speakers())
+
+    def create_camera_preview(self):
+        from app.ui.widgets.camera_preview_widget import CameraPreviewWidget
+        page = CameraPreviewWidget(self)
+        page.setObjectName("cameraPreviewPage")
+        return page
+
+    def create_microphone_widget(self):
+        from app.ui.widgets.microphone_widget import MicrophoneWidget
+        page = MicrophoneWidget(self)
+        page.setObjectName("microphonePage")
+        return page
+
+    def create_audio_publisher(self):
+        from app.ui.widgets.audio_publisher_widget import AudioPublisherWidget
+        page = AudioPublisherWidget(self)
+        page.setObjectName("audioPublisherPage")
+        return page
+
+    def create_screen_share(self):
+        from app.ui.widgets.screen_share_widget import ScreenShareWidget
+        page = ScreenShareWidget(self)
+        page.setObjectName("screenSharePage")
+        return page
+
+    def create_loop_monitor_page(self):
+        from app.ui.widgets.loop_monitor_widget import LoopMonitorWidget
+        page = LoopMonitorWidget(self.loop_monitor, self)
+        page.setObjectName("loopMonitorPage")
+        return page
+
     def on_join_room(self, url, token):
         asyncio.ensure_future(self.async_join_room(url, token))
 
+    @property
+    def current_room(self):
+        session = self.sessions.active
+        return session.room if session else None
+
+    @property
+    def track_index(self):
+        session = self.sessions.active
+        return session.track_index if session else self._empty_track_index
+
     async def async_join_room(self, url, token):
+        first_room = len(self.sessions) == 0
         try:
             logger.info(f"尝试加入房间: {url}")
-            self.current_room = await join_livekit_room(url, token)
-            logger.info("成功创建房间对象")
+            options = self.join_room.subscription_options()
+            policy = SubscriptionPolicy.from_name(options.pop('name'), **options)
+            session = await self.sessions.join(url, token, listener=self, room=self.take_prewarmed_room(url),
+                                               auto_subscribe=policy.auto_subscribe)
+            if not policy.auto_subscribe:
+                session.subscription = SubscriptionEngine(policy)
+                self.add_policy_placeholders(session)
+                self.apply_subscription_policy(session)
+            self.sessions.set_active(session.key)
+            logger.info(f"成功创建房间对象: {session.key}")
             
-            self.join_room.show_success_message("成功加入房间")
+            self.join_room.show_success_message(f"成功加入房间 {session.key}")
             logger.info("显示成功消息")
             
             self.room_connected = True
-            self.camera_preview.update_room_status(True)
-            self.microphone_widget.update_room_status(True)
-            self.audio_publisher.update_room_status(True, self.current_room)
+            if first_room:
+                # 摄像头、麦克风和音频发布只绑定到第一个加入的房间
+                self.media_session_key = session.key
+                self.camera_preview.update_room_status(True)
+                self.microphone_widget.update_room_status(True)
+                self.audio_publisher.update_room_status(True, session.room)
+                self.screen_share.update_room_status(True, session.room)
             logger.info("更新房间连接状态和各个组件状态")
             
             # 初始化 ChatManager
-            self.chat_manager = ChatManager(self.current_room)
+            session.chat_manager = self.create_chat_manager(session)
             logger.info("初始化 ChatManager")
             
-            # 设置消息接收监听器
-            @self.chat_manager.on("message_received")
-            def on_message_received(message):
-                chat_message = f"收到消息: {message.message}"
-                self.join_room.add_chat_message(chat_message)
-            
             # 更新参与者信息
             await self.update_participants_info()
             
-            # 设置房间事件监听器
-            self.current_room.on("participant_connected", self.on_participant_connected)
-            self.current_room.on("participant_disconnected", self.on_participant_disconnected)
-            self.current_room.on("local_track_published", self.on_local_track_published)
-            self.current_room.on("local_track_unpublished", self.on_local_track_unpublished)
-            self.current_room.on("track_published", self.on_track_published)
-            self.current_room.on("track_unpublished", self.on_track_unpublished)
-            self.current_room.on("track_subscribed", self.on_track_subscribed)
-            self.current_room.on("track_unsubscribed", self.on_track_unsubscribed)
-            
             logger.info("成功加入房间并设置了所有事件监听器")
             
             # 更新 JoinRoomWidget 的连接状态
+            self.join_room.update_sessions(list(self.sessions.sessions), self.sessions.active_key)
             self.join_room.update_connection_status(True)
             
         except Exception as e:
             error_message = f"加入房间时发生错误: {str(e)}"
             logger.error(f"{error_message}\n{traceback.format_exc()}")
             self.join_room.show_error_message(error_message)
+            if not self.sessions:
+                self.room_connected = False
+                self.camera_preview.update_room_status(False)
+                self.microphone_widget.update_room_status(False)
+                self.audio_publisher.update_room_status(False, None)
+                self.screen_share.update_room_status(False, None)
+                self.join_room.update_connection_status(False)
+
+    def apply_subscription_policy(self, session):
+        engine = session.subscription
+        if engine is None or session.reconnecting:
+            return
+        if engine.policy.video == VIDEO_VISIBLE:
+            engine.update_visible(self.subscribed_tracks.visible_track_ids())
+        if engine.apply(session.track_index):
+            self.session_changed(session)
+
+    def apply_all_subscription_policies(self):
+        for session in self.sessions:
+            self.apply_subscription_policy(session)
+
+    def add_policy_placeholders(self, session, entries=None):
+        # “只订阅可见画面”时，未订阅的视频轨道也先放一个卡片，滚动到可见区域后才订阅
+        engine = session.subscription
+        if engine is None or engine.policy.video != VIDEO_VISIBLE:
+            return
+        for entry in entries if entries is not None else session.track_index.tracks.values():
+            if entry.kind == TrackKind.KIND_VIDEO and engine.allowed(entry.participant.identity):
+                self.subscribed_tracks.add_track(entry.participant.identity, entry.sid, "Video")
+
+    def keeps_placeholder(self, session, track_id):
+        engine = session.subscription
+        return engine is not None and engine.policy.video == VIDEO_VISIBLE and track_id in session.track_index
+
+    async def consume_stream(self, open_stream, consumer, *args):
+        # 在媒体线程上调用：流在这里创建，才会绑定到媒体事件循环
+        return await consumer(open_stream(), *args)
+
+    async def consume_ring(self, workers, track_id, ring, consumer):
+        # 在媒体线程上读取工作进程写入共享内存的帧，读完再释放共享内存
+        try:
+            return await consumer(ring, track_id)
+        finally:
+            workers.release(track_id, ring)
+
+    def media_workers_for(self, session):
+        # 工作进程以隐藏参与者身份各自入会，需要 API 密钥签发令牌；没有配置时退回进程内解码
+        if session.media_workers is None and self.worker_processes:
+            credentials = worker_credentials()
+            if credentials is None:
+                logger.warning("开启了多进程解码但没有设置 LIVEKIT_API_KEY/LIVEKIT_API_SECRET，改为在本进程内解码")
+                self.worker_processes = 0
+                return None
+            room_name = session.room.name
+            identity = session.room.local_participant.identity
+
+            def make_token(index):
+                return make_access_token(*credentials, room_name, f"{identity}-media-{index}",
+                                         hidden=True, can_publish=False)
+
+            session.media_workers = MediaWorkerPool(session.url, make_token, self.worker_processes)
+            session.media_workers.start()
+        return session.media_workers
+
+    def play_in_workers(self, session, track_id, track_type):
+        workers = self.media_workers_for(session)
+        if workers is None:
+            return False
+        try:
+            ring = workers.open(track_id, track_type)
+        except Exception:
+            logger.error(f"交给媒体工作进程播放失败，改为在本进程内解码: \n{traceback.format_exc()}")
+            return False
+        if track_type == "Audio":
+            consumer, tasks = self.subscribed_tracks.play_audio_ring, session.audio_tasks
+        else:
+            consumer, tasks = self.subscribed_tracks.play_video_ring, session.video_tasks
+        tasks[track_id] = self.media.submit(self.consume_ring(workers, track_id, ring, consumer))
+        return True
+
+    async def meter_audio(self, session, track_id, identity, track):
+        # 以 16kHz 单声道读取音频，只做能量统计；队列有上限，处理不过来时丢弃旧帧。
+        # 检测器按轨道分行，排名按参与者合并：一个参与者的多条音频轨道互不干扰，取消订阅其中一条也不影响其他
+        key, speaker = (session.key, track_id), (session.key, identity)
+        audio_stream = rtc.AudioStream(track=track, sample_rate=self.speaker_detector.sample_rate, num_channels=1, capacity=10)
+        try:
+            async for frame_event in audio_stream:
+                self.speaker_detector.feed(key, np.frombuffer(frame_event.frame.data, dtype=np.int16), speaker)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.error(f"读取发言者检测音频时发生错误: \n{traceback.format_exc()}")
+        finally:
+            self.speaker_detector.remove(key)
+            await audio_stream.aclose()
+
+    async def detect_speakers(self):
+        # 检测器的写入 (meter_audio) 和排名都在媒体线程上；界面忙时多次排名只处理最新一次。
+        # 检测器在这里创建，numpy 在媒体线程上第一次加载，不占用界面启动时间
+        self.speaker_detector = SpeakerDetector()
+        while True:
+            await asyncio.sleep(0.1)
+            ranking = self.speaker_detector.tick()
+            self.bridge.post(self.update_speakers, ranking, key='speakers')
+
+    def update_speakers(self, ranking):
+        if not ranking and not self.subscribed_tracks.speaking:
+            return
+        self.subscribed_tracks.apply_speaker_ranking([identity for (_, identity), _ in ranking])
+        # 本地检测的结果也作为订阅策略的发言者排名 (与 SDK 的 active_speakers_changed 相互补充)
+        for session in self.sessions:
+            if session.subscription:
+                local = [identity for (key, identity), _ in ranking if key == session.key]
+                if local:
+                    session.subscription.update_speakers(local)
+
+    def on_active_speakers_changed(self, session, speakers):
+        if session.subscription:
+            session.subscription.update_speakers([p.identity for p in speakers if p.identity != session.room.local_participant.identity])
+            self.apply_subscription_policy(session)
+
+    def on_prewarm(self, url, token):
+        if self.prewarm_task and not self.prewarm_task.done():
+            self.prewarm_task.cancel()
+        self.prewarm_task = asyncio.ensure_future(self.async_prewarm(url, token))
+
+    async def async_prewarm(self, url, token):
+        try:
+            room, timings = await prewarm_connection(url, token, loop=self.media.loop)
+            self.prewarmed = (url, room)
+            logger.info(f"预热连接完成: {url}, 耗时: {timings}")
+            if timings.get('validate_status', 200) != 200:
+                self.join_room.update_connection_state(f"预热完成，但令牌校验返回 {timings['validate_status']}")
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # 预热失败不影响正常加入
+            logger.warning(f"预热连接失败: \n{traceback.format_exc()}")
+
+    def take_prewarmed_room(self, url):
+        # 预热时创建的 Room 只用于同一个 URL 的下一次加入
+        prewarmed, self.prewarmed = self.prewarmed, None
+        if prewarmed and prewarmed[0] == url:
+            return prewarmed[1]
+        return None
+
+    def on_disconnected(self, session, reason):
+        if session.reconnecting or self.sessions.get(session.key) is not session:
+            return
+        if not should_reconnect(reason):
+            logger.info(f"房间 {session.key} 已断开，原因: {reason}，不再重连")
+            self.add_room_event(session, "连接断开", f"原因: {reason}")
+            asyncio.ensure_future(self.async_leave_room(session.key))
+            return
+        logger.warning(f"房间 {session.key} 连接断开，原因: {reason}，开始自动重连")
+        self.add_room_event(session, "连接断开", f"原因: {reason}，正在重连")
+        asyncio.ensure_future(self.async_reconnect_session(session))
+
+    def on_reconnecting(self, session):
+        # SDK 自身的快速恢复 (ICE 重启/信令恢复)，成功后媒体流不受影响
+        self.add_room_event(session, "正在重连", "连接中断，SDK 正在尝试恢复")
+        self.join_room.update_connection_state(f"{session.key}: 正在重连...")
+
+    def on_reconnected(self, session):
+        self.add_room_event(session, "已重连", "连接已恢复")
+        self.join_room.update_connection_state("")
+
+    async def async_reconnect_session(self, session):
+        snapshot = session.snapshot()
+
+        def on_attempt(session, attempt, delay):
+            self.join_room.update_connection_state(f"{session.key}: 第 {attempt + 1} 次重连，{delay:.1f} 秒后开始")
+
+        started = time.monotonic()
+        session.reconnect_snapshot = snapshot
+        try:
+            ok = await self.sessions.reconnect(session, self.reconnect_policy, on_attempt)
+        finally:
+            session.reconnect_snapshot = None
+        if not ok:
+            if self.sessions.get(session.key) is session:
+                self.join_room.show_error_message(f"房间 {session.key} 重连失败")
+                await self.async_leave_room(session.key)
+            return
+
+        # 只恢复断线前的订阅和播放/录制，已有的轨道卡片原地保留
+        renamed, lost = session.restore(snapshot)
+        for old_id, new_id in renamed.items():
+            self.subscribed_tracks.rename_track(old_id, new_id)
+        for track_id in lost:
+            self.subscribed_tracks.remove_track(track_id)
+        for track_id in list(session.pending_media):
+            publication = session.track_index.get_publication(track_id)
+            if publication and publication.track:
+                self.resume_media(session, track_id)
+
+        if session.key == self.media_session_key:
+            self.audio_publisher.update_room_status(True, session.room)
+            self.screen_share.update_room_status(True, session.room)
+        session.chat_manager = self.create_chat_manager(session)
+        elapsed = time.monotonic() - started
+        self.add_room_event(session, "已重连", f"耗时 {elapsed:.2f} 秒，恢复 {len(snapshot) - len(lost)} 条轨道")
+        self.join_room.update_connection_state("")
+        self.session_changed(session)
+
+    def resume_media(self, session, track_id):
+        media = session.take_pending_media(track_id)
+        if not media:
+            return
+        if media['play']:
+            asyncio.ensure_future(self._async_play_track(track_id, media['play']))
+        if media['record']:
+            asyncio.ensure_future(self._async_record_track(track_id, media['record']))
+
+    def on_switch_room(self, key):
+        if self.sessions.get(key) and key != self.sessions.active_key:
+            self.sessions.set_active(key)
+            logger.info(f"切换当前房间: {key}")
+            self.schedule_participants_update()
+
+    def on_leave_room(self, key):
+        asyncio.ensure_future(self.async_leave_room(key))
+
+    async def async_leave_room(self, key):
+        session = self.sessions.get(key)
+        if not session:
+            return
+        for track_id in list(session.track_index.tracks):
+            self.subscribed_tracks.remove_track(track_id)
+        await self.sessions.leave(key)
+        self.join_room.update_sessions(list(self.sessions.sessions), self.sessions.active_key)
+        self.schedule_participants_update()
+        if not self.sessions:
             self.room_connected = False
+            self.media_session_key = None
             self.camera_preview.update_room_status(False)
             self.microphone_widget.update_room_status(False)
             self.audio_publisher.update_room_status(False, None)
+            self.screen_share.update_room_status(False, None)
+        elif key == self.media_session_key:
+            # 文件音频和屏幕共享所在的房间离开了：停掉旧房间里的发布，改绑到当前房间
+            session = self.sessions.active
+            self.media_session_key = session.key
+            self.audio_publisher.update_room_status(False, None)
+            self.screen_share.update_room_status(False, None)
+            self.audio_publisher.update_room_status(True, session.room)
+            self.screen_share.update_room_status(True, session.room)
+            self.join_room.update_tracks_table([])
             self.join_room.update_connection_status(False)
 
-    def on_participant_connected(self, participant: RemoteParticipant):
+    def update_resource_report(self):
+        if not self.sessions:
+            return
+        report = self.sessions.resource_report()
+        cpu = f"{report['cpu_percent']}%" if report['cpu_percent'] is not None else "未知"
+        self.join_room.update_resource_stats(
+            f"房间数: {report['rooms']}  内存: {format_bytes(report['rss'])}  "
+            f"每个房间约: {format_bytes(report['rss_per_room'])}  CPU: {cpu}")
+        metrics.gauge("process_resident_memory_bytes", "进程常驻内存").set(report['rss'] or 0)
+        for item in report['sessions']:
+            metrics.gauge("room_participants", "房间参与者数", room=item['key']).set(item['participants'])
+            metrics.gauge("room_tracks", "房间轨道数", room=item['key']).set(item['tracks'])
+            logger.debug(f"房间 {item['key']}: 参与者 {item['participants']}, 轨道 {item['tracks']}, "
+                         f"加入时内存增量 {format_bytes(item['join_rss_delta'])}, "
+                         f"事件处理 CPU {item['handler_cpu_percent']}%")
+
+    def create_chat_manager(self, session):
+        chat_manager = ChatManager(session.room)
+
+        # 设置消息接收监听器
+        # ChatManager 的回调在媒体线程上触发，转到界面线程再处理
+        @chat_manager.on("message_received")
+        def on_message_received(message):
+            self.bridge.post(handle_message, message)
+
+        def handle_message(message):
+            chat_message = f"收到消息: {message.message}"
+            self.join_room.add_chat_message(self.format_room_message(session, chat_message))
+            identity = message.participant.identity if message.participant else None
+            self.history.record(session.name, 'chat', chat_message, identity)
+
+        return chat_manager
+
+    def format_room_message(self, session, message):
+        # 同时连接多个房间时在消息前标注来源房间
+        return f"[{session.key}] {message}" if len(self.sessions) > 1 else message
+
+    def session_changed(self, session):
+        if session is self.sessions.active:
+            self.schedule_participants_update()
+
+    def add_room_event(self, session, event_type, details, participant=None):
+        self.join_room.add_room_event(event_type, details, session.key if len(self.sessions) > 1 else None)
+        self.history.record(session.name, 'event', f"房间事件: {event_type} | 详情: {details}", participant)
+
+    def on_load_history(self):
+        session = self.sessions.active
+        if not session:
+            self.join_room.show_error_message("未连接到房间")
+            return
+        try:
+            records = self.history.page(room=session.name, before=session.history_cursor, limit=100)
+        except Exception as e:
+            logger.error(f"读取历史记录时发生错误: {traceback.format_exc()}")
+            self.join_room.show_error_message(f"读取历史记录失败: {str(e)}")
+            return
+        if not records:
+            self.join_room.show_success_message("没有更早的记录")
+            return
+        if self.join_room.prepend_history(records):
+            session.history_cursor = (records[-1]['ts'], records[-1]['id'])
+
+    def on_participant_connected(self, session, participant: RemoteParticipant):
         logger.info(f"参与者 {participant.identity} 已连接")
-        self.join_room.add_room_event("参与者连接", f"参与者 {participant.identity} 已连接")
-        asyncio.create_task(self.update_participants_info())
+        session.track_index.add_participant(participant)
+        self.add_room_event(session, "参与者连接", f"参与者 {participant.identity} 已连接", participant.identity)
+        self.session_changed(session)
 
-    def on_participant_disconnected(self, participant: RemoteParticipant):
+    def on_participant_disconnected(self, session, participant: RemoteParticipant):
         logger.info(f"参与者 {participant.identity} 已断开连接")
-        self.join_room.add_room_event("参与断开连接", f"参与者 {participant.identity} 已断开连接")
-        asyncio.create_task(self.update_participants_info())
+        session.track_index.remove_participant(participant)
+        self.add_room_event(session, "参与断开连接", f"参与者 {participant.identity} 已断开连接", participant.identity)
+        self.session_changed(session)
 
-    def on_local_track_published(self, publication, track):
+    def on_local_track_published(self, session, publication, track):
         logger.info(f"本地轨道已发布: {publication.sid}")
-        self.join_room.add_room_event("本地轨道发布", f"轨道 {publication.sid} 已发布")
-        asyncio.create_task(self.update_participants_info())
+        self.add_room_event(session, "本地轨道发布", f"轨道 {publication.sid} 已发布")
+        self.session_changed(session)
 
-    def on_local_track_unpublished(self, publication):
+    def on_local_track_unpublished(self, session, publication):
         logger.info(f"本地轨道已取消发布: {publication.sid}")
-        self.join_room.add_room_event("本地轨道取消发布", f"轨道 {publication.sid} 已取消发布")
-        asyncio.create_task(self.update_participants_info())
+        self.add_room_event(session, "本地轨道取消发布", f"轨道 {publication.sid} 已取消发布")
+        self.session_changed(session)
 
-    def on_track_published(self, publication: RemoteTrackPublication, participant: RemoteParticipant):
+    def on_track_published(self, session, publication: RemoteTrackPublication, participant: RemoteParticipant):
         logger.info(f"轨道已发布: {publication.sid} 来自 {participant.identity}")
-        self.join_room.add_room_event("轨道发布", f"轨道 {publication.sid} 已由 {participant.identity} 发布")
-        asyncio.create_task(self.update_participants_info())
-
-    def on_track_unpublished(self, publication: RemoteTrackPublication, participant: RemoteParticipant):
+        session.track_index.add_publication(publication, participant)
+        self.add_room_event(session, "轨道发布", f"轨道 {publication.sid} 已由 {participant.identity} 发布", participant.identity)
+        if session.subscription:
+            self.add_policy_placeholders(session, [session.track_index.get(publication.sid)])
+            self.apply_subscription_policy(session)
+        self.session_changed(session)
+
+    def on_track_unpublished(self, session, publication: RemoteTrackPublication, participant: RemoteParticipant):
         logger.info(f"轨道已取消发布: {publication.sid} 来自 {participant.identity}")
-        self.join_room.add_room_event("轨道取消发布", f"轨道 {publication.sid} 已由 {participant.identity} 取消发布")
-        asyncio.create_task(self.update_participants_info())
+        session.track_index.remove_publication(publication, participant)
+        self.add_room_event(session, "轨道取消发布", f"轨道 {publication.sid} 已由 {participant.identity} 取消发布", participant.identity)
+        # 订阅策略放置的占位卡片随轨道取消发布一起移除
+        self.subscribed_tracks.remove_track(publication.sid)
+        self.session_changed(session)
 
-    def on_track_subscribed(self, track, publication: RemoteTrackPublication, participant: RemoteParticipant):
+    def on_track_subscribed(self, session, track, publication: RemoteTrackPublication, participant: RemoteParticipant):
         logger.info(f"已订阅轨道: {publication.sid} 来自 {participant.identity}")
-        self.join_room.add_room_event("轨道订阅", f"已订阅来自 {participant.identity} 的轨道 {publication.sid}")
+        self.add_room_event(session, "轨道订阅", f"已订阅来自 {participant.identity} 的轨道 {publication.sid}", participant.identity)
+        # 重连过程中 (restore 之前) 就订阅到的轨道沿用断线前的卡片，延迟统计和曲线都保留
+        previous_sid = session.previous_sid(publication, participant)
+        if previous_sid:
+            self.subscribed_tracks.rename_track(previous_sid, publication.sid)
         self.subscribed_tracks.add_track(participant.identity, publication.sid, "Audio" if publication.kind == TrackKind.KIND_AUDIO else "Video")
-        asyncio.create_task(self.update_participants_info())
-
-    def on_track_unsubscribed(self, track, publication: RemoteTrackPublication, participant: RemoteParticipant):
+        # 重连后等待轨道就绪的播放/录制在这里恢复
+        self.resume_media(session, publication.sid)
+        if publication.kind == TrackKind.KIND_AUDIO:
+            session.cancel_meter(publication.sid)
+            session.meter_tasks[publication.sid] = self.media.submit(
+                self.meter_audio(session, publication.sid, participant.identity, track))
+        self.session_changed(session)
+
+    def on_track_unsubscribed(self, session, track, publication: RemoteTrackPublication, participant: RemoteParticipant):
         logger.info(f"已取订阅轨道: {publication.sid} 来自 {participant.identity}")
-        self.join_room.add_room_event("轨道取���订阅", f"已取消订阅来自 {participant.identity} 的轨道 {publication.sid}")
+        self.add_room_event(session, "轨道取���订阅", f"已取消订阅来自 {participant.identity} 的轨道 {publication.sid}", participant.identity)
         
-        if publication.sid in self.audio_tasks:
-            self.audio_tasks[publication.sid].cancel()
-            del self.audio_tasks[publication.sid]
-        if publication.sid in self.video_tasks:
-            self.video_tasks[publication.sid].cancel()
-            del self.video_tasks[publication.sid]
+        session.cancel_track_tasks(publication.sid)
+        session.cancel_meter(publication.sid)
+        session.playing.pop(publication.sid, None)
+        session.recording.pop(publication.sid, None)
         
-        self.subscribed_tracks.remove_track(publication.sid)
-        asyncio.create_task(self.update_participants_info())
+        if not self.keeps_placeholder(session, publication.sid):
+            self.subscribed_tracks.remove_track(publication.sid)
+        self.session_changed(session)
+
+    def on_data_received(self, session, packet):
+        # 延迟探针消息交给已订阅轨道页面与音频起音配对
+        if packet.topic == PROBE_TOPIC and packet.participant:
+            self.subscribed_tracks.on_probe_packet(packet.participant.identity, packet.data)
+
+    def schedule_participants_update(self):
+        if not self.participants_update_timer.isActive():
+            self.participants_update_timer.start()
+
+    def flush_participants_update(self):
+        asyncio.ensure_future(self.update_participants_info())
 
     async def update_participants_info(self):
         if not self.current_room:
@@ -193,7 +636,7 @@ class LiveKitManager(FluentWindow):
 
         # 添加本地参与的轨道
         local_participant = self.current_room.local_participant
-        for track in local_participant.track_publications.values():
+        for track in list(local_participant.track_publications.values()):
             tracks_data.append({
                 'participant': local_participant.identity + " (你)",
                 'id': track.sid,
@@ -202,14 +645,13 @@ class LiveKitManager(FluentWindow):
             })
 
         # 添加远程参与者的轨道
-        for participant in self.current_room.remote_participants.values():
-            for track in participant.track_publications.values():
-                tracks_data.append({
-                    'participant': participant.identity,
-                    'id': track.sid,
-                    'type': 'Audio' if track.kind == TrackKind.KIND_AUDIO else 'Video',
-                    'subscribed': track.subscribed
-                })
+        for entry in self.track_index.tracks.values():
+            tracks_data.append({
+                'participant': entry.participant.identity,
+                'id': entry.sid,
+                'type': entry.type_name,
+                'subscribed': entry.publication.subscribed
+            })
 
         # 使用 QMetaObject.invokeMethod 在主线程中更新 UI
         QMetaObject.invokeMethod(self.join_room, "update_tracks_table",
@@ -229,10 +671,17 @@ class LiveKitManager(FluentWindow):
             self.audio_output.stop()
         if self.audio_buffer:
             self.audio_buffer.close()
-        if self.current_room:
-            asyncio.create_task(self.current_room.disconnect())
+        asyncio.ensure_future(self.close_sessions())
+        self.history.close()
+        self.loop_monitor.stop()
         super().closeEvent(event)
 
+    async def close_sessions(self):
+        # 房间要在媒体线程上断开，全部断开后再停掉媒体线程
+        if self.sessions:
+            await self.sessions.close_all()
+        self.media.stop()
+
     def refresh_room_info(self):
         asyncio.create_task(self._async_refresh_room_info())
 
@@ -245,13 +694,13 @@ class LiveKitManager(FluentWindow):
                 # 刷新本地参与者信息
                 local_participant = self.current_room.local_participant
                 logger.info(f"本地参与者: {local_participant.identity}")
-                for track in local_participant.track_publications.values():
+                for track in list(local_participant.track_publications.values()):
                     logger.info(f"本地轨道: {track.sid}, 类型: {'音频' if track.kind == TrackKind.KIND_AUDIO else '视频'}")
                 
                 # 刷新远程参与者信息
-                for participant in self.current_room.remote_participants.values():
+                for participant in list(self.current_room.remote_participants.values()):
                     logger.info(f"远程参与者: {participant.identity}")
-                    for track in participant.track_publications.values():
+                    for track in list(participant.track_publications.values()):
                         logger.info(f"远程轨道: {track.sid}, 类型: {'音频' if track.kind == TrackKind.KIND_AUDIO else '视频'}, 已订阅: {track.subscribed}")
                 
                 logger.info("刷新了房间信息")
@@ -269,25 +718,20 @@ class LiveKitManager(FluentWindow):
     async def _async_subscribe_track(self, participant, track_id):
         if self.current_room:
             try:
-                participant_obj = self.current_room.remote_participants.get(participant)
+                participant_obj = self.track_index.get_participant(participant)
                 if participant_obj:
-                    track_publication = participant_obj.track_publications.get(track_id)
+                    entry = self.track_index.get(track_id)
+                    track_publication = entry.publication if entry and entry.participant is participant_obj else None
                     if track_publication:
                         if not track_publication.subscribed:
-                            # 直接设置 subscribed 属性为 True
-                            track_publication.subscribed = True
+                            track_publication.set_subscribed(True)
+                            if self.sessions.active.subscription:
+                                # 手动订阅优先于订阅策略
+                                self.sessions.active.subscription.set_override(track_id, True)
                             
-                            track = track_publication.track
-                            if track:
-                                track_type = "Audio" if track_publication.kind == TrackKind.KIND_AUDIO else "Video"
-                                self.subscribed_tracks.add_track(participant, track_id, track_type)
-                                
-                                # 切换到已订阅轨道页面
-                                self.switchTo(self.subscribed_tracks)
-                                
-                                logger.info(f"成功订阅轨道: {track_id} 从参与者 {participant}")
-                            else:
-                                logger.error(f"轨道 {track_id} 不可用")
+                            # 订阅完成后 track_subscribed 事件会添加轨道卡片
+                            self.switchTo(self.subscribed_tracks)
+                            logger.info(f"已请求订阅轨道: {track_id} 从参与者 {participant}")
                         else:
                             logger.info(f"轨道 {track_id} 已经被订阅")
                     else:
@@ -299,25 +743,24 @@ class LiveKitManager(FluentWindow):
         else:
             logger.error("未连接到房间")
 
-        await self.update_participants_info()
+        self.schedule_participants_update()
 
     async def _async_unsubscribe_track(self, participant, track_id):
         if self.current_room:
             try:
-                participant_obj = self.current_room.remote_participants.get(participant)
+                participant_obj = self.track_index.get_participant(participant)
                 if participant_obj:
-                    track_publication = participant_obj.track_publications.get(track_id)
+                    entry = self.track_index.get(track_id)
+                    track_publication = entry.publication if entry and entry.participant is participant_obj else None
                     if track_publication:
                         if track_publication.subscribed:
-                            # 直接置 subscribed 属性为 False
-                            track_publication.subscribed = False
+                            track_publication.set_subscribed(False)
+                            if self.sessions.active.subscription:
+                                self.sessions.active.subscription.set_override(track_id, False)
                             
-                            if track_id in self.audio_tasks:
-                                self.audio_tasks[track_id].cancel()
-                                del self.audio_tasks[track_id]
-                            if track_id in self.video_tasks:
-                                self.video_tasks[track_id].cancel()
-                                del self.video_tasks[track_id]
+                            self.sessions.active.cancel_track_tasks(track_id)
+                            self.sessions.active.playing.pop(track_id, None)
+                            self.sessions.active.recording.pop(track_id, None)
                             
                             self.subscribed_tracks.remove_track(track_id)
                             
@@ -334,7 +777,7 @@ class LiveKitManager(FluentWindow):
             logger.error("未连接到房间")
 
         # 更新参与者与轨道表格
-        await self.update_participants_info()
+        self.schedule_participants_update()
 
     async def handle_audio_track(self, audio_track: rtc.RemoteAudioTrack):
         try:
@@ -384,7 +827,8 @@ class LiveKitManager(FluentWindow):
             while True:
                 try:
                     video_frame = await video_track.receive()
-                    logger.info(f"接收到视频帧: {video_frame}")
+                    # 每帧都会走到这里，只采样输出
+                    logger.debug(f"接收到视频帧: {video_frame}", extra={'sample_every': 300})
                     # TODO: 处理视频帧，例如显示在UI上或保存
                 except asyncio.CancelledError:
                     break
@@ -409,38 +853,41 @@ class LiveKitManager(FluentWindow):
         asyncio.create_task(self._async_record_track(track_id, track_type))
 
     async def _async_play_track(self, track_id, track_type):
-        if self.current_room:
-            for participant in self.current_room.remote_participants.values():
-                track_publication = participant.track_publications.get(track_id)
+        session = self.sessions.session_for_track(track_id)
+        if session:
+            track_publication = session.track_index.get_publication(track_id)
+            if track_publication:
+                track = track_publication.track
+                if track:
+                    session.playing[track_id] = track_type
+                    if self.play_in_workers(session, track_id, track_type):
+                        pass
+                    elif track_type == "Audio":
+                        session.audio_tasks[track_id] = self.media.submit(self.consume_stream(
+                            lambda: rtc.AudioStream(track=track), self.subscribed_tracks.play_audio_stream))
+                    elif track_type == "Video":
+                        session.video_tasks[track_id] = self.media.submit(self.consume_stream(
+                            lambda: rtc.VideoStream(track, format=rtc.VideoBufferType.RGB24),
+                            self.subscribed_tracks.play_video_stream))
+
+    async def _async_record_track(self, track_id, track_type):
+        session = self.sessions.session_for_track(track_id)
+        if session:
+            try:
+                track_publication = session.track_index.get_publication(track_id)
                 if track_publication:
                     track = track_publication.track
                     if track:
+                        session.recording[track_id] = track_type
                         if track_type == "Audio":
-                            audio_stream = rtc.AudioStream(track=track)
-                            self.audio_tasks[track_id] = asyncio.create_task(self.subscribed_tracks.play_audio_stream(audio_stream))
+                            await self.media.run(self.consume_stream(
+                                lambda: rtc.AudioStream(track=track), self.subscribed_tracks.record_audio_stream, track_id))
                         elif track_type == "Video":
-                            video_stream = rtc.VideoStream(track, format=rtc.VideoBufferType.RGB24)
-                            await self.subscribed_tracks.play_video_stream(video_stream)
-                    break
-
-    async def _async_record_track(self, track_id, track_type):
-        if self.current_room:
-            try:
-                for participant in self.current_room.remote_participants.values():
-                    track_publication = participant.track_publications.get(track_id)
-                    if track_publication:
-                        track = track_publication.track
-                        if track:
-                            if track_type == "Audio":
-                                audio_stream = rtc.AudioStream(track=track)
-                                await self.subscribed_tracks.record_audio_stream(audio_stream, track_id)
-                            elif track_type == "Video":
-                                video_stream = rtc.VideoStream(track)
-                                await self.subscribed_tracks.record_video_stream(video_stream, track_id)
-                            logger.info(f"开始录制 {track_type} 轨道: {track_id}")
-                        else:
-                            logger.error(f"轨道 {track_id} 不可用")
-                        break
+                            await self.media.run(self.consume_stream(
+                                lambda: rtc.VideoStream(track), self.subscribed_tracks.record_video_stream, track_id))
+                        logger.info(f"开始录制 {track_type} 轨道: {track_id}")
+                    else:
+                        logger.error(f"轨道 {track_id} 不可用")
                 else:
                     logger.error(f"未找到轨道: {track_id}")
             except Exception as e:
@@ -449,30 +896,20 @@ class LiveKitManager(FluentWindow):
         else:
             logger.error("未连接到房间")
 
-    def get_video_stream(self, track_id):
-        if self.current_room:
-            for participant in self.current_room.remote_participants.values():
-                track_publication = participant.track_publications.get(track_id)
-                if track_publication and track_publication.kind == TrackKind.KIND_VIDEO:
-                    return rtc.VideoStream(track_publication.track)
-        return None
-
     def stop_track(self, track_id, track_type):
         try:
+            session = self.sessions.session_for_track(track_id)
+            if session:
+                session.playing.pop(track_id, None)
             if track_type == "Audio":
-                if track_id in self.audio_tasks:
-                    self.audio_tasks[track_id].cancel()
-                    del self.audio_tasks[track_id]
+                if session:
+                    session.cancel_track_tasks(track_id)
                 asyncio.create_task(self.subscribed_tracks.stop_audio_stream())
             elif track_type == "Video":
-                if track_id in self.video_tasks:
-                    self.video_tasks[track_id].cancel()
-                    del self.video_tasks[track_id]
-                video_stream = self.get_video_stream(track_id)
-                if video_stream:
-                    asyncio.create_task(self.subscribed_tracks.stop_video_stream(video_stream))
-                else:
-                    logger.error(f"无法获取视频流: {track_id}")
+                # 取消播放任务即关闭媒体线程上的视频流
+                if session:
+                    session.cancel_track_tasks(track_id)
+                self.subscribed_tracks.stop_video_track(track_id)
             logger.info(f"停止播放 {track_type} 轨道: {track_id}")
         except Exception as e:
             logger.error(f"停止播放轨道时发生错误: {str(e)}")
@@ -0,0 +1,48 @@
+import random
+
+# 这些断开原因说明服务端不希望我们回来 (主动离开、身份被占用、被移出、房间已删除/关闭)，不做自动重连
+# 取值对应 livekit DisconnectReason: CLIENT_INITIATED=1, DUPLICATE_IDENTITY=2,
+# PARTICIPANT_REMOVED=4, ROOM_DELETED=5, ROOM_CLOSED=10
+NO_RETRY_REASONS = {1, 2, 4, 5, 10}
+
+
+# 连接失败的错误信息里有这些字样说明令牌被拒绝 (过期、签名不对、没有权限)，换个时间用同一个令牌重试也不会成功
+AUTH_ERROR_MARKERS = ("401", "403", "unauthorized", "forbidden", "token", "permission")
+
+
+def should_reconnect(reason):
+    return reason not in NO_RETRY_REASONS
+
+
+def is_auth_error(error):
+    message = str(error).lower()
+    return any(marker in message for marker in AUTH_ERROR_MARKERS)
+
+
+# 带抖动的指数退避：第 n 次重试的等待时间在 [0, min(cap, base * factor^n)] 内均匀分布 (full jitter)，
+# 避免大量客户端在服务端恢复后同时重连
+class ReconnectPolicy:
+    def __init__(self, base=0.5, cap=30.0, factor=2.0, max_attempts=10, rng=None):
+        self.base = base
+        self.cap = cap
+        self.factor = factor
+        self.max_attempts = max_attempts
+        self.rng = rng or random.Random()
+
+    def delay(self, attempt):
+        # 第一次重试立即进行，网络抖动造成的断线通常马上就能恢复
+        if attempt == 0:
+            return 0.0
+        ceiling = min(self.cap, self.base * self.factor ** (attempt - 1))
+        return self.rng.uniform(0, ceiling)
+
+    def delays(self):
+        attempt = 0
+        while self.max_attempts is None or attempt < self.max_attempts:
+            yield attempt, self.delay(attempt)
+            attempt += 1
+
+
+def track_key(entry):
+    # 重新入会后轨道 sid 可能变化，用 (参与者, 轨道名, 类型) 识别同一条轨道
+    return (entry.participant.identity, entry.publication.name, entry.kind)
@@ -0,0 +1,348 @@
+import asyncio
+import time
+import traceback
+from functools import partial
+
+from app.core.reconnect import ReconnectPolicy, is_auth_error, track_key
+from app.core.track_index import TrackEntry, TrackIndex
+from app.services.livekit_service import api_credentials, create_room, join_livekit_room, renew_access_token
+from app.utils.logger import logger
+from app.utils.media_loop import run_in_loop, run_in_room
+from app.utils.metrics import metrics
+from app.utils.resource_usage import ResourceSample, cpu_percent_between
+
+# 每个会话转发给监听器的房间事件；监听器的处理函数签名为 handler(session, *args)
+ROOM_EVENTS = (
+    "participant_connected",
+    "participant_disconnected",
+    "local_track_published",
+    "local_track_unpublished",
+    "track_published",
+    "track_unpublished",
+    "track_subscribed",
+    "track_unsubscribed",
+    "data_received",
+    "disconnected",
+    "reconnecting",
+    "reconnected",
+    "active_speakers_changed",
+)
+
+
+# 一个已连接的房间：事件处理、轨道索引和媒体任务都按房间隔离
+class RoomSession:
+    def __init__(self, key, url, room, token=None, options=None, post=None):
+        self.key = key
+        self.url = url
+        self.token = token
+        self.options = options or {}
+        self.room = room
+        self.listener = None
+        # Room 在另一个线程的事件循环上时，post(fn, *args) 负责把事件处理转到监听器所在的线程
+        self.post = post
+        self.reconnecting = False
+        self.reconnects = 0
+        # 重连过程中保存断线前的轨道状态 (snapshot() 的结果)，先到的 track_subscribed 据此找回原来的卡片
+        self.reconnect_snapshot = None
+        # 经 post 转发的房间事件: 媒体线程上已投递的数量和监听器线程上已处理的数量，各自只由一个线程累加
+        self.events_posted = 0
+        self.events_delivered = 0
+        self.track_index = TrackIndex(pending_events=self.pending_events)
+        self.track_index.rebuild(room)
+        self.audio_tasks = {}
+        self.video_tasks = {}
+        # 发言者检测用的音频读取任务，与播放无关，轨道订阅期间一直运行
+        self.meter_tasks = {}
+        # 媒体工作进程池 (MediaWorkerPool)，开启多进程解码并第一次播放时才创建
+        self.media_workers = None
+        # 用户正在播放/录制的轨道 {sid: 轨道类型}，重连后据此恢复
+        self.playing = {}
+        self.recording = {}
+        # 重连后等待 track_subscribed 才能恢复的播放/录制 {sid: {'play': 类型, 'record': 类型}}
+        self.pending_media = {}
+        self.chat_manager = None
+        # 订阅策略引擎 (SubscriptionEngine)，为 None 时由 SDK 自动订阅全部轨道
+        self.subscription = None
+        self.joined_at = time.time()
+        # 加载更早历史记录时的分页游标 (ts, id)
+        self.history_cursor = (self.joined_at, 0)
+        self.join_rss_delta = None
+        # 该房间事件处理函数累计占用的 CPU 时间 (秒)
+        self.handler_cpu = 0.0
+        self.handler_calls = 0
+        self._handlers = []
+
+    @property
+    def name(self):
+        return self.room.name
+
+    def bind(self, listener):
+        self.listener = listener
+        for event in ROOM_EVENTS:
+            handler = getattr(listener, f"on_{event}", None)
+            if handler is None:
+                continue
+            wrapped = partial(self._dispatch, self.room, handler,
+                              metrics.counter("room_events_total", "房间事件数", room=self.key, event=event),
+                              metrics.histogram("room_event_handler_seconds", "房间事件处理耗时",
+                                                room=self.key, event=event))
+            if self.post is not None:
+                wrapped = partial(self._post_event, wrapped)
+            self.room.on(event, wrapped)
+            self._handlers.append((event, wrapped))
+
+    def unbind(self):
+        for event, wrapped in self._handlers:
+            self.room.off(event, wrapped)
+        self._handlers.clear()
+
+    def pending_events(self):
+        return self.events_posted - self.events_delivered
+
+    def _post_event(self, dispatch, *args):
+        self.events_posted += 1
+        self.post(self._deliver_event, dispatch, *args)
+
+    def _deliver_event(self, dispatch, *args):
+        self.events_delivered += 1
+        dispatch(*args)
+
+    def _dispatch(self, room, handler, event_count, handler_seconds, *args):
+        # 经 post 转发的事件可能在解绑或重连换了 Room 之后才到，直接丢弃
+        if room is not self.room or not self._handlers:
+            return
+        started = time.thread_time()
+        try:
+            handler(self, *args)
+        finally:
+            elapsed = time.thread_time() - started
+            self.handler_cpu += elapsed
+            self.handler_calls += 1
+            event_count.inc()
+            handler_seconds.observe(elapsed)
+
+    def cancel_all_tasks(self):
+        for tasks in (self.audio_tasks, self.video_tasks, self.meter_tasks):
+            for task in tasks.values():
+                task.cancel()
+            tasks.clear()
+
+    def cancel_meter(self, track_id):
+        task = self.meter_tasks.pop(track_id, None)
+        if task:
+            task.cancel()
+
+    def cancel_track_tasks(self, track_id):
+        for tasks in (self.audio_tasks, self.video_tasks):
+            task = tasks.pop(track_id, None)
+            if task:
+                task.cancel()
+
+    def snapshot(self):
+        # 断线时记录每条远程轨道的订阅、播放和录制状态
+        state = {}
+        for entry in self.track_index.tracks.values():
+            state[track_key(entry)] = {
+                'sid': entry.sid,
+                'subscribed': entry.publication.subscribed,
+                'play': self.playing.get(entry.sid),
+                'record': self.recording.get(entry.sid),
+            }
+        return state
+
+    def previous_sid(self, publication, participant):
+        # 重连过程中订阅到的轨道在断线前的 sid；不在重连中或断线前没有这条轨道时返回 None
+        if not self.reconnecting or not self.reconnect_snapshot:
+            return None
+        state = self.reconnect_snapshot.get(track_key(TrackEntry(publication, participant)))
+        return state['sid'] if state else None
+
+    def restore(self, snapshot):
+        # 新连接建好后只恢复断线前的状态，返回 ({旧 sid: 新 sid}, [已不存在的旧 sid])
+        renamed = {}
+        found = set()
+        self.playing.clear()
+        self.recording.clear()
+        self.pending_media.clear()
+        for entry in self.track_index.tracks.values():
+            state = snapshot.get(track_key(entry))
+            if state is None:
+                continue
+            found.add(state['sid'])
+            if state['sid'] != entry.sid:
+                renamed[state['sid']] = entry.sid
+            if entry.publication.subscribed != state['subscribed']:
+                entry.publication.set_subscribed(state['subscribed'])
+            if state['subscribed'] and (state['play'] or state['record']):
+                self.pending_media[entry.sid] = {'play': state['play'], 'record': state['record']}
+        lost = [state['sid'] for state in snapshot.values() if state['sid'] not in found]
+        return renamed, lost
+
+    def refresh_token(self):
+        # 断线时间长了原令牌可能已经过期：设置了 API 密钥时按原令牌的身份和权限重新签发，否则沿用原令牌
+        credentials = api_credentials()
+        if credentials is None:
+            return self.token
+        try:
+            self.token = renew_access_token(self.token, *credentials)
+        except Exception:
+            logger.warning(f"房间 {self.key} 重新签发令牌失败，沿用原令牌: \n{traceback.format_exc()}")
+        return self.token
+
+    def take_pending_media(self, sid):
+        return self.pending_media.pop(sid, None)
+
+    async def close(self):
+        self.unbind()
+        self.cancel_all_tasks()
+        if self.media_workers:
+            await asyncio.get_running_loop().run_in_executor(None, self.media_workers.close)
+            self.media_workers = None
+        if self.chat_manager:
+            self.chat_manager.close()
+            self.chat_manager = None
+        try:
+            await run_in_room(self.room, self.room.disconnect())
+        except Exception:
+            logger.error(f"断开房间 {self.key} 时发生错误: \n{traceback.format_exc()}")
+        self.track_index.clear()
+        metrics.remove(room=self.key)
+
+
+# 在一个进程内同时保持多个房间连接，并记录每多一个房间带来的内存和 CPU 开销
+class SessionManager:
+    def __init__(self, loop=None, post=None):
+        # loop: Room 所在的事件循环 (界面程序里是媒体线程)，为 None 时就是调用方的当前循环
+        self.loop = loop
+        self.post = post
+        self.sessions = {}
+        self.active_key = None
+        self.baseline = None
+        self._last_sample = None
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __iter__(self):
+        return iter(list(self.sessions.values()))
+
+    @property
+    def active(self):
+        return self.sessions.get(self.active_key)
+
+    def get(self, key):
+        return self.sessions.get(key)
+
+    def set_active(self, key):
+        if key in self.sessions:
+            self.active_key = key
+
+    def session_for_track(self, track_id):
+        for session in self.sessions.values():
+            if track_id in session.track_index:
+                return session
+        return None
+
+    def _unique_key(self, name):
+        key = name
+        suffix = 2
+        while key in self.sessions:
+            key = f"{name}#{suffix}"
+            suffix += 1
+        return key
+
+    async def join(self, url, token, listener=None, room=None, **options):
+        # room 可以是预热阶段提前创建好的 Room 对象
+        if not self.sessions:
+            self.baseline = ResourceSample()
+        before = ResourceSample()
+        room = await run_in_loop(self.loop, join_livekit_room(url, token, room=room, **options))
+        session = RoomSession(self._unique_key(room.name), url, room, token, options, post=self.post)
+        after = ResourceSample()
+        if before.rss is not None and after.rss is not None:
+            session.join_rss_delta = after.rss - before.rss
+        if listener is not None:
+            session.bind(listener)
+        self.sessions[session.key] = session
+        if self.active_key is None:
+            self.active_key = session.key
+        logger.info(f"已加入房间 {session.key}，当前共 {len(self.sessions)} 个房间")
+        return session
+
+    async def reconnect(self, session, policy=None, on_attempt=None):
+        # 断线后按退避策略用新的 Room 对象重新入会；事件监听器在连接前绑定，入会过程中的事件不会丢
+        policy = policy or ReconnectPolicy()
+        listener = session.listener
+        session.unbind()
+        session.cancel_all_tasks()
+        if session.chat_manager:
+            session.chat_manager.close()
+            session.chat_manager = None
+        session.reconnecting = True
+        try:
+            for attempt, delay in policy.delays():
+                if on_attempt:
+                    on_attempt(session, attempt, delay)
+                await asyncio.sleep(delay)
+                if self.sessions.get(session.key) is not session:
+                    # 等待期间用户已经离开了这个房间
+                    return False
+                room = await run_in_loop(self.loop, create_room())
+                session.room = room
+                if listener is not None:
+                    session.bind(listener)
+                try:
+                    await run_in_loop(self.loop, join_livekit_room(session.url, session.refresh_token(), room=room,
+                                                                   **session.options))
+                except Exception as e:
+                    logger.warning(f"房间 {session.key} 第 {attempt + 1} 次重连失败: \n{traceback.format_exc()}")
+                    session.unbind()
+                    if is_auth_error(e):
+                        # 令牌被拒绝 (过期又没法重新签发，或密钥不对)，后面的重试都会失败
+                        logger.error(f"房间 {session.key} 的令牌被服务端拒绝，不再重连")
+                        return False
+                    continue
+                session.track_index.rebuild(room)
+                session.reconnects += 1
+                logger.info(f"房间 {session.key} 第 {attempt + 1} 次重连成功")
+                return True
+            return False
+        finally:
+            session.reconnecting = False
+
+    async def leave(self, key):
+        session = self.sessions.pop(key, None)
+        if session is None:
+            return
+        await session.close()
+        if self.active_key == key:
+            self.active_key = next(iter(self.sessions), None)
+        logger.info(f"已离开房间 {key}，剩余 {len(self.sessions)} 个房间")
+
+    async def close_all(self):
+        await asyncio.gather(*(self.leave(key) for key in list(self.sessions)))
+
+    def resource_report(self):
+        now = ResourceSample()
+        previous, self._last_sample = self._last_sample, now
+        count = len(self.sessions)
+        report = {
+            'rooms': count,
+            'rss': now.rss,
+            'cpu_percent': round(cpu_percent_between(previous, now), 1) if previous else None,
+            'rss_per_room': None,
+            'sessions': [],
+        }
+        if count and self.baseline and self.baseline.rss is not None and now.rss is not None:
+            report['rss_per_room'] = (now.rss - self.baseline.rss) / count
+        for session in self.sessions.values():
+            uptime = max(time.time() - session.joined_at, 1e-6)
+            report['sessions'].append({
+                'key': session.key,
+                'participants': len(session.track_index.participants),
+                'tracks': len(session.track_index),
+                'join_rss_delta': session.join_rss_delta,
+                'handler_calls': session.handler_calls,
+                'handler_cpu_percent': round(session.handler_cpu / uptime * 100, 3),
+            })
+        return report
@@ -0,0 +1,160 @@
+import time
+import traceback
+
+from livekit.rtc import TrackKind
+
+from app.utils.logger import logger
+
+# 视频订阅模式
+VIDEO_ALL = "all"
+VIDEO_NONE = "none"
+VIDEO_TOP_SPEAKERS = "top_speakers"
+VIDEO_VISIBLE = "visible"
+
+
+class SubscriptionPolicy:
+    def __init__(self, audio=True, video=VIDEO_ALL, max_video=4, allow=None, deny=None,
+                 hold_seconds=5.0, min_dwell=1.0):
+        self.audio = audio
+        self.video = video
+        self.max_video = max_video
+        # allow 非空时只订阅名单内的参与者；deny 中的参与者永远不订阅
+        self.allow = set(allow or ())
+        self.deny = set(deny or ())
+        # 不再需要的轨道要持续 hold_seconds 才取消订阅；同一轨道两次变更之间至少间隔 min_dwell
+        self.hold_seconds = hold_seconds
+        self.min_dwell = min_dwell
+
+    @property
+    def auto_subscribe(self):
+        # 只有“全部订阅”时才交给 SDK 自动订阅，其他情况由引擎逐条决定
+        return self.audio and self.video == VIDEO_ALL and not self.allow and not self.deny
+
+    @classmethod
+    def from_name(cls, name, **kwargs):
+        presets = {
+            'all': dict(audio=True, video=VIDEO_ALL),
+            'none': dict(audio=False, video=VIDEO_NONE),
+            'audio': dict(audio=True, video=VIDEO_NONE),
+            'speakers': dict(audio=True, video=VIDEO_TOP_SPEAKERS),
+            'visible': dict(audio=True, video=VIDEO_VISIBLE),
+        }
+        return cls(**{**presets[name], **kwargs})
+
+
+# 根据策略决定每条远程轨道是否订阅，通过 RemoteTrackPublication.set_subscribed 生效；
+# 带滞回：新需要的轨道尽快订阅，不再需要的轨道要等一段时间，发言者排名抖动不会导致反复订阅
+class SubscriptionEngine:
+    def __init__(self, policy, clock=time.monotonic):
+        self.policy = policy
+        self.clock = clock
+        self.speakers = []
+        self.last_spoke = {}
+        self.visible = set()
+        # 用户在界面上手动订阅/取消订阅的轨道，优先于策略
+        self.overrides = {}
+        self.undesired_since = {}
+        self.last_change = {}
+        self.changes = 0
+
+    def update_speakers(self, identities):
+        # identities 按发言强度排序 (SDK 的 active_speakers_changed 或本地检测)
+        now = self.clock()
+        self.speakers = list(identities)
+        for identity in self.speakers:
+            self.last_spoke[identity] = now
+
+    def update_visible(self, track_ids):
+        self.visible = set(track_ids)
+
+    def set_override(self, track_id, subscribe):
+        self.overrides[track_id] = subscribe
+        self.last_change[track_id] = self.clock()
+
+    def ranked_speakers(self):
+        # 正在发言的排最前，其余按最近一次发言时间排序
+        current = set(self.speakers)
+        rest = sorted((i for i in self.last_spoke if i not in current), key=self.last_spoke.get, reverse=True)
+        return self.speakers + rest
+
+    def allowed(self, identity):
+        if identity in self.policy.deny:
+            return False
+        return not self.policy.allow or identity in self.policy.allow
+
+    def desired(self, track_index):
+        # 返回当前策略下应该订阅的 track sid 集合
+        policy = self.policy
+        wanted = set()
+        video_entries = []
+        for entry in track_index.tracks.values():
+            override = self.overrides.get(entry.sid)
+            if override is not None:
+                if override:
+                    wanted.add(entry.sid)
+                continue
+            if not self.allowed(entry.participant.identity):
+                continue
+            if entry.kind == TrackKind.KIND_AUDIO:
+                if policy.audio:
+                    wanted.add(entry.sid)
+            elif policy.video == VIDEO_ALL:
+                wanted.add(entry.sid)
+            elif policy.video == VIDEO_VISIBLE:
+                if entry.sid in self.visible:
+                    wanted.add(entry.sid)
+            elif policy.video == VIDEO_TOP_SPEAKERS:
+                video_entries.append(entry)
+
+        if video_entries:
+            rank = {identity: i for i, identity in enumerate(self.ranked_speakers())}
+            video_entries.sort(key=lambda e: rank.get(e.participant.identity, len(rank)))
+            wanted.update(e.sid for e in video_entries[:policy.max_video])
+        return wanted
+
+    def plan(self, track_index):
+        # 返回需要变更的 [(publication, subscribe)]
+        now = self.clock()
+        wanted = self.desired(track_index)
+        plan = []
+        for entry in track_index.tracks.values():
+            publication = entry.publication
+            if now - self.last_change.get(entry.sid, float('-inf')) < self.policy.min_dwell:
+                continue
+            if entry.sid in wanted:
+                self.undesired_since.pop(entry.sid, None)
+                if not publication.subscribed:
+                    plan.append((publication, True))
+            elif publication.subscribed:
+                since = self.undesired_since.setdefault(entry.sid, now)
+                if now - since >= self.policy.hold_seconds:
+                    plan.append((publication, False))
+            else:
+                self.undesired_since.pop(entry.sid, None)
+
+        for sid in list(self.undesired_since):
+            if sid not in track_index:
+                del self.undesired_since[sid]
+        for sid in list(self.last_change):
+            if sid not in track_index:
+                del self.last_change[sid]
+                self.overrides.pop(sid, None)
+        for identity in list(self.last_spoke):
+            if identity not in track_index.participants:
+                del self.last_spoke[identity]
+        return plan
+
+    def apply(self, track_index):
+        plan = self.plan(track_index)
+        now = self.clock()
+        for publication, subscribe in plan:
+            try:
+                publication.set_subscribed(subscribe)
+                self.last_change[publication.sid] = now
+                self.undesired_since.pop(publication.sid, None)
+                self.changes += 1
+            except Exception:
+                logger.error(f"修改轨道 {publication.sid} 订阅状态失败: \n{traceback.format_exc()}")
+        if plan:
+            logger.info(f"订阅策略: 订阅 {sum(1 for _, s in plan if s)} 条，取消订阅 {sum(1 for _, s in plan if not s)} 条")
+        return plan
@@ -0,0 +1,183 @@
+import asyncio
+import concurrent.futures
+import os
+
+from livekit.rtc import TrackKind
+
+from app.utils.logger import logger
+
+# 设置环境变量 LIVEKIT_PYQT_CHECK_INDEX=1 后，每次增量更新都会与全量扫描结果对比 (测试用)
+CHECK_ENV = "LIVEKIT_PYQT_CHECK_INDEX"
+# 一致性检查到 Room 的事件循环上取房间状态时最多等这么久
+CHECK_TIMEOUT = 5.0
+
+
+class TrackIndexError(AssertionError):
+    pass
+
+
+class TrackEntry:
+    __slots__ = ('sid', 'publication', 'participant', 'kind')
+
+    def __init__(self, publication, participant):
+        self.sid = publication.sid
+        self.publication = publication
+        self.participant = participant
+        self.kind = publication.kind
+
+    @property
+    def type_name(self):
+        return "Audio" if self.kind == TrackKind.KIND_AUDIO else "Video"
+
+
+# 远程轨道索引：track sid -> (publication, participant, kind)，由房间事件增量维护，
+# 查找不再需要遍历所有参与者的 track_publications
+class TrackIndex:
+    # pending_events: 返回已经发出、但还没转到索引所在线程处理的房间事件数；
+    # 在 Room 的事件循环上调用，一致性检查只在它为 0 时比较
+    def __init__(self, check_consistency=None, pending_events=None):
+        if check_consistency is None:
+            check_consistency = os.environ.get(CHECK_ENV, "") not in ("", "0")
+        self.check_consistency = check_consistency
+        self.pending_events = pending_events or (lambda: 0)
+        self.room = None
+        self.tracks = {}
+        self.participants = {}
+        self.participant_tracks = {}
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def __contains__(self, sid):
+        return sid in self.tracks
+
+    def clear(self):
+        self.room = None
+        self.tracks.clear()
+        self.participants.clear()
+        self.participant_tracks.clear()
+
+    def rebuild(self, room):
+        self.clear()
+        self.room = room
+        # remote_participants 和 track_publications 由媒体线程上的 SDK 修改，先取快照再遍历
+        for participant in list(room.remote_participants.values()):
+            self._add_participant(participant)
+        self._verify()
+
+    def add_participant(self, participant):
+        self._add_participant(participant)
+        self._verify()
+
+    def remove_participant(self, participant):
+        self.participants.pop(participant.identity, None)
+        for sid in self.participant_tracks.pop(participant.identity, set()):
+            self.tracks.pop(sid, None)
+        self._verify()
+
+    def add_publication(self, publication, participant):
+        if participant.identity not in self.participants:
+            self.participants[participant.identity] = participant
+        self._add_publication(publication, participant)
+        self._verify()
+
+    def remove_publication(self, publication, participant=None):
+        entry = self.tracks.pop(publication.sid, None)
+        if entry:
+            sids = self.participant_tracks.get(entry.participant.identity)
+            if sids:
+                sids.discard(publication.sid)
+        self._verify()
+
+    def get(self, sid):
+        return self.tracks.get(sid)
+
+    def get_publication(self, sid):
+        entry = self.tracks.get(sid)
+        return entry.publication if entry else None
+
+    def get_participant(self, identity):
+        return self.participants.get(identity)
+
+    def tracks_of(self, identity):
+        return [self.tracks[sid] for sid in self.participant_tracks.get(identity, ())]
+
+    def _add_participant(self, participant):
+        self.participants[participant.identity] = participant
+        self.participant_tracks.setdefault(participant.identity, set())
+        for publication in list(participant.track_publications.values()):
+            self._add_publication(publication, participant)
+
+    def _add_publication(self, publication, participant):
+        self.tracks[publication.sid] = TrackEntry(publication, participant)
+        self.participant_tracks.setdefault(participant.identity, set()).add(publication.sid)
+
+    def _verify(self):
+        if not self.check_consistency or self.room is None:
+            return
+        state = self._settled_room_state()
+        if state is not None:
+            self._compare(*state)
+
+    def _settled_room_state(self):
+        # 房间事件经 bridge 转到界面线程后才更新索引，索引总是落后于房间：
+        # 在 Room 的事件循环上同时取房间状态和还在路上的事件数，有事件没处理完时返回 None，不做比较
+        def capture():
+            if self.pending_events():
+                return None
+            return room_state(self.room)
+
+        loop = getattr(self.room, '_loop', None)
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if loop is None or loop is current or not loop.is_running():
+            return capture()
+
+        async def capture_in_loop():
+            return capture()
+
+        # 等待期间索引所在线程不会再处理事件，取到的状态和索引对应同一时刻
+        try:
+            return asyncio.run_coroutine_threadsafe(capture_in_loop(), loop).result(timeout=CHECK_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            logger.warning("轨道索引一致性检查: 等待房间事件循环超时，跳过这次检查")
+            return None
+
+    def verify(self, room):
+        # 与全量扫描的结果逐项比较，不一致时抛出 TrackIndexError；调用方保证没有还没处理的房间事件
+        self._compare(*room_state(room))
+
+    def _compare(self, identities, expected):
+        problems = []
+        if set(self.participants) != identities:
+            problems.append(f"参与者不一致: 索引 {sorted(self.participants)} 房间 {sorted(identities)}")
+        missing = expected.keys() - self.tracks.keys()
+        extra = self.tracks.keys() - expected.keys()
+        if missing:
+            problems.append(f"索引缺少轨道: {sorted(missing)}")
+        if extra:
+            problems.append(f"索引多出轨道: {sorted(extra)}")
+        for sid in expected.keys() & self.tracks.keys():
+            publication, identity = expected[sid]
+            entry = self.tracks[sid]
+            if entry.publication is not publication or entry.participant.identity != identity:
+                problems.append(f"轨道 {sid} 的发布或参与者不一致")
+            if sid not in self.participant_tracks.get(identity, ()):
+                problems.append(f"轨道 {sid} 不在参与者 {identity} 的轨道集合中")
+        if problems:
+            message = "; ".join(problems)
+            logger.error(f"轨道索引一致性检查失败: {message}")
+            raise TrackIndexError(message)
+
+
+def room_state(room):
+    # 全量扫描房间：参与者 identity 集合和 {track sid: (publication, identity)}
+    expected = {}
+    identities = set()
+    for participant in list(room.remote_participants.values()):
+        identities.add(participant.identity)
+        for publication in list(participant.track_publications.values()):
+            expected[publication.sid] = (publication, participant.identity)
+    return identities, expected
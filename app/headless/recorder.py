@@ -0,0 +1,234 @@
+import asyncio
+import datetime
+import os
+import threading
+import traceback
+import wave
+from collections import deque
+
+from livekit import rtc
+
+from app.utils.lazy_import import lazy_import
+from app.utils.logger import logger
+
+np = lazy_import('numpy')
+
+# 交给写盘线程前每条音频轨道先攒够这么多字节 (48kHz 单声道 16-bit 约 0.5 秒)
+AUDIO_FLUSH_BYTES = 48000
+
+_STOP = object()
+
+
+# 写盘队列满时丢掉的数据在文件里的占位：WAV 补同样长度的静音，视频重复上一帧，
+# 文件时长和音画对齐不受丢弃影响；同一个文件连续丢弃的数据合并成一个占位
+class Gap:
+    __slots__ = ('nbytes', 'frames')
+
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+        self.frames = 1
+
+    def add(self, nbytes):
+        self.nbytes += nbytes
+        self.frames += 1
+
+
+def recording_path(directory, prefix, track_id, ext):
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{prefix}_{track_id}_{timestamp}.{ext}")
+
+
+# 所有录制共享的写盘线程：事件循环只负责收帧和拼接，文件写入、视频编码和关闭文件都在这里做；
+# 队列按字节计上限 (一帧 720p 的 BGR 画面约 2.7MB)，写盘跟不上时丢弃数据并计数，内存不会随录制时长增长；
+# 丢弃的位置由 Gap 占位补齐 (音频写静音、视频重复上一帧)。
+# 关闭文件和停止线程的控制项不受上限限制也不阻塞，和数据按顺序排在同一个队列里
+class RecordingWriter:
+    def __init__(self, max_pending_bytes=64 * 1024 * 1024):
+        self.max_pending_bytes = max_pending_bytes
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self.pending_bytes = 0
+        self.written_bytes = 0
+        self.written_frames = 0
+        self.dropped = 0
+        self.filled_bytes = 0
+        self.filled_frames = 0
+        # 写盘线程里每个视频文件最后写入的一帧，用来补齐丢弃的帧
+        self._last_frames = {}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="recording-writer", daemon=True)
+            self._thread.start()
+
+    def _put(self, item):
+        with self._cond:
+            self._items.append(item)
+            self._cond.notify()
+
+    def submit(self, target, data):
+        size = data.nbytes if hasattr(data, 'nbytes') else len(data)
+        with self._cond:
+            # 队列为空时总能放进一块，再大的帧也不会一直被丢弃
+            if self._items and self.pending_bytes + size > self.max_pending_bytes:
+                self.dropped += 1
+                last = self._items[-1]
+                if last[0] is target and isinstance(last[1], Gap):
+                    last[1].add(size)
+                else:
+                    self._items.append((target, Gap(size), 0))
+                    self._cond.notify()
+                return
+            self._items.append((target, data, size))
+            self.pending_bytes += size
+            self._cond.notify()
+
+    def close_target(self, target):
+        # 关闭操作不能丢，排在该文件所有写入之后；不等待，不会卡住事件循环
+        self._put((target, None, 0))
+
+    @property
+    def pending(self):
+        return len(self._items)
+
+    def stop(self):
+        if self._thread:
+            self._put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._items:
+                    self._cond.wait()
+                item = self._items.popleft()
+                if item is not _STOP:
+                    self.pending_bytes -= item[2]
+            if item is _STOP:
+                break
+            target, data, _ = item
+            try:
+                if data is None:
+                    self._last_frames.pop(target, None)
+                    if isinstance(target, wave.Wave_write):
+                        target.close()
+                    else:
+                        target.release()
+                elif isinstance(data, Gap):
+                    self._fill(target, data)
+                elif isinstance(target, wave.Wave_write):
+                    target.writeframes(data)
+                    self.written_bytes += len(data)
+                else:
+                    target.write(data)
+                    self._last_frames[target] = data
+                    self.written_frames += 1
+            except Exception:
+                logger.error(f"写入录制文件失败: \n{traceback.format_exc()}")
+
+    def _fill(self, target, gap):
+        if isinstance(target, wave.Wave_write):
+            # 丢弃的都是整帧的采样块，补上的静音不会让声道错位
+            target.writeframes(bytes(gap.nbytes))
+            self.filled_bytes += gap.nbytes
+            return
+        frame = self._last_frames.get(target)
+        if frame is None:
+            return
+        for _ in range(gap.frames):
+            target.write(frame)
+        self.filled_frames += gap.frames
+
+
+async def record_audio_stream(audio_stream: rtc.AudioStream, track_id, directory="recorded_audio", writer=None):
+    # 把音频流写成 WAV，采样率和声道数取自第一帧；返回文件路径。
+    # 传入 writer 时按块交给写盘线程，否则在当前协程里直接写
+    filepath = recording_path(directory, "audio", track_id, "wav")
+    wav_file = None
+    chunk = bytearray()
+    try:
+        async for audio_frame_event in audio_stream:
+            audio_frame = audio_frame_event.frame
+            if wav_file is None:
+                wav_file = wave.open(filepath, 'wb')
+                wav_file.setnchannels(audio_frame.num_channels)
+                wav_file.setsampwidth(2)  # 16-bit
+                wav_file.setframerate(audio_frame.sample_rate)
+            if writer is None:
+                wav_file.writeframes(audio_frame.data)
+                continue
+            chunk += audio_frame.data
+            if len(chunk) >= AUDIO_FLUSH_BYTES:
+                writer.submit(wav_file, bytes(chunk))
+                chunk.clear()
+
+        logger.info(f"音频已录制并保存到 {filepath}")
+
+    except asyncio.CancelledError:
+        logger.info(f"音频录制已取消: {filepath}")
+    except Exception as e:
+        logger.error(f"录制音频时发生错误: \n{traceback.format_exc()}")
+    finally:
+        if wav_file is not None:
+            if writer is None:
+                wav_file.close()
+            else:
+                if chunk:
+                    writer.submit(wav_file, bytes(chunk))
+                writer.close_target(wav_file)
+        await audio_stream.aclose()
+    return filepath
+
+
+async def record_video_stream(video_stream: rtc.VideoStream, track_id, directory="recorded_video", fps=30, writer=None):
+    # 按帧时间戳写入固定帧率的 MP4：到得慢时重复上一帧、到得快时丢帧，保证录像时长与实际一致
+    import cv2
+
+    filepath = recording_path(directory, "video", track_id, "mp4")
+    video_writer = None
+    first_ts = None
+    written = 0
+    try:
+        async for video_frame_event in video_stream:
+            frame = video_frame_event.frame
+            if first_ts is None:
+                first_ts = video_frame_event.timestamp_us
+            target = int((video_frame_event.timestamp_us - first_ts) * fps / 1_000_000) + 1
+            if target <= written:
+                # 这一帧落在已经写过的时间槽里，不需要转换
+                continue
+            if frame.type not in (rtc.VideoBufferType.RGB24, rtc.VideoBufferType.RGBA):
+                frame = frame.convert(rtc.VideoBufferType.RGBA)
+            if video_writer is None:
+                video_writer = cv2.VideoWriter(filepath, cv2.VideoWriter_fourcc(*'mp4v'), fps, (frame.width, frame.height))
+
+            if frame.type == rtc.VideoBufferType.RGB24:
+                arr = np.frombuffer(frame.data, dtype=np.uint8).reshape((frame.height, frame.width, 3))
+                bgr = cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
+            else:
+                arr = np.frombuffer(frame.data, dtype=np.uint8).reshape((frame.height, frame.width, 4))
+                bgr = cv2.cvtColor(arr, cv2.COLOR_RGBA2BGR)
+            while written < target:
+                if writer is None:
+                    video_writer.write(bgr)
+                else:
+                    writer.submit(video_writer, bgr)
+                written += 1
+
+        logger.info(f"视频已录制并保存到 {filepath}")
+
+    except asyncio.CancelledError:
+        logger.info(f"视频录制已取消: {filepath}")
+    except Exception as e:
+        logger.error(f"录制视频时发生错误: \n{traceback.format_exc()}")
+    finally:
+        if video_writer is not None:
+            if writer is None:
+                video_writer.release()
+            else:
+                writer.close_target(video_writer)
+        await video_stream.aclose()
+    return filepath
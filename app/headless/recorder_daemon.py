@@ -0,0 +1,134 @@
+import asyncio
+import time
+
+from livekit import rtc
+from livekit.rtc import TrackKind
+
+from app.headless import recorder
+from app.headless.runtime import HeadlessRuntime
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.utils.resource_usage import ResourceSample, cpu_percent_between, format_bytes
+
+# 每条轨道的接收队列上限，写盘跟不上时 SDK 丢弃最旧的帧，而不是无限堆积
+AUDIO_STREAM_CAPACITY = 100
+VIDEO_STREAM_CAPACITY = 5
+
+
+# 无人值守的录制端：自动订阅房间内所有轨道，轨道订阅/取消订阅时自动开始/停止录制，
+# 房间里没有其他参与者超过 idle_timeout 秒后退出
+class RecorderDaemon(HeadlessRuntime):
+    def __init__(self, url, token, output_dir='.', idle_timeout=30.0, wait_timeout=300.0, stats_interval=60.0,
+                 audio_only=False, fps=15, reconnect_policy=None):
+        super().__init__(url, token, subscribe='all', record=True, output_dir=output_dir,
+                         reconnect_policy=reconnect_policy)
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self.stats_interval = stats_interval
+        self.audio_only = audio_only
+        self.fps = fps
+        self.writer = recorder.RecordingWriter()
+        self.seen_participant = False
+        self.empty_since = None
+        self.started_recordings = 0
+        self._watch_task = None
+
+    async def start(self):
+        self.writer.start()
+        await super().start()
+        self.seen_participant = bool(self.session.room.remote_participants)
+        self.update_empty(self.session)
+        self._watch_task = asyncio.ensure_future(self.watch())
+
+    async def stop(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            self._watch_task = None
+        # 先等所有录制协程收尾 (把剩余数据和关闭操作交给写盘线程)，再断开房间并停掉写盘线程
+        tasks = [task for session in self.sessions
+                 for tasks in (session.audio_tasks, session.video_tasks) for task in tasks.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await super().stop()
+        self.writer.stop()
+        logger.info(f"录制结束，共 {self.started_recordings} 段录制，写盘丢弃 {self.writer.dropped} 块数据 "
+                    f"(补静音 {format_bytes(self.writer.filled_bytes)}，重复帧 {self.writer.filled_frames})")
+
+    def start_recording(self, session, track_id, track, kind):
+        if kind == TrackKind.KIND_AUDIO:
+            stream = rtc.AudioStream(track=track, capacity=AUDIO_STREAM_CAPACITY)
+            coro = recorder.record_audio_stream(stream, track_id, directory=f"{self.output_dir}/recorded_audio",
+                                                writer=self.writer)
+            tasks = session.audio_tasks
+            session.recording[track_id] = "Audio"
+        elif self.audio_only:
+            return
+        else:
+            stream = rtc.VideoStream(track, capacity=VIDEO_STREAM_CAPACITY)
+            coro = recorder.record_video_stream(stream, track_id, directory=f"{self.output_dir}/recorded_video",
+                                                fps=self.fps, writer=self.writer)
+            tasks = session.video_tasks
+            session.recording[track_id] = "Video"
+        # 同一条轨道重复订阅时先结束旧的录制
+        session.cancel_track_tasks(track_id)
+        tasks[track_id] = asyncio.ensure_future(coro)
+        tasks[track_id].add_done_callback(self.on_recording_done)
+        self.started_recordings += 1
+
+    def on_recording_done(self, task):
+        # 已结束的录制任务不再保留，长时间运行时任务表不会增长
+        for session in self.sessions:
+            for tasks in (session.audio_tasks, session.video_tasks):
+                for track_id, item in list(tasks.items()):
+                    if item is task:
+                        del tasks[track_id]
+        super().on_recording_done(task)
+
+    def on_participant_connected(self, session, participant):
+        super().on_participant_connected(session, participant)
+        self.seen_participant = True
+        self.update_empty(session)
+
+    def on_participant_disconnected(self, session, participant):
+        super().on_participant_disconnected(session, participant)
+        self.update_empty(session)
+
+    def update_empty(self, session):
+        if session.room.remote_participants:
+            self.empty_since = None
+        elif self.empty_since is None:
+            self.empty_since = time.monotonic()
+
+    async def watch(self):
+        next_stats = time.monotonic() + self.stats_interval
+        last_sample = ResourceSample()
+        pending = metrics.gauge("recorder_writer_pending", "写盘队列中的数据块数")
+        pending_bytes = metrics.gauge("recorder_writer_pending_bytes", "写盘队列中的数据字节数")
+        dropped = metrics.counter("recorder_writer_dropped_total", "写盘队列满时丢弃的数据块数")
+        written = metrics.counter("recorder_audio_bytes_written_total", "已写入的音频字节数")
+        active_tracks = metrics.gauge("recorder_active_tracks", "正在录制的轨道数")
+        while True:
+            await asyncio.sleep(1.0)
+            now = time.monotonic()
+            pending.set(self.writer.pending)
+            pending_bytes.set(self.writer.pending_bytes)
+            # 写盘线程自己累计，这里只补上和上次采样之间的增量
+            dropped.inc(self.writer.dropped - dropped.value)
+            written.inc(self.writer.written_bytes - written.value)
+            active_tracks.set(sum(len(s.audio_tasks) + len(s.video_tasks) for s in self.sessions))
+            if self.empty_since is not None and not any(s.reconnecting for s in self.sessions):
+                timeout = self.idle_timeout if self.seen_participant else self.wait_timeout
+                if timeout is not None and now - self.empty_since >= timeout:
+                    logger.info(f"房间已空 {now - self.empty_since:.0f} 秒，停止录制")
+                    self.request_stop()
+                    return
+            if now >= next_stats:
+                next_stats = now + self.stats_interval
+                sample = ResourceSample()
+                active = sum(len(s.audio_tasks) + len(s.video_tasks) for s in self.sessions)
+                logger.info(f"录制中: {active} 条轨道, 写盘队列 {self.writer.pending} 块 ({format_bytes(self.writer.pending_bytes)}), "
+                            f"已写入音频 {format_bytes(self.writer.written_bytes)} / 视频 {self.writer.written_frames} 帧, "
+                            f"丢弃 {self.writer.dropped}, 内存 {format_bytes(sample.rss)}, "
+                            f"CPU {cpu_percent_between(last_sample, sample):.1f}%")
+                last_sample = sample
@@ -0,0 +1,170 @@
+import asyncio
+import time
+import traceback
+
+from livekit import rtc
+from livekit.rtc import TrackKind
+
+from app.core.reconnect import ReconnectPolicy, should_reconnect
+from app.core.session_manager import SessionManager
+from app.core.subscription_policy import SubscriptionEngine, SubscriptionPolicy
+from app.headless import recorder
+from app.utils.logger import logger
+from app.utils.loop_monitor import LoopMonitor
+
+
+# 不依赖 Qt 的房间运行时：加入房间、按需订阅/录制远程轨道、发布本地音频文件，
+# 所有逻辑都跑在普通 asyncio 事件循环上，供命令行和服务端使用
+class HeadlessRuntime:
+    def __init__(self, url, token, subscribe='all', record=False, output_dir='.', publish=None, loop_publish=True,
+                 reconnect_policy=None):
+        self.url = url
+        self.token = token
+        # subscribe 可以是预设名称 (all/none/audio/speakers) 或 SubscriptionPolicy
+        self.policy = SubscriptionPolicy.from_name(subscribe) if isinstance(subscribe, str) else subscribe
+        self.record = record
+        self.output_dir = output_dir
+        self.publish = publish or []
+        self.loop_publish = loop_publish
+        self.reconnect_policy = reconnect_policy or ReconnectPolicy()
+        self.sessions = SessionManager()
+        self.session = None
+        self.publisher = None
+        self.stopped = asyncio.Event()
+        self.recordings = []
+        self._policy_task = None
+        # 事件循环延迟与慢回调监控，慢回调会写进日志
+        self.loop_monitor = LoopMonitor()
+
+    async def start(self):
+        self.loop_monitor.start()
+        started = time.perf_counter()
+        self.session = await self.sessions.join(self.url, self.token, listener=self,
+                                                auto_subscribe=self.policy.auto_subscribe)
+        logger.info(f"已加入房间 {self.session.name}，耗时 {time.perf_counter() - started:.2f} 秒")
+        if not self.policy.auto_subscribe:
+            self.session.subscription = SubscriptionEngine(self.policy)
+            self.session.subscription.apply(self.session.track_index)
+            self._policy_task = asyncio.ensure_future(self.policy_loop())
+        if self.publish:
+            await self.start_publisher(self.session.room)
+
+    async def start_publisher(self, room):
+        # 只有需要发布时才加载 pydub 等解码依赖
+        from app.services.file_publisher import MultiTrackFilePublisher
+
+        self.publisher = MultiTrackFilePublisher(room)
+        for index, path in enumerate(self.publish):
+            await self.publisher.add_track(f"file-{index}", [path], self.loop_publish)
+        self.publisher.start()
+        logger.info(f"开始发布 {len(self.publish)} 条音频轨道")
+
+    def request_stop(self):
+        self.stopped.set()
+
+    async def run(self, duration=None):
+        await self.start()
+        try:
+            await asyncio.wait_for(self.stopped.wait(), timeout=duration)
+        except asyncio.TimeoutError:
+            logger.info(f"已运行 {duration} 秒，准备退出")
+        finally:
+            await self.stop()
+
+    async def policy_loop(self):
+        # 定期重新评估，让滞回等待到期的取消订阅生效
+        while True:
+            await asyncio.sleep(1.0)
+            for session in self.sessions:
+                if session.subscription and not session.reconnecting:
+                    session.subscription.apply(session.track_index)
+
+    async def stop(self):
+        if self._policy_task:
+            self._policy_task.cancel()
+            self._policy_task = None
+        self.loop_monitor.stop()
+        if self.publisher:
+            await self.publisher.stop()
+            self.publisher = None
+        await self.sessions.close_all()
+        logger.info("已离开所有房间")
+
+    def start_recording(self, session, track_id, track, kind):
+        if kind == TrackKind.KIND_AUDIO:
+            stream = rtc.AudioStream(track=track)
+            coro = recorder.record_audio_stream(stream, track_id, directory=f"{self.output_dir}/recorded_audio")
+            tasks = session.audio_tasks
+            session.recording[track_id] = "Audio"
+        else:
+            stream = rtc.VideoStream(track, format=rtc.VideoBufferType.RGBA)
+            coro = recorder.record_video_stream(stream, track_id, directory=f"{self.output_dir}/recorded_video")
+            tasks = session.video_tasks
+            session.recording[track_id] = "Video"
+        tasks[track_id] = asyncio.ensure_future(coro)
+        tasks[track_id].add_done_callback(self.on_recording_done)
+
+    def on_recording_done(self, task):
+        if not task.cancelled() and task.exception() is None:
+            self.recordings.append(task.result())
+
+    def on_participant_connected(self, session, participant):
+        logger.info(f"参与者 {participant.identity} 已连接")
+
+    def on_participant_disconnected(self, session, participant):
+        logger.info(f"参与者 {participant.identity} 已断开连接")
+        session.track_index.remove_participant(participant)
+
+    def on_track_published(self, session, publication, participant):
+        session.track_index.add_publication(publication, participant)
+        if session.subscription:
+            session.subscription.apply(session.track_index)
+
+    def on_active_speakers_changed(self, session, speakers):
+        if session.subscription:
+            local = session.room.local_participant.identity
+            session.subscription.update_speakers([p.identity for p in speakers if p.identity != local])
+            session.subscription.apply(session.track_index)
+
+    def on_track_unpublished(self, session, publication, participant):
+        session.track_index.remove_publication(publication, participant)
+
+    def on_track_subscribed(self, session, track, publication, participant):
+        logger.info(f"已订阅轨道: {publication.sid} 来自 {participant.identity}")
+        if self.record:
+            self.start_recording(session, publication.sid, track, publication.kind)
+
+    def on_track_unsubscribed(self, session, track, publication, participant):
+        logger.info(f"已取消订阅轨道: {publication.sid} 来自 {participant.identity}")
+        session.cancel_track_tasks(publication.sid)
+        session.recording.pop(publication.sid, None)
+
+    def on_disconnected(self, session, reason):
+        if session.reconnecting or self.stopped.is_set() or self.sessions.get(session.key) is not session:
+            return
+        if not should_reconnect(reason):
+            logger.info(f"房间 {session.key} 已断开，原因: {reason}，退出")
+            self.request_stop()
+            return
+        logger.warning(f"房间 {session.key} 连接断开，原因: {reason}，开始自动重连")
+        asyncio.ensure_future(self.reconnect(session))
+
+    async def reconnect(self, session):
+        snapshot = session.snapshot()
+        try:
+            ok = await self.sessions.reconnect(session, self.reconnect_policy)
+        except Exception:
+            logger.error(f"重连时发生错误: \n{traceback.format_exc()}")
+            ok = False
+        if not ok:
+            logger.error(f"房间 {session.key} 重连失败，退出")
+            self.request_stop()
+            return
+        # 录制会在 track_subscribed 里重新开始，这里只需要恢复订阅状态
+        session.restore(snapshot)
+        session.pending_media.clear()
+        session.recording.update({sid: "Audio" for sid in session.audio_tasks})
+        session.recording.update({sid: "Video" for sid in session.video_tasks})
+        if self.publisher:
+            await self.publisher.stop()
+            await self.start_publisher(session.room)
@@ -6,6 +6,7 @@ from PyQt5.QtGui import QFont
 from qfluentwidgets import setTheme, Theme
 from app.ui.main_window import LiveKitManager
 from app.utils.logger import logger
+from app.utils.metrics import start_exporters
 
 # 设置默认字体
 QApplication.setFont(QFont('Arial', 9))  # 使用 Arial 字体，大小为 9
@@ -18,6 +19,9 @@ async def main():
         app = QApplication(sys.argv)
 
     setTheme(Theme.DARK)
+
+    # 设置 LIVEKIT_METRICS_PORT / LIVEKIT_METRICS_JSON 时导出媒体管线指标
+    start_exporters()
     window = LiveKitManager()
     window.show()
 
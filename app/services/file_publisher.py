@@ -0,0 +1,297 @@
+import asyncio
+import time
+import traceback
+from collections import deque
+
+import numpy as np
+from livekit import rtc
+from livekit.rtc import TrackPublishOptions, TrackSource
+from pydub import AudioSegment
+
+from app.utils.logger import logger
+from app.utils.media_loop import run_in_room
+from app.utils.metrics import metrics
+
+SAMPLE_RATE = 48000
+NUM_CHANNELS = 1
+FRAME_DURATION_MS = 20
+SAMPLES_PER_FRAME = SAMPLE_RATE * FRAME_DURATION_MS // 1000
+
+# 落后超过这么多个 tick 就放弃追赶，重新对齐时钟
+MAX_CATCHUP_TICKS = 5
+
+# 已解码的 PCM 按文件路径缓存，同一个文件被多条轨道使用时只解码一次
+_pcm_cache = {}
+# 正在线程池里解码的文件，同一个文件同时被多条轨道预取时只解码一次
+_decoding = {}
+
+
+def load_pcm(path):
+    pcm = _pcm_cache.get(path)
+    if pcm is None:
+        audio = AudioSegment.from_file(path)
+        audio = audio.set_channels(NUM_CHANNELS).set_frame_rate(SAMPLE_RATE).set_sample_width(2)
+        pcm = np.frombuffer(audio.raw_data, dtype=np.int16)
+        _pcm_cache[path] = pcm
+        logger.info(f"已解码音频文件: {path}, 采样数: {len(pcm)}")
+    return pcm
+
+
+def decode_pcm(path):
+    # pydub 调 ffmpeg 解码会阻塞几百毫秒，放到线程池里做，返回 asyncio Future；已缓存的文件直接返回完成的 Future
+    loop = asyncio.get_running_loop()
+    pcm = _pcm_cache.get(path)
+    if pcm is not None:
+        future = loop.create_future()
+        future.set_result(pcm)
+        return future
+    future = _decoding.get(path)
+    if future is None:
+        future = _decoding[path] = loop.run_in_executor(None, load_pcm, path)
+        future.add_done_callback(lambda _: _decoding.pop(path, None))
+    return future
+
+
+class FileAudioTrack:
+    def __init__(self, name, playlist, loop=True):
+        if not playlist:
+            raise ValueError("播放列表不能为空")
+        self.name = name
+        self.playlist = list(playlist)
+        self.loop = loop
+        self.source = rtc.AudioSource(SAMPLE_RATE, NUM_CHANNELS)
+        self.track = rtc.LocalAudioTrack.create_audio_track(name, self.source)
+        self.publication = None
+        self.finished = False
+
+        self._playlist_index = 0
+        self._pcm = np.zeros(0, dtype=np.int16)
+        self._pos = 0
+        # 预取的下一个文件: (播放列表下标, 解码的 Future)
+        self._next = None
+
+        # 统计数据
+        self.frames_sent = 0
+        self.late_frames = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+        self._sent_times = deque(maxlen=SAMPLE_RATE // SAMPLES_PER_FRAME * 2)
+        self._sent_metric = metrics.counter("publisher_frames_sent_total", "发布的音频帧数", track=name)
+        self._late_metric = metrics.counter("publisher_late_frames_total", "晚于一帧时长发送的音频帧数", track=name)
+        self._lateness_metric = metrics.histogram("publisher_send_lateness_seconds", "音频帧相对节拍的发送延迟",
+                                                  track=name)
+
+    async def load(self):
+        self._pcm = await decode_pcm(self.playlist[0])
+        self._prefetch()
+
+    def _prefetch(self):
+        # 当前文件一开始播放就在后台解码下一个文件，播到文件末尾时不用在节拍里等解码
+        index = self._playlist_index + 1
+        if index >= len(self.playlist):
+            if not self.loop:
+                self._next = None
+                return
+            index = 0
+        self._next = (index, decode_pcm(self.playlist[index]))
+
+    def _advance_playlist(self):
+        # 切到预取好的下一个文件；还没解码完返回 None，播放列表放完 (或解码失败) 返回 False
+        if self._next is None:
+            return False
+        index, future = self._next
+        if not future.done():
+            return None
+        self._next = None
+        self._playlist_index = index
+        self._pos = 0
+        try:
+            self._pcm = future.result()
+        except Exception:
+            logger.error(f"解码音频文件失败: {self.playlist[index]}\n{traceback.format_exc()}")
+            return False
+        self._prefetch()
+        return True
+
+    def next_frame(self):
+        if self.finished:
+            return None
+        chunk = self._pcm[self._pos:self._pos + SAMPLES_PER_FRAME]
+        self._pos += SAMPLES_PER_FRAME
+        if len(chunk) < SAMPLES_PER_FRAME:
+            # 当前文件播完，用下一个文件补齐这一帧
+            # 下一个文件还没解码完时这一帧用静音补齐，下个 tick 再试
+            remaining = SAMPLES_PER_FRAME - len(chunk)
+            advanced = self._advance_playlist()
+            if advanced:
+                tail = self._pcm[:remaining]
+                self._pos = len(tail)
+            else:
+                self.finished = advanced is False
+                tail = np.zeros(0, dtype=np.int16)
+            chunk = np.concatenate((chunk, tail))
+            if len(chunk) < SAMPLES_PER_FRAME:
+                chunk = np.pad(chunk, (0, SAMPLES_PER_FRAME - len(chunk)))
+        return rtc.AudioFrame(
+            data=chunk.tobytes(),
+            sample_rate=SAMPLE_RATE,
+            num_channels=NUM_CHANNELS,
+            samples_per_channel=SAMPLES_PER_FRAME,
+        )
+
+    def record_send(self, lateness):
+        self.frames_sent += 1
+        self._sent_times.append(time.monotonic())
+        self._sent_metric.inc()
+        self._lateness_metric.observe(lateness)
+        if lateness > FRAME_DURATION_MS / 1000:
+            self.late_frames += 1
+            self._late_metric.inc()
+        self.total_lateness += lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+
+    def send_rate(self):
+        # 最近两秒内的实际发送帧率 (帧/秒)
+        if self.finished or len(self._sent_times) < 2:
+            return 0.0
+        span = self._sent_times[-1] - self._sent_times[0]
+        if span <= 0:
+            return 0.0
+        return (len(self._sent_times) - 1) / span
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'frames_sent': self.frames_sent,
+            'send_rate': round(self.send_rate(), 2),
+            'late_frames': self.late_frames,
+            'avg_lateness_ms': round(self.total_lateness / self.frames_sent * 1000, 3) if self.frames_sent else 0.0,
+            'max_lateness_ms': round(self.max_lateness * 1000, 3),
+            'finished': self.finished,
+        }
+
+
+# 用一个共享的节拍时钟驱动多条文件音频轨道：
+# 每个 tick 为所有轨道各取一帧并发调用 capture_frame，100 条轨道也只有一个 sleep 循环
+class MultiTrackFilePublisher:
+    def __init__(self, room, frame_duration_ms=FRAME_DURATION_MS, stats_interval=5.0):
+        self.room = room
+        self.interval = frame_duration_ms / 1000
+        self.stats_interval = stats_interval
+        self.tracks = {}
+        self.skipped_ticks = 0
+        self._skipped_metric = metrics.counter("publisher_skipped_ticks_total", "发布时钟落后而跳过的 tick 数")
+        self._task = None
+        self._tracks_added = asyncio.Event()
+
+    async def add_track(self, name, playlist, loop=True, source=TrackSource.SOURCE_MICROPHONE):
+        if name in self.tracks:
+            raise ValueError(f"轨道名称已存在: {name}")
+        track = FileAudioTrack(name, playlist, loop)
+        await track.load()
+        options = TrackPublishOptions()
+        options.source = source
+        track.publication = await run_in_room(self.room, self.room.local_participant.publish_track(track.track, options))
+        self.tracks[name] = track
+        self._tracks_added.set()
+        logger.info(f"已发布文件音频轨道: {name}, 播放列表: {track.playlist}")
+        return track
+
+    async def remove_track(self, name):
+        track = self.tracks.pop(name, None)
+        if track is None:
+            return
+        metrics.remove(track=name)
+        try:
+            if track.publication:
+                await run_in_room(self.room, self.room.local_participant.unpublish_track(track.publication.sid))
+        except Exception:
+            logger.error(f"取消发布文件音频轨道失败: {name}\n{traceback.format_exc()}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for name in list(self.tracks):
+            await self.remove_track(name)
+
+    @property
+    def is_running(self):
+        return self._task is not None and not self._task.done()
+
+    async def _send(self, track, deadline, loop):
+        frame = track.next_frame()
+        if frame is None:
+            return
+        await track.source.capture_frame(frame)
+        track.record_send(loop.time() - deadline)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        tick = 0
+        next_stats = start + self.stats_interval
+        try:
+            while True:
+                tick += 1
+                deadline = start + tick * self.interval
+                delay = deadline - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif -delay > MAX_CATCHUP_TICKS * self.interval:
+                    # 事件循环被长时间阻塞，丢弃落下的 tick 并重新对齐
+                    missed = int(-delay / self.interval)
+                    self.skipped_ticks += missed
+                    self._skipped_metric.inc(missed)
+                    start += missed * self.interval
+                    logger.warning(f"文件发布时钟落后 {-delay * 1000:.1f}ms，跳过 {missed} 个 tick")
+
+                active = [t for t in self.tracks.values() if not t.finished]
+                if not active:
+                    # 所有轨道都播完了：不再每个 tick 空转，等 add_track 加入新轨道后重新对齐时钟
+                    self.log_stats()
+                    self._tracks_added.clear()
+                    await self._tracks_added.wait()
+                    start, tick = loop.time(), 0
+                    next_stats = start + self.stats_interval
+                    continue
+                results = await asyncio.gather(*(self._send(t, deadline, loop) for t in active),
+                                               return_exceptions=True)
+                for track, result in zip(active, results):
+                    if isinstance(result, Exception):
+                        logger.error(f"推送音频帧失败: {track.name}, {result}")
+
+                if loop.time() >= next_stats:
+                    next_stats += self.stats_interval
+                    self.log_stats()
+        except asyncio.CancelledError:
+            pass
+
+    def stats(self):
+        return [track.stats() for track in self.tracks.values()]
+
+    def summary(self):
+        stats = self.stats()
+        if not stats:
+            return {'tracks': 0, 'send_rate': 0.0, 'avg_lateness_ms': 0.0, 'max_lateness_ms': 0.0,
+                    'skipped_ticks': self.skipped_ticks}
+        return {
+            'tracks': len(stats),
+            'send_rate': round(sum(s['send_rate'] for s in stats) / len(stats), 2),
+            'avg_lateness_ms': round(sum(s['avg_lateness_ms'] for s in stats) / len(stats), 3),
+            'max_lateness_ms': max(s['max_lateness_ms'] for s in stats),
+            'skipped_ticks': self.skipped_ticks,
+        }
+
+    def log_stats(self):
+        summary = self.summary()
+        logger.info(f"文件发布统计: {summary['tracks']} 条轨道, 平均发送速率 {summary['send_rate']} 帧/秒, "
+                    f"平均延迟 {summary['avg_lateness_ms']}ms, 最大延迟 {summary['max_lateness_ms']}ms")
@@ -0,0 +1,125 @@
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+
+from app.utils.logger import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    room TEXT NOT NULL,
+    participant TEXT,
+    kind TEXT NOT NULL,
+    content TEXT NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_room_ts ON history (room, ts, id);
+CREATE INDEX IF NOT EXISTS idx_history_participant_ts ON history (participant, ts, id);
+CREATE INDEX IF NOT EXISTS idx_history_ts ON history (ts, id);
+"""
+
+_STOP = object()
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+# 聊天与房间事件的本地历史记录：写入先进入队列，由后台线程按批次在一个事务中提交；
+# 读取按 (ts, id) 做键集分页，翻看几周的历史也只查一页
+class HistoryStore:
+    def __init__(self, path='livekit_history.db', batch_size=200, flush_interval=0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._read_conn = None
+        self._read_lock = threading.Lock()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        conn = _connect(self.path)
+        conn.executescript(SCHEMA)
+        conn.close()
+        self._read_conn = _connect(self.path)
+        self._thread = threading.Thread(target=self._writer, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, room, kind, content, participant=None, ts=None):
+        self._queue.put((room, participant, kind, content, ts if ts is not None else time.time()))
+
+    def close(self):
+        if self._thread:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        if self._read_conn:
+            self._read_conn.close()
+            self._read_conn = None
+
+    def _writer(self):
+        conn = _connect(self.path)
+        batch = []
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is _STOP:
+                    self._commit(conn, batch)
+                    break
+                if item is not None:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                    self._commit(conn, batch)
+                    batch = []
+                    deadline = None
+        finally:
+            conn.close()
+
+    def _commit(self, conn, batch):
+        if not batch:
+            return
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO history (room, participant, kind, content, ts) VALUES (?, ?, ?, ?, ?)", batch)
+        except sqlite3.Error:
+            logger.error(f"写入历史记录失败，丢弃 {len(batch)} 条: \n{traceback.format_exc()}")
+
+    def page(self, room=None, participant=None, before=None, limit=100):
+        # before 为上一页最旧记录的 (ts, id)，返回按时间倒序的一页记录
+        clauses = []
+        params = []
+        if room is not None:
+            clauses.append("room = ?")
+            params.append(room)
+        if participant is not None:
+            clauses.append("participant = ?")
+            params.append(participant)
+        if before is not None:
+            clauses.append("(ts < ? OR (ts = ? AND id < ?))")
+            params.extend([before[0], before[0], before[1]])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (f"SELECT id, room, participant, kind, content, ts FROM history {where} "
+               f"ORDER BY ts DESC, id DESC LIMIT ?")
+        params.append(limit)
+        with self._read_lock:
+            rows = self._read_conn.execute(sql, params).fetchall()
+        return [
+            {'id': r[0], 'room': r[1], 'participant': r[2], 'kind': r[3], 'content': r[4], 'ts': r[5]}
+            for r in rows
+        ]
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import time
+from collections import deque
+
+from app.services.synthetic_media import SyntheticAudioTrack, SyntheticVideoTrack, SAMPLE_RATE, SAMPLES_PER_FRAME
+from app.utils.lazy_import import lazy_import
+from app.utils.logger import logger
+from app.utils.stats import percentile
+
+np = lazy_import('numpy')
+
+# 数据通道上的探针消息主题
+PROBE_TOPIC = "latency-probe"
+
+# 视觉码: 2 行 x 32 列的黑白方块，共 64 位 = 16 位魔数 + 16 位序号 + 32 位毫秒时间戳
+MARKER_MAGIC = 0xA55A
+MARKER_COLUMNS = 32
+MARKER_ROWS = 2
+
+# 发布端和订阅端需要时钟同步 (同一台机器或 NTP)，时间戳取墙上时钟毫秒的低 32 位
+TIMESTAMP_MASK = 0xFFFFFFFF
+MAX_VALID_LATENCY_MS = 60_000
+
+
+def now_ms():
+    return int(time.time() * 1000) & TIMESTAMP_MASK
+
+
+def latency_since(ts_ms, now=None):
+    latency = ((now if now is not None else now_ms()) - ts_ms) & TIMESTAMP_MASK
+    return latency if latency <= MAX_VALID_LATENCY_MS else None
+
+
+def _marker_bits(seq, ts_ms):
+    value = (MARKER_MAGIC << 48) | ((seq & 0xFFFF) << 32) | (ts_ms & TIMESTAMP_MASK)
+    return [(value >> (63 - i)) & 1 for i in range(MARKER_COLUMNS * MARKER_ROWS)]
+
+
+def _block_size(width):
+    # 方块尺寸随画面宽度缩放，订阅到低分辨率的 simulcast 层时仍可解码
+    return width / MARKER_COLUMNS
+
+
+def encode_video_marker(canvas, seq, ts_ms):
+    height, width = canvas.shape[:2]
+    block = _block_size(width)
+    channels = min(canvas.shape[2], 3)
+    for i, bit in enumerate(_marker_bits(seq, ts_ms)):
+        row, col = divmod(i, MARKER_COLUMNS)
+        y0, y1 = int(row * block), int((row + 1) * block)
+        x0, x1 = int(col * block), int((col + 1) * block)
+        canvas[y0:y1, x0:x1, :channels] = 255 if bit else 0
+    return canvas
+
+
+def decode_video_marker(arr):
+    # arr 为 (height, width, 3|4) 的 uint8 数组，只采样每个方块中心的像素
+    height, width = arr.shape[:2]
+    block = _block_size(width)
+    if block < 2 or height < block * MARKER_ROWS:
+        return None
+    index = np.arange(MARKER_COLUMNS * MARKER_ROWS)
+    rows, cols = np.divmod(index, MARKER_COLUMNS)
+    ys = ((rows + 0.5) * block).astype(np.intp)
+    xs = ((cols + 0.5) * block).astype(np.intp)
+    luma = arr[ys, xs, :3].mean(axis=1)
+    bits = (luma > 127).astype(np.uint64)
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    if value >> 48 != MARKER_MAGIC:
+        return None
+    return (value >> 32) & 0xFFFF, value & TIMESTAMP_MASK
+
+
+class LatencyStats:
+    def __init__(self, capacity=1000):
+        self.samples = deque(maxlen=capacity)
+        self.last_seq = None
+        self.total = 0
+
+    def add(self, latency_ms, seq=None):
+        if seq is not None:
+            if seq == self.last_seq:
+                # 同一帧被重复送达 (比如画面静止时)，只统计第一次
+                return
+            self.last_seq = seq
+        self.samples.append(latency_ms)
+        self.total += 1
+
+    def percentiles(self):
+        values = list(self.samples)
+        return {
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+        }
+
+    def histogram(self, bins=20):
+        if not self.samples:
+            return np.zeros(0), np.zeros(0)
+        counts, edges = np.histogram(np.fromiter(self.samples, dtype=np.float64), bins=bins)
+        return counts, edges
+
+
+# 带视觉码的合成视频，每一帧都带有序号和发送时间
+class ProbeVideoTrack(SyntheticVideoTrack):
+    def render(self, index):
+        canvas = super().render(index)
+        return encode_video_marker(canvas, index, now_ms())
+
+
+# 周期性发出短促的提示音，并在提示音开始的那一帧通过数据通道发送探针消息
+class ProbeAudioTrack(SyntheticAudioTrack):
+    def __init__(self, name="probe_audio", period=1.0, beep_ms=100, frequency=1000.0):
+        super().__init__(name, frequency=frequency, amplitude=0.5)
+        self.room = None
+        self.seq = 0
+        self._period_frames = max(int(period * SAMPLE_RATE / SAMPLES_PER_FRAME), 2)
+        self._beep_frames = max(beep_ms * SAMPLE_RATE // 1000 // SAMPLES_PER_FRAME, 1)
+        self._frame_index = 0
+        self._silence = np.zeros(SAMPLES_PER_FRAME, dtype=np.int16)
+
+    async def publish(self, room):
+        self.room = room
+        return await super().publish(room)
+
+    def next_samples(self):
+        position = self._frame_index % self._period_frames
+        self._frame_index += 1
+        if position == 0:
+            self.seq = (self.seq + 1) & 0xFFFF
+            payload = json.dumps({'track': self.name, 'seq': self.seq, 'ts': now_ms()})
+            asyncio.ensure_future(self.room.local_participant.publish_data(payload, reliable=True, topic=PROBE_TOPIC))
+        if position < self._beep_frames:
+            return super().next_samples()
+        return self._silence
+
+
+# 基于能量门限的起音检测，静音持续一段时间后能量越过门限才算一次起音
+class AudioOnsetDetector:
+    def __init__(self, threshold=0.05, min_silence_frames=10):
+        self.threshold = threshold
+        self.min_silence_frames = min_silence_frames
+        self._silent_frames = min_silence_frames
+
+    def feed(self, samples):
+        energy = np.sqrt(np.mean(np.square(samples.astype(np.float32) / 32768.0))) if len(samples) else 0.0
+        if energy >= self.threshold:
+            onset = self._silent_frames >= self.min_silence_frames
+            self._silent_frames = 0
+            return onset
+        self._silent_frames += 1
+        return False
+
+
+# 把数据通道收到的探针消息和音频起音配对，按发布者身份分组；
+# 探针消息和音频谁先到都可以，配对成功后回调 on_match(identity, seq, latency_ms)。
+# 起音只和它之前 window_ms 以内最近的一个探针配对，窗口外的探针和没有探针的起音直接丢弃，
+# 某个提示音被静音或漏检时只丢这一次读数，不会让后面的起音全部错配到更早的探针上
+class ProbeMatcher:
+    def __init__(self, on_match=None, window_ms=2000, max_pending=16):
+        self.on_match = on_match
+        self.window_ms = window_ms
+        self.max_pending = max_pending
+        self.pending_probes = {}
+        self.pending_onsets = {}
+
+    def _queue(self, table, identity):
+        return table.setdefault(identity, deque(maxlen=self.max_pending))
+
+    def on_probe_packet(self, identity, payload):
+        try:
+            probe = json.loads(payload)
+            seq, ts_ms = probe['seq'], probe['ts']
+        except (ValueError, TypeError, KeyError):
+            logger.warning(f"无法解析延迟探针消息: {payload!r}")
+            return
+        onsets = self.pending_onsets.get(identity)
+        while onsets:
+            latency = latency_since(ts_ms, onsets[0])
+            if latency is None:
+                # 起音早于这个探针：探针是按顺序送达的，它自己的探针已经丢了
+                onsets.popleft()
+                continue
+            if latency <= self.window_ms:
+                self._match(identity, seq, ts_ms, onsets.popleft())
+                return
+            break
+        self._queue(self.pending_probes, identity).append((seq, ts_ms))
+
+    def on_onset(self, identity, onset_ms=None):
+        # 起音检测在媒体线程，配对在界面线程时由检测方带上检测到的时间
+        onset_ms = onset_ms if onset_ms is not None else now_ms()
+        probes = self.pending_probes.get(identity)
+        matched = None
+        while probes:
+            seq, ts_ms = probes[0]
+            latency = latency_since(ts_ms, onset_ms)
+            if latency is None and latency_since(onset_ms, ts_ms) is not None:
+                # 探针在起音之后才发出，留给后面的起音
+                break
+            probes.popleft()
+            if latency is not None and latency <= self.window_ms:
+                # 窗口内更晚的探针离起音更近，前一个候选的起音被漏检了
+                matched = (seq, ts_ms)
+        if matched:
+            self._match(identity, matched[0], matched[1], onset_ms)
+        else:
+            self._queue(self.pending_onsets, identity).append(onset_ms)
+
+    def _match(self, identity, seq, ts_ms, onset_ms):
+        latency = latency_since(ts_ms, onset_ms)
+        if latency is not None and self.on_match:
+            self.on_match(identity, seq, latency)
@@ -1,11 +1,34 @@
+import asyncio
+import os
+import time
+from urllib.parse import urlsplit, urlunsplit
+
 from livekit import rtc
 from livekit.rtc import RoomOptions
 
+from app.utils.lazy_import import lazy_import
+from app.utils.media_loop import run_in_loop
+
+# 签发令牌和预热连接时才用到
+api = lazy_import('livekit.api')
+aiohttp = lazy_import('aiohttp')
+jwt = lazy_import('jwt')
+
+# 设置了这两个环境变量时可以在本地签发令牌 (媒体工作进程入会、重连时换掉过期的令牌)
+API_KEY_ENV = "LIVEKIT_API_KEY"
+API_SECRET_ENV = "LIVEKIT_API_SECRET"
+
+
+async def create_room():
+    # 在哪个事件循环里调用，Room 的事件监听和内部 Future 就绑定到哪个循环
+    return rtc.Room()
 
-async def join_livekit_room(url, token):
-    room = rtc.Room()
+
+async def join_livekit_room(url, token, auto_subscribe=True, room=None):
+    # 传入 room 时可以在连接前先注册好事件监听器
+    room = room or rtc.Room()
     options = RoomOptions(
-        auto_subscribe=True,
+        auto_subscribe=auto_subscribe,
         dynacast=True,
     )
 
@@ -17,3 +40,63 @@ async def join_livekit_room(url, token):
         raise
 
     return room
+
+
+def make_access_token(api_key, api_secret, room, identity, name=None, **grants):
+    # grants 透传给 VideoGrants，例如录制端用 hidden=True, can_publish=False
+    return api.AccessToken(api_key, api_secret).with_identity(identity).with_name(name or identity).with_grants(
+        api.VideoGrants(room_join=True, room=room, **grants)
+    ).to_jwt()
+
+
+def api_credentials():
+    key, secret = os.environ.get(API_KEY_ENV), os.environ.get(API_SECRET_ENV)
+    return (key, secret) if key and secret else None
+
+
+def renew_access_token(token, api_key, api_secret):
+    # 按原令牌的身份、名称和权限重新签发一个 (原令牌可以已经过期)；
+    # 原令牌不是这对密钥签发的时抛出 jwt.InvalidTokenError，不能借机给别人的令牌续期
+    jwt.decode(token, api_secret, algorithms=["HS256"], issuer=api_key, options={"verify_exp": False})
+    claims = api.TokenVerifier(api_key, api_secret).verify(token, verify_signature=False)
+    access = api.AccessToken(api_key, api_secret).with_identity(claims.identity).with_name(claims.name)
+    access = access.with_grants(claims.video).with_metadata(claims.metadata)
+    if claims.kind:
+        access = access.with_kind(claims.kind)
+    if claims.attributes:
+        access = access.with_attributes(claims.attributes)
+    return access.to_jwt()
+
+
+def signal_http_url(url):
+    # ws(s)://host -> http(s)://host，用于访问信令服务器的 HTTP 接口
+    parts = urlsplit(url)
+    scheme = {'ws': 'http', 'wss': 'https'}.get(parts.scheme, parts.scheme)
+    return urlunsplit((scheme, parts.netloc, parts.path.rstrip('/'), '', ''))
+
+
+async def prewarm_connection(url, token=None, timeout=5.0, loop=None):
+    # 在用户点击加入之前完成能提前做的工作：初始化 FFI 运行时并创建 Room 对象、解析 DNS、
+    # 建立 TLS 连接并让服务端校验令牌；返回创建好的 Room 和各阶段耗时 (秒)。
+    # loop 为 Room 所在的事件循环 (媒体线程)，不指定时就是当前循环
+    timings = {}
+    started = time.perf_counter()
+    room = await run_in_loop(loop, create_room())
+    timings['room'] = time.perf_counter() - started
+
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme in ('wss', 'https') else 80)
+    started = time.perf_counter()
+    await asyncio.get_running_loop().getaddrinfo(parts.hostname, port)
+    timings['dns'] = time.perf_counter() - started
+
+    if token:
+        started = time.perf_counter()
+        validate_url = f"{signal_http_url(url)}/rtc/validate"
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as http:
+            async with http.get(validate_url, params={'access_token': token}) as response:
+                timings['validate_status'] = response.status
+                await response.read()
+        timings['signal'] = time.perf_counter() - started
+
+    return room, timings
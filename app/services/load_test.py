@@ -0,0 +1,268 @@
+import asyncio
+import json
+import multiprocessing
+import sys
+import time
+import traceback
+
+import numpy as np
+from livekit import rtc
+from livekit.rtc import TrackKind
+
+from app.services.latency_probe import (PROBE_TOPIC, ProbeAudioTrack, ProbeVideoTrack, ProbeMatcher,
+                                        AudioOnsetDetector, decode_video_marker, latency_since)
+from app.services.livekit_service import join_livekit_room, make_access_token
+from app.services.synthetic_media import SyntheticAudioTrack, SyntheticVideoTrack
+from app.utils.logger import logger
+from app.utils.stats import summarize
+
+# 本地 livekit-server --dev 的默认配置
+DEFAULT_SCENARIO = {
+    'url': 'ws://localhost:7880',
+    'api_key': 'devkey',
+    'api_secret': 'secret',
+    'room': 'load-test',
+    'participants': 10,
+    'processes': 2,
+    'join_interval': 0.2,
+    'duration': 30,
+    # probe 为 True 时发布带延迟探针的媒体，订阅端统计端到端延迟
+    'publish': {'audio': True, 'video': True, 'width': 320, 'height': 240, 'fps': 15, 'probe': False},
+    # mode: all 订阅全部远端轨道, none 不订阅, neighbors 只订阅后面 count 个参与者的轨道
+    'subscribe': {'mode': 'all', 'count': 3, 'kinds': ['audio', 'video']},
+    'report': 'load_test_report.json',
+}
+
+
+def load_scenario(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        scenario = json.load(f)
+    merged = dict(DEFAULT_SCENARIO)
+    for key, value in scenario.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = {**merged[key], **value}
+        else:
+            merged[key] = value
+    return merged
+
+
+def participant_identity(index):
+    return f"sim-{index:04d}"
+
+
+def make_token(scenario, identity):
+    return make_access_token(scenario['api_key'], scenario['api_secret'], scenario['room'], identity)
+
+
+class SimulatedParticipant:
+    def __init__(self, scenario, index):
+        self.scenario = scenario
+        self.index = index
+        self.identity = participant_identity(index)
+        self.room = None
+        self.media = []
+        self.stream_tasks = []
+        self.subscribe_requested = {}
+        self.probe_matcher = ProbeMatcher(
+            on_match=lambda identity, seq, latency: self.stats['audio_latencies_ms'].append(latency))
+        self.stats = {
+            'identity': self.identity,
+            'join_time': None,
+            'subscription_latencies': [],
+            'video_latencies_ms': [],
+            'audio_latencies_ms': [],
+            'tracks': {},
+            'errors': [],
+        }
+
+    def wants(self, participant_identity_, kind):
+        config = self.scenario['subscribe']
+        kind_name = 'audio' if kind == TrackKind.KIND_AUDIO else 'video'
+        if kind_name not in config.get('kinds', ['audio', 'video']):
+            return False
+        mode = config.get('mode', 'all')
+        if mode == 'none':
+            return False
+        if mode == 'neighbors':
+            try:
+                other = int(participant_identity_.rsplit('-', 1)[1])
+            except (IndexError, ValueError):
+                return False
+            total = self.scenario['participants']
+            distance = (other - self.index) % total
+            return 0 < distance <= config.get('count', 3)
+        return True
+
+    def on_track_published(self, publication, participant):
+        if self.wants(participant.identity, publication.kind):
+            self.subscribe_requested[publication.sid] = time.monotonic()
+            publication.set_subscribed(True)
+
+    def on_data_received(self, packet):
+        if packet.topic == PROBE_TOPIC and packet.participant:
+            self.probe_matcher.on_probe_packet(packet.participant.identity, packet.data)
+
+    def on_track_subscribed(self, track, publication, participant):
+        requested = self.subscribe_requested.pop(publication.sid, None)
+        if requested is not None:
+            self.stats['subscription_latencies'].append(time.monotonic() - requested)
+        self.stream_tasks.append(asyncio.create_task(self.consume(track, publication, participant)))
+
+    async def consume(self, track, publication, participant):
+        kind = 'audio' if publication.kind == TrackKind.KIND_AUDIO else 'video'
+        entry = {'participant': participant.identity, 'kind': kind, 'frames': 0, 'first_frame': None, 'last_frame': None}
+        self.stats['tracks'][publication.sid] = entry
+        probe = self.scenario['publish'].get('probe')
+        if kind == 'audio':
+            stream = rtc.AudioStream(track)
+        else:
+            stream = rtc.VideoStream(track, format=rtc.VideoBufferType.RGB24 if probe else None)
+        detector = AudioOnsetDetector()
+        last_seq = None
+        try:
+            async for event in stream:
+                now = time.monotonic()
+                if entry['first_frame'] is None:
+                    entry['first_frame'] = now
+                entry['last_frame'] = now
+                entry['frames'] += 1
+                if not probe:
+                    continue
+                frame = event.frame
+                if kind == 'audio':
+                    if detector.feed(np.frombuffer(frame.data, dtype=np.int16)):
+                        self.probe_matcher.on_onset(participant.identity)
+                else:
+                    arr = np.frombuffer(frame.data, dtype=np.uint8).reshape((frame.height, frame.width, 3))
+                    marker = decode_video_marker(arr)
+                    if marker and marker[0] != last_seq:
+                        last_seq = marker[0]
+                        latency = latency_since(marker[1])
+                        if latency is not None:
+                            self.stats['video_latencies_ms'].append(latency)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await stream.aclose()
+
+    async def run(self, join_at, end_at):
+        await asyncio.sleep(max(0.0, join_at - time.time()))
+        try:
+            token = make_token(self.scenario, self.identity)
+            started = time.monotonic()
+            self.room = rtc.Room()
+            self.room.on("track_published", self.on_track_published)
+            self.room.on("track_subscribed", self.on_track_subscribed)
+            self.room.on("data_received", self.on_data_received)
+            self.room = await join_livekit_room(self.scenario['url'], token, auto_subscribe=False, room=self.room)
+            self.stats['join_time'] = time.monotonic() - started
+
+            # 已经在房间内的轨道不会触发 track_published，需要手动处理
+            for participant in self.room.remote_participants.values():
+                for publication in participant.track_publications.values():
+                    self.on_track_published(publication, participant)
+
+            publish = self.scenario['publish']
+            audio_cls = ProbeAudioTrack if publish.get('probe') else SyntheticAudioTrack
+            video_cls = ProbeVideoTrack if publish.get('probe') else SyntheticVideoTrack
+            if publish.get('audio'):
+                self.media.append(audio_cls(f"{self.identity}-audio"))
+            if publish.get('video'):
+                self.media.append(video_cls(f"{self.identity}-video", publish.get('width', 320),
+                                            publish.get('height', 240), publish.get('fps', 15)))
+            for media in self.media:
+                await media.publish(self.room)
+
+            await asyncio.sleep(max(0.0, end_at - time.time()))
+        except Exception as e:
+            self.stats['errors'].append(str(e))
+            logger.error(f"模拟参与者 {self.identity} 运行失败: \n{traceback.format_exc()}")
+        finally:
+            await self.shutdown()
+        return self.result()
+
+    async def shutdown(self):
+        for media in self.media:
+            await media.stop()
+        for task in self.stream_tasks:
+            task.cancel()
+        await asyncio.gather(*self.stream_tasks, return_exceptions=True)
+        if self.room:
+            try:
+                await self.room.disconnect()
+            except Exception as e:
+                self.stats['errors'].append(f"断开连接失败: {e}")
+
+    def result(self):
+        for entry in self.stats['tracks'].values():
+            first, last = entry.pop('first_frame'), entry.pop('last_frame')
+            span = (last - first) if first is not None and last is not None else 0
+            entry['fps'] = round((entry['frames'] - 1) / span, 2) if span > 0 else 0.0
+        return self.stats
+
+
+async def run_participants(scenario, indices, start_at, end_at):
+    participants = [SimulatedParticipant(scenario, i) for i in indices]
+    return await asyncio.gather(*(
+        p.run(start_at + p.index * scenario['join_interval'], end_at) for p in participants
+    ))
+
+
+def _worker(args):
+    scenario, indices, start_at, end_at = args
+    return asyncio.run(run_participants(scenario, indices, start_at, end_at))
+
+
+def build_report(scenario, results, wall_time):
+    join_times = [r['join_time'] for r in results if r['join_time'] is not None]
+    latencies = [lat for r in results for lat in r['subscription_latencies']]
+    tracks = [t for r in results for t in r['tracks'].values()]
+    video_fps = [t['fps'] for t in tracks if t['kind'] == 'video']
+    audio_fps = [t['fps'] for t in tracks if t['kind'] == 'audio']
+    return {
+        'scenario': scenario,
+        'wall_time': round(wall_time, 3),
+        'participants': len(results),
+        'joined': len(join_times),
+        'errors': sum(len(r['errors']) for r in results),
+        'join_time_ms': summarize(join_times, scale=1000),
+        'subscription_latency_ms': summarize(latencies, scale=1000),
+        'subscribed_tracks': len(tracks),
+        'video_fps': summarize(video_fps, digits=2),
+        'audio_fps': summarize(audio_fps, digits=2),
+        'video_latency_ms': summarize([v for r in results for v in r['video_latencies_ms']]),
+        'audio_latency_ms': summarize([v for r in results for v in r['audio_latencies_ms']]),
+        'details': results,
+    }
+
+
+def run_load_test(scenario):
+    total = scenario['participants']
+    processes = max(1, min(scenario['processes'], total))
+    chunks = [list(range(total))[i::processes] for i in range(processes)]
+
+    # 预留进程启动时间，所有进程按同一个墙上时钟错开加入
+    start_at = time.time() + 2.0
+    end_at = start_at + total * scenario['join_interval'] + scenario['duration']
+    logger.info(f"开始压测: {total} 个参与者, {processes} 个进程, 房间 {scenario['room']}")
+
+    started = time.monotonic()
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(processes) as pool:
+        chunk_results = pool.map(_worker, [(scenario, chunk, start_at, end_at) for chunk in chunks])
+    results = sorted((r for chunk in chunk_results for r in chunk), key=lambda r: r['identity'])
+
+    report = build_report(scenario, results, time.monotonic() - started)
+    with open(scenario['report'], 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logger.info(f"压测完成: 加入 {report['joined']}/{report['participants']}, 错误 {report['errors']}, "
+                f"加入耗时 {report['join_time_ms']}, 订阅延迟 {report['subscription_latency_ms']}, "
+                f"视频帧率 {report['video_fps']}, 视频延迟 {report['video_latency_ms']}, "
+                f"报告已写入 {scenario['report']}")
+    return report
+
+
+if __name__ == '__main__':
+    # 用法: python -m app.services.load_test scenarios/load_test.json
+    scenario = load_scenario(sys.argv[1]) if len(sys.argv) > 1 else dict(DEFAULT_SCENARIO)
+    run_load_test(scenario)
@@ -0,0 +1,270 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+import traceback
+
+from livekit import rtc
+
+from app.services.livekit_service import api_credentials, join_livekit_room
+from app.utils.lazy_import import lazy_import
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.utils.shm_ring import FrameRing
+
+np = lazy_import('numpy')
+cv2 = lazy_import('cv2')
+
+# LIVEKIT_MEDIA_WORKERS=N 时播放的音视频由 N 个工作进程订阅和解码，解码后的帧经共享内存交给界面进程。
+# 工作进程以隐藏参与者的身份入会，需要 LIVEKIT_API_KEY / LIVEKIT_API_SECRET 签发令牌
+WORKERS_ENV = "LIVEKIT_MEDIA_WORKERS"
+
+# 视频槽按 1080p RGB24 分配，更大的画面在工作进程里先缩小；音频槽最多放 100ms 的 48kHz 单声道
+VIDEO_SLOTS = 3
+VIDEO_MAX_SIZE = (1920, 1080)
+AUDIO_SLOTS = 64
+AUDIO_SAMPLE_RATE = 48000
+AUDIO_SLOT_BYTES = AUDIO_SAMPLE_RATE // 10 * 2
+
+
+def media_worker_count():
+    try:
+        return max(0, int(os.environ.get(WORKERS_ENV, "0")))
+    except ValueError:
+        return 0
+
+
+def worker_credentials():
+    return api_credentials()
+
+
+def fit_frame(arr, capacity):
+    # RGB24 画面超过槽容量时按比例缩小
+    height, width = arr.shape[:2]
+    if arr.nbytes <= capacity:
+        return arr
+    scale = (capacity / arr.nbytes) ** 0.5
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    return cv2.resize(arr, size, interpolation=cv2.INTER_AREA)
+
+
+# 工作进程：用自己的连接订阅分配给它的轨道，解码后的帧写进界面进程创建的共享内存环
+class MediaWorker:
+    def __init__(self, index, url, token, commands):
+        self.index = index
+        self.url = url
+        self.token = token
+        self.commands = commands
+        self.room = None
+        # {sid: (类型, 共享内存名)}，订阅完成后再开始读流
+        self.wanted = {}
+        self.tasks = {}
+
+    async def run(self):
+        self.room = rtc.Room()
+        self.room.on("track_published", self.on_track_published)
+        self.room.on("track_subscribed", self.on_track_subscribed)
+        self.room.on("disconnected", self.on_disconnected)
+        try:
+            await join_livekit_room(self.url, self.token, auto_subscribe=False, room=self.room)
+            logger.info(f"媒体工作进程 {self.index} 已入会 (pid {os.getpid()})")
+            await self.serve()
+        except Exception:
+            logger.error(f"媒体工作进程 {self.index} 运行失败: \n{traceback.format_exc()}")
+        finally:
+            await self.shutdown()
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        parent = multiprocessing.parent_process()
+        while self.room.isconnected():
+            try:
+                command = await loop.run_in_executor(None, self.commands.get, True, 1.0)
+            except queue.Empty:
+                # 界面进程异常退出时不会发送退出命令
+                if parent is not None and not parent.is_alive():
+                    return
+                continue
+            if command is None:
+                return
+            action, track_id, *args = command
+            if action == 'play':
+                self.play(track_id, *args)
+            elif action == 'stop':
+                await self.stop(track_id)
+
+    def find_publication(self, track_id):
+        for participant in list(self.room.remote_participants.values()):
+            publication = participant.track_publications.get(track_id)
+            if publication is not None:
+                return publication
+        return None
+
+    def play(self, track_id, kind, ring_name):
+        self.wanted[track_id] = (kind, ring_name)
+        publication = self.find_publication(track_id)
+        if publication is None:
+            # 工作进程入会晚于界面进程，轨道可能还没同步过来，等 track_published
+            return
+        if publication.track is not None:
+            self.on_track_subscribed(publication.track, publication, None)
+        else:
+            publication.set_subscribed(True)
+
+    async def stop(self, track_id):
+        self.wanted.pop(track_id, None)
+        task = self.tasks.pop(track_id, None)
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        publication = self.find_publication(track_id)
+        if publication is not None and publication.subscribed:
+            publication.set_subscribed(False)
+
+    def on_track_published(self, publication, participant):
+        if publication.sid in self.wanted:
+            publication.set_subscribed(True)
+
+    def on_track_subscribed(self, track, publication, participant):
+        wanted = self.wanted.get(publication.sid)
+        task = self.tasks.get(publication.sid)
+        if wanted is None or (task is not None and not task.done()):
+            return
+        kind, ring_name = wanted
+        task = self.tasks[publication.sid] = asyncio.ensure_future(self.pump(track, kind, ring_name))
+        task.add_done_callback(lambda done, sid=publication.sid: self.forget_task(sid, done))
+
+    def forget_task(self, sid, task):
+        # 读流任务自己结束 (轨道取消发布、共享内存已被界面进程释放) 后移除，之后同一条轨道还能再次播放
+        if self.tasks.get(sid) is task:
+            del self.tasks[sid]
+
+    def on_disconnected(self, reason):
+        logger.warning(f"媒体工作进程 {self.index} 已断开，原因: {reason}")
+
+    async def pump(self, track, kind, ring_name):
+        try:
+            ring = FrameRing.attach(ring_name)
+        except FileNotFoundError:
+            # 界面进程已经停止播放这条轨道
+            return
+        if kind == "Video":
+            stream = rtc.VideoStream(track, format=rtc.VideoBufferType.RGB24)
+        else:
+            stream = rtc.AudioStream(track=track, sample_rate=AUDIO_SAMPLE_RATE, num_channels=1)
+        try:
+            async for frame_event in stream:
+                frame = frame_event.frame
+                pts = getattr(frame_event, 'timestamp_us', 0)
+                if kind == "Video":
+                    arr = np.frombuffer(frame.data, dtype=np.uint8).reshape((frame.height, frame.width, 3))
+                    arr = fit_frame(arr, ring.capacity)
+                    ring.write(np.ascontiguousarray(arr), arr.shape[1], arr.shape[0], pts)
+                else:
+                    ring.write(frame.data, frame.samples_per_channel, 1, pts)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.error(f"媒体工作进程 {self.index} 读取轨道 {track.sid} 失败: \n{traceback.format_exc()}")
+        finally:
+            ring.mark_closed()
+            ring.close()
+            await stream.aclose()
+
+    async def shutdown(self):
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        self.tasks.clear()
+        if self.room and self.room.isconnected():
+            await self.room.disconnect()
+
+
+def _worker_main(index, url, token, commands):
+    asyncio.run(MediaWorker(index, url, token, commands).run())
+
+
+# 界面进程一侧：启动工作进程，按轨道分配 (当前轨道最少的进程优先)，并为每条轨道创建共享内存环
+class MediaWorkerPool:
+    def __init__(self, url, make_token, processes):
+        # make_token(index) 返回第 index 个工作进程的入会令牌
+        self.url = url
+        self.make_token = make_token
+        self.processes = processes
+        self.workers = []
+        # {sid: (工作进程序号, FrameRing)}
+        self.assignments = {}
+        # open 在界面线程调用，release 在媒体线程调用
+        self._lock = threading.RLock()
+        self._ctx = multiprocessing.get_context('spawn')
+
+    def start(self):
+        for index in range(self.processes):
+            commands = self._ctx.Queue()
+            process = self._ctx.Process(target=_worker_main, name=f"media-worker-{index}",
+                                        args=(index, self.url, self.make_token(index), commands), daemon=True)
+            process.start()
+            self.workers.append((process, commands))
+        logger.info(f"已启动 {self.processes} 个媒体工作进程")
+
+    def load(self):
+        counts = [0] * len(self.workers)
+        for index, _ in self.assignments.values():
+            counts[index] += 1
+        return counts
+
+    def open(self, track_id, kind):
+        # 返回读端 FrameRing，读完后调用 release(track_id, ring)；
+        # 没有存活的工作进程时抛出 RuntimeError，由调用方回退到进程内播放
+        with self._lock:
+            self.stop(track_id)
+            counts = self.load()
+            alive = [i for i, (process, _) in enumerate(self.workers) if process.is_alive()]
+            if not alive:
+                raise RuntimeError("没有可用的媒体工作进程")
+            index = min(alive, key=lambda i: counts[i])
+            if kind == "Video":
+                ring = FrameRing.create(VIDEO_SLOTS, VIDEO_MAX_SIZE[0] * VIDEO_MAX_SIZE[1] * 3)
+            else:
+                ring = FrameRing.create(AUDIO_SLOTS, AUDIO_SLOT_BYTES)
+            self.assignments[track_id] = (index, ring)
+            self.workers[index][1].put(('play', track_id, kind, ring.name))
+            self.update_load_metrics()
+        return ring
+
+    def stop(self, track_id):
+        with self._lock:
+            assignment = self.assignments.pop(track_id, None)
+            if assignment is not None:
+                self.workers[assignment[0]][1].put(('stop', track_id))
+                self.update_load_metrics()
+
+    def release(self, track_id, ring):
+        # 由读端在读完后调用：共享内存只能在读端不再访问之后关闭，工作进程那一侧只是解除映射，
+        # 创建方 (这里) 负责 unlink
+        with self._lock:
+            assignment = self.assignments.get(track_id)
+            if assignment is not None and assignment[1] is ring:
+                self.stop(track_id)
+        ring.close()
+
+    def update_load_metrics(self):
+        for index, count in enumerate(self.load()):
+            metrics.gauge("media_worker_tracks", "分配给媒体工作进程的轨道数", worker=index).set(count)
+
+    def close(self, timeout=3.0):
+        # 共享内存环由各自的读端在退出时关闭
+        with self._lock:
+            self.assignments.clear()
+        for process, commands in self.workers:
+            commands.put(None)
+        for process, commands in self.workers:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+            commands.close()
+        self.workers.clear()
+        for index in range(self.processes):
+            metrics.remove(worker=index)
+        logger.info("媒体工作进程已全部退出")
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import traceback
+
+from livekit import rtc
+from livekit.rtc import TrackPublishOptions, TrackSource
+
+from app.utils.logger import logger
+from app.utils.media_loop import run_in_room
+from app.utils.metrics import metrics
+
+
+# 屏幕共享轨道：界面线程采集到画面后调用 push，帧交给房间的事件循环 (媒体线程) 转换和发送，
+# 不占用界面线程；媒体线程还没发出上一帧时新帧直接覆盖它，只发最新的画面
+class ScreenSharePublisher:
+    def __init__(self, room, name="screen", width=1920, height=1080):
+        self.room = room
+        self.name = name
+        self.source = rtc.VideoSource(width, height)
+        self.track = rtc.LocalVideoTrack.create_video_track(name, self.source)
+        self.publication = None
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self._loop = getattr(room, '_loop', None) or asyncio.get_event_loop()
+        self._lock = threading.Lock()
+        self._pending = None
+        self._closed = False
+        self._sent_metric = metrics.counter("screen_share_frames_sent_total", "发送的屏幕共享帧数", track=name)
+        self._dropped_metric = metrics.counter("screen_share_frames_dropped_total", "发送前被新画面覆盖的屏幕共享帧数",
+                                               track=name)
+
+    async def publish(self):
+        options = TrackPublishOptions()
+        options.source = TrackSource.SOURCE_SCREENSHARE
+        self.publication = await run_in_room(self.room, self.room.local_participant.publish_track(self.track, options))
+        logger.info(f"已发布屏幕共享轨道: {self.name}")
+        return self.publication
+
+    def push(self, data, width, height, timestamp_us, owner=None):
+        # data: BGRA 像素 (bytes/memoryview)；owner 持有 data 底层内存的对象 (例如 QImage)，发送前保持引用
+        with self._lock:
+            if self._closed:
+                return
+            superseded, self._pending = self._pending, (data, width, height, timestamp_us, owner)
+        if superseded is None:
+            self._loop.call_soon_threadsafe(self._send)
+        else:
+            self.frames_dropped += 1
+            self._dropped_metric.inc()
+
+    def _send(self):
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        data, width, height, timestamp_us, owner = pending
+        try:
+            frame = rtc.VideoFrame(width, height, rtc.VideoBufferType.BGRA, data)
+            self.source.capture_frame(frame, timestamp_us=timestamp_us)
+            self.frames_sent += 1
+            self._sent_metric.inc()
+        except Exception:
+            logger.error(f"发送屏幕共享画面失败: {self.name}\n{traceback.format_exc()}")
+
+    async def stop(self, unpublish=True):
+        # 房间已断开时 unpublish=False，只释放本地资源
+        with self._lock:
+            self._closed = True
+            self._pending = None
+        metrics.remove(track=self.name)
+        if unpublish and self.publication:
+            try:
+                await run_in_room(self.room, self.room.local_participant.unpublish_track(self.publication.sid))
+            except Exception:
+                logger.error(f"取消发布屏幕共享轨道失败: {self.name}\n{traceback.format_exc()}")
+        self.publication = None
+        logger.info(f"屏幕共享轨道已停止: {self.name}，发送 {self.frames_sent} 帧，覆盖丢弃 {self.frames_dropped} 帧")
@@ -0,0 +1,120 @@
+import math
+import time
+
+from app.utils.lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+SILENCE_DB = -100.0
+
+
+# 本地发言者检测：每条音频轨道在一个二维数组里占一行，保存最近 window_ms 的采样 (环形写入)；
+# 每个 tick 对所有行做一次向量化的能量计算，再用指数平滑 + 挂起时间 (hangover) 排名，
+# 说话间的短暂停顿不会让发言者掉出排名。
+# 行按轨道区分 (key)，排名按发言者 (group) 合并：同一个参与者发布了多条音频轨道时取其中最响的一条
+class SpeakerDetector:
+    def __init__(self, sample_rate=16000, window_ms=300, threshold_db=-45.0, hangover=0.8, smoothing=0.5,
+                 clock=time.monotonic):
+        self.sample_rate = sample_rate
+        self.window = int(sample_rate * window_ms / 1000)
+        self.window_seconds = window_ms / 1000
+        self.threshold_db = threshold_db
+        self.hangover = hangover
+        self.smoothing = smoothing
+        self.clock = clock
+
+        self.keys = []
+        self.groups = []
+        self.rows = {}
+        self.samples = np.zeros((0, self.window), dtype=np.float32)
+        self.write_pos = np.zeros(0, dtype=np.int64)
+        self.last_feed = np.zeros(0, dtype=np.float64)
+        self.levels = np.zeros(0, dtype=np.float64)
+        self.last_active = np.zeros(0, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _grow(self):
+        capacity = max(8, len(self.samples) * 2)
+        extra = capacity - len(self.samples)
+        self.samples = np.concatenate([self.samples, np.zeros((extra, self.window), dtype=np.float32)])
+        self.write_pos = np.concatenate([self.write_pos, np.zeros(extra, dtype=np.int64)])
+        self.last_feed = np.concatenate([self.last_feed, np.zeros(extra)])
+        self.levels = np.concatenate([self.levels, np.full(extra, SILENCE_DB)])
+        self.last_active = np.concatenate([self.last_active, np.full(extra, -math.inf)])
+
+    def _row(self, key, group):
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row >= len(self.samples):
+                self._grow()
+            self.rows[key] = row
+            self.keys.append(key)
+            self.groups.append(key if group is None else group)
+            self.samples[row] = 0
+            self.write_pos[row] = 0
+            self.levels[row] = SILENCE_DB
+            self.last_active[row] = -math.inf
+        return row
+
+    def feed(self, key, samples, group=None):
+        # samples 为 int16 单声道采样；group 为这条轨道所属的发言者，不指定时就是 key 本身
+        row = self._row(key, group)
+        n = len(samples)
+        if n >= self.window:
+            self.samples[row] = samples[-self.window:]
+            self.write_pos[row] = 0
+        elif n:
+            pos = int(self.write_pos[row])
+            first = min(n, self.window - pos)
+            self.samples[row, pos:pos + first] = samples[:first]
+            if first < n:
+                self.samples[row, :n - first] = samples[first:]
+            self.write_pos[row] = (pos + n) % self.window
+        self.last_feed[row] = self.clock()
+
+    def remove(self, key):
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        last = len(self.keys) - 1
+        if row != last:
+            # 用最后一行填补空位，数组保持紧凑
+            moved = self.keys[last]
+            self.keys[row] = moved
+            self.groups[row] = self.groups[last]
+            self.rows[moved] = row
+            for array in (self.samples, self.write_pos, self.last_feed, self.levels, self.last_active):
+                array[row] = array[last]
+        self.keys.pop()
+        self.groups.pop()
+
+    def tick(self):
+        # 返回按音量从大到小排列的正在发言者 [(group, 平滑后的 dBFS)]
+        count = len(self.keys)
+        if not count:
+            return []
+        now = self.clock()
+        window = self.samples[:count]
+        rms = np.sqrt(np.mean(window * window, axis=1))
+        # 一个窗口内没有新数据 (静音/暂停发送) 的轨道按静音处理
+        rms[now - self.last_feed[:count] > self.window_seconds] = 0.0
+        db = 20 * np.log10(rms / 32768.0 + 1e-10)
+        levels = self.levels[:count]
+        levels *= self.smoothing
+        levels += (1 - self.smoothing) * db
+
+        active = levels > self.threshold_db
+        self.last_active[:count][active] = now
+        speaking = np.nonzero(now - self.last_active[:count] < self.hangover)[0]
+        order = speaking[np.argsort(-levels[speaking], kind='stable')]
+        ranking = []
+        seen = set()
+        for i in order:
+            group = self.groups[i]
+            if group not in seen:
+                seen.add(group)
+                ranking.append((group, float(levels[i])))
+        return ranking
@@ -0,0 +1,138 @@
+import asyncio
+import time
+import traceback
+
+from livekit import rtc
+from livekit.rtc import TrackPublishOptions, TrackSource
+
+from app.utils.lazy_import import lazy_import
+from app.utils.logger import logger
+
+np = lazy_import('numpy')
+
+SAMPLE_RATE = 48000
+NUM_CHANNELS = 1
+FRAME_DURATION_MS = 20
+SAMPLES_PER_FRAME = SAMPLE_RATE * FRAME_DURATION_MS // 1000
+
+
+# 合成正弦波音频轨道，用于压测时代替真实麦克风
+class SyntheticAudioTrack:
+    def __init__(self, name="synthetic_audio", frequency=440.0, amplitude=0.2):
+        self.name = name
+        self.source = rtc.AudioSource(SAMPLE_RATE, NUM_CHANNELS)
+        self.track = rtc.LocalAudioTrack.create_audio_track(name, self.source)
+        self.publication = None
+        self.frames_sent = 0
+        self._task = None
+
+        # 预先生成一秒的波形，循环取用
+        t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+        self._wave = (np.sin(2 * np.pi * frequency * t) * amplitude * 32767).astype(np.int16)
+        self._pos = 0
+
+    def next_samples(self):
+        chunk = self._wave[self._pos:self._pos + SAMPLES_PER_FRAME]
+        self._pos = (self._pos + SAMPLES_PER_FRAME) % len(self._wave)
+        return chunk
+
+    async def publish(self, room):
+        options = TrackPublishOptions()
+        options.source = TrackSource.SOURCE_MICROPHONE
+        self.publication = await room.local_participant.publish_track(self.track, options)
+        self._task = asyncio.create_task(self._run())
+        return self.publication
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        interval = FRAME_DURATION_MS / 1000
+        start = loop.time()
+        tick = 0
+        try:
+            while True:
+                tick += 1
+                frame = rtc.AudioFrame(
+                    data=self.next_samples().tobytes(),
+                    sample_rate=SAMPLE_RATE,
+                    num_channels=NUM_CHANNELS,
+                    samples_per_channel=SAMPLES_PER_FRAME,
+                )
+                await self.source.capture_frame(frame)
+                self.frames_sent += 1
+                delay = start + tick * interval - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.error(f"合成音频推送失败: {self.name}\n{traceback.format_exc()}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# 合成视频轨道：在灰色背景上移动的竖条，便于肉眼确认画面在动
+class SyntheticVideoTrack:
+    def __init__(self, name="synthetic_video", width=320, height=240, fps=15):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.source = rtc.VideoSource(width, height)
+        self.track = rtc.LocalVideoTrack.create_video_track(name, self.source)
+        self.publication = None
+        self.frames_sent = 0
+        self._task = None
+
+        self._background = np.full((height, width, 4), 64, dtype=np.uint8)
+        self._background[:, :, 3] = 255
+        self._canvas = self._background.copy()
+        self._bar_width = max(width // 16, 1)
+
+    def render(self, index):
+        np.copyto(self._canvas, self._background)
+        x = (index * self._bar_width) % self.width
+        self._canvas[:, x:x + self._bar_width, :3] = 230
+        return self._canvas
+
+    async def publish(self, room):
+        options = TrackPublishOptions()
+        options.source = TrackSource.SOURCE_CAMERA
+        self.publication = await room.local_participant.publish_track(self.track, options)
+        self._task = asyncio.create_task(self._run())
+        return self.publication
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.fps
+        start = loop.time()
+        tick = 0
+        try:
+            while True:
+                canvas = self.render(tick)
+                frame = rtc.VideoFrame(self.width, self.height, rtc.VideoBufferType.RGBA, canvas.tobytes())
+                self.source.capture_frame(frame, timestamp_us=int(time.time() * 1_000_000))
+                self.frames_sent += 1
+                tick += 1
+                delay = start + tick * interval - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.error(f"合成视频推送失败: {self.name}\n{traceback.format_exc()}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
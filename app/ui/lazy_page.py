@@ -0,0 +1,49 @@
+import time
+
+from PyQt5.QtWidgets import QVBoxLayout, QWidget
+
+from app.utils.logger import logger
+
+
+# 延迟构建的页面：先把一个空的占位页加到导航栏，第一次显示时才调用 factory() 构建真正的页面
+# (摄像头枚举、QAudioRecorder、pyqtgraph 等都推迟到这时)。
+# 构建之前调用 deferred 中列出的方法 (update_room_status 这类设置状态的方法) 只记下每个方法最近一次的参数，
+# 构建后按调用顺序重放；构建之后的属性访问直接转给真正的页面
+class LazyPage(QWidget):
+    def __init__(self, factory, parent=None, deferred=()):
+        super().__init__(parent)
+        self.factory = factory
+        self.deferred = frozenset(deferred)
+        self.page = None
+        self._pending = {}
+        self._layout = QVBoxLayout(self)
+        self._layout.setContentsMargins(0, 0, 0, 0)
+
+    def showEvent(self, event):
+        self.ensure_built()
+        super().showEvent(event)
+
+    def ensure_built(self):
+        if self.page is None:
+            started = time.perf_counter()
+            self.page = self.factory()
+            self._layout.addWidget(self.page)
+            pending, self._pending = self._pending, {}
+            for name, args in pending.items():
+                getattr(self.page, name)(*args)
+            logger.info(f"页面 {self.objectName()} 已构建，耗时 {(time.perf_counter() - started) * 1000:.1f}ms")
+        return self.page
+
+    def __getattr__(self, name):
+        # 只有 QWidget 自身没有的属性才会走到这里
+        page = self.__dict__.get('page')
+        if page is not None:
+            return getattr(page, name)
+        if name not in self.__dict__.get('deferred', ()):
+            raise AttributeError(name)
+
+        def record(*args):
+            self._pending.pop(name, None)
+            self._pending[name] = args
+
+        return record
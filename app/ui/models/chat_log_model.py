@@ -0,0 +1,103 @@
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QTimer, pyqtSignal
+
+from app.utils.message_store import MessageStore
+
+
+# 聊天与房间事件日志的列表模型：追加操作先进入待处理队列，每个 UI 帧合并提交一次；
+# 数据保存在固定容量的 MessageStore 中，视图只渲染可见的行
+class ChatLogModel(QAbstractListModel):
+    flushed = pyqtSignal()
+
+    def __init__(self, capacity=5000, parent=None):
+        super().__init__(parent)
+        self.store = MessageStore(capacity)
+        self.pending = []
+        self.filter_text = ""
+        self.filtered = None
+
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(16)
+        self.flush_timer.timeout.connect(self.flush)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.filtered) if self.filtered is not None else len(self.store)
+
+    def message_at(self, row):
+        if self.filtered is not None:
+            return self.store.by_seq(self.filtered[row])
+        return self.store.at(row)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        message = self.message_at(index.row())
+        if message is None:
+            return None
+        if role == Qt.DisplayRole:
+            return message.text
+        if role == Qt.ToolTipRole:
+            return message.text
+        return None
+
+    def append(self, text, kind='chat', ts=None):
+        self.pending.append((text, kind, ts))
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+
+        if self.filtered is not None or len(pending) >= self.store.capacity:
+            # 过滤状态下或一次追加超过容量时，直接重置模型更简单也更快
+            self.beginResetModel()
+            for text, kind, ts in pending:
+                self.store.append(text, kind, ts)
+            if self.filtered is not None:
+                self.filtered = self.store.search(self.filter_text)
+            self.endResetModel()
+            self.flushed.emit()
+            return
+
+        overflow = len(self.store) + len(pending) - self.store.capacity
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            self.store.evict_oldest(overflow)
+            self.endRemoveRows()
+
+        first = len(self.store)
+        self.beginInsertRows(QModelIndex(), first, first + len(pending) - 1)
+        for text, kind, ts in pending:
+            self.store.append(text, kind, ts)
+        self.endInsertRows()
+        self.flushed.emit()
+
+    def prepend(self, items):
+        # items 按时间从旧到新排列，返回实际插入的条数；缓冲区已满时不插入，返回 0
+        self.flush()
+        free = self.store.capacity - len(self.store)
+        if not items or free <= 0:
+            return 0
+        # 只放得下 free 条，保留其中最新的；有空位时 store.prepend 不会拒绝，插入的行数就是 len(items)
+        items = items[-free:]
+        if self.filtered is not None:
+            self.beginResetModel()
+            inserted = sum(self.store.prepend(text, kind, ts) for text, kind, ts in reversed(items))
+            self.filtered = self.store.search(self.filter_text)
+            self.endResetModel()
+        else:
+            self.beginInsertRows(QModelIndex(), 0, len(items) - 1)
+            inserted = sum(self.store.prepend(text, kind, ts) for text, kind, ts in reversed(items))
+            self.endInsertRows()
+        return inserted
+
+    def set_filter(self, text):
+        self.flush()
+        self.beginResetModel()
+        self.filter_text = text
+        self.filtered = self.store.search(text) if text else None
+        self.endResetModel()
@@ -0,0 +1,114 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QEvent, QRect, pyqtSignal
+from PyQt5.QtWidgets import QStyledItemDelegate, QStyleOptionButton, QStyle, QApplication
+
+COLUMNS = ["参与者", "轨道ID", "类型", "操作"]
+ACTION_COLUMN = 3
+
+
+# 参与者/轨道表格的数据模型，以轨道 ID 为键做增量更新，只插入、修改或删除变化的行
+class TracksTableModel(QAbstractTableModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.row_of = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        track = self.rows[index.row()]
+        column = index.column()
+        if column == 0:
+            return track['participant']
+        if column == 1:
+            return track['id']
+        if column == 2:
+            return track['type']
+        return "取消订阅" if track['subscribed'] else "订阅"
+
+    def track_at(self, row):
+        return self.rows[row]
+
+    def set_tracks(self, tracks_data):
+        new_tracks = {track['id']: track for track in tracks_data}
+
+        # 1. 删除已经不存在的行，连续的行合并成一次 removeRows
+        removed = [row for row, track in enumerate(self.rows) if track['id'] not in new_tracks]
+        for first, last in reversed(_contiguous_ranges(removed)):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.rows[first:last + 1]
+            self.endRemoveRows()
+        if removed:
+            self.row_of = {track['id']: row for row, track in enumerate(self.rows)}
+
+        # 2. 原地更新内容有变化的行
+        for row, track in enumerate(self.rows):
+            new_track = new_tracks[track['id']]
+            if new_track != track:
+                self.rows[row] = new_track
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(COLUMNS) - 1))
+
+        # 3. 新轨道一次性追加到末尾
+        added = [track for track in tracks_data if track['id'] not in self.row_of]
+        if added:
+            first = len(self.rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            for track in added:
+                self.row_of[track['id']] = len(self.rows)
+                self.rows.append(track)
+            self.endInsertRows()
+
+
+def _contiguous_ranges(rows):
+    ranges = []
+    for row in rows:
+        if ranges and ranges[-1][1] == row - 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return ranges
+
+
+# 操作列的按钮由委托绘制，不再为每一行创建 PushButton
+class ButtonDelegate(QStyledItemDelegate):
+    clicked = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pressed_row = None
+
+    def _button_rect(self, option):
+        return option.rect.adjusted(6, 4, -6, -4)
+
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = QRect(self._button_rect(option))
+        button.text = index.data(Qt.DisplayRole)
+        button.state = QStyle.State_Enabled
+        if self._pressed_row == index.row():
+            button.state |= QStyle.State_Sunken
+        else:
+            button.state |= QStyle.State_Raised
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonPress and self._button_rect(option).contains(event.pos()):
+            self._pressed_row = index.row()
+            return True
+        if event.type() == QEvent.MouseButtonRelease:
+            pressed, self._pressed_row = self._pressed_row, None
+            if pressed == index.row() and self._button_rect(option).contains(event.pos()):
+                self.clicked.emit(index.row())
+            return True
+        return False
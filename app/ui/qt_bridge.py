@@ -0,0 +1,61 @@
+import threading
+import traceback
+from collections import deque
+
+from PyQt5.QtCore import QObject, Qt, pyqtSignal
+
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+
+# 媒体线程 -> 界面线程的调用桥：
+# - post(fn, *args) 按顺序执行，不丢 (房间事件等)
+# - post(fn, *args, key=...) 同一个 key 只保留最新一次 (视频帧、音量等状态)，界面忙时自动合并
+# 任意线程都可以调用 post；界面线程只在队列从空变为非空时被唤醒一次
+class QtBridge(QObject):
+    _wake = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._lock = threading.Lock()
+        self._calls = deque()
+        self._latest = {}
+        self._scheduled = False
+        self._wake.connect(self._drain, Qt.QueuedConnection)
+        self._posted = metrics.counter("qt_bridge_posted_total", "投递到界面线程的调用数")
+        self._coalesced = metrics.counter("qt_bridge_coalesced_total", "被同 key 的新调用覆盖而合并掉的调用数")
+
+    def post(self, callback, *args, key=None):
+        with self._lock:
+            if key is None:
+                self._calls.append((callback, args))
+            else:
+                if key in self._latest:
+                    self._coalesced.inc()
+                self._latest[key] = (callback, args)
+            self._posted.inc()
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._wake.emit()
+
+    def discard(self, key):
+        # 轨道移除时丢掉还没执行的状态更新
+        with self._lock:
+            self._latest.pop(key, None)
+
+    def _drain(self):
+        with self._lock:
+            calls, self._calls = self._calls, deque()
+            latest, self._latest = self._latest, {}
+            self._scheduled = False
+        for callback, args in calls:
+            self._invoke(callback, args)
+        for callback, args in latest.values():
+            self._invoke(callback, args)
+
+    def _invoke(self, callback, args):
+        try:
+            callback(*args)
+        except Exception:
+            logger.error(f"界面线程执行 {getattr(callback, '__qualname__', callback)} 失败: \n{traceback.format_exc()}")
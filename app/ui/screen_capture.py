@@ -0,0 +1,106 @@
+import time
+import traceback
+
+from PyQt5.QtCore import QObject, QTimer, Qt
+from PyQt5.QtGui import QGuiApplication, QImage
+
+from app.utils.capture_throttle import AdaptiveCaptureRate, DirtyTileDetector
+from app.utils.lazy_import import lazy_import
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+np = lazy_import('numpy')
+
+# 32 位的格式在小端机器上的内存排列就是 BGRA，可以直接交给 VideoSource，不用转换
+BGRA_FORMATS = (QImage.Format_RGB32, QImage.Format_ARGB32, QImage.Format_ARGB32_Premultiplied)
+
+
+def image_bytes(image):
+    # QImage 像素内存的只读视图 (不复制)；32 位格式每行没有填充
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    return memoryview(bits)
+
+
+# 用 QScreen.grabWindow 采集整个屏幕或某个窗口 (window_id 为原生窗口句柄，0 表示整个屏幕)。
+# 采集必须在界面线程：每次采集后按块比较画面，没有变化就不交给 sink，并由 AdaptiveCaptureRate 决定下一次采集的间隔，
+# 画面静止时采集频率逐步降到 idle_fps，缩放和发送都省掉，CPU 占用接近空闲。
+# 有变化的画面超过 max_size 时先缩小，再以 sink(image, timestamp_us) 交出 (BGRA 格式的 QImage)
+class ScreenCapture(QObject):
+    def __init__(self, sink, fps=15, idle_fps=1, max_size=(1920, 1080), parent=None):
+        super().__init__(parent)
+        self.sink = sink
+        self.max_size = max_size
+        self.rate = AdaptiveCaptureRate(fps=fps, idle_fps=idle_fps)
+        self.detector = DirtyTileDetector()
+        self.screen = None
+        self.window_id = 0
+        self.capture_seconds = 0.0
+        self.grab_failed = False
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.capture)
+        self._grabs = metrics.counter("screen_capture_grabs_total", "屏幕采集次数")
+        self._skipped = metrics.counter("screen_capture_skipped_total", "画面没有变化而没有发送的采集次数")
+        self._fps = metrics.gauge("screen_capture_fps", "当前的屏幕采集频率")
+        self._seconds = metrics.histogram("screen_capture_seconds", "单次采集、比较 (和缩放) 的耗时")
+
+    @property
+    def active(self):
+        return self.screen is not None
+
+    def start(self, screen=None, window_id=0):
+        self.screen = screen or QGuiApplication.primaryScreen()
+        self.window_id = window_id
+        self.rate.reset()
+        self.detector.reset()
+        self.grab_failed = False
+        target = f"窗口 {window_id:#x}" if window_id else f"屏幕 {self.screen.name()}"
+        logger.info(f"开始采集{target}，最高 {self.rate.fps} 帧/秒，静止时降到 {self.rate.idle_fps} 帧/秒")
+        self.timer.start(0)
+
+    def stop(self):
+        self.timer.stop()
+        if self.screen is not None:
+            logger.info(f"屏幕采集已停止: 采集 {self.rate.captured} 次，发送 {self.rate.sent} 帧，"
+                        f"未变化跳过 {self.rate.skipped} 次")
+        self.screen = None
+
+    def grab(self):
+        image = self.screen.grabWindow(self.window_id).toImage()
+        if not image.isNull() and image.format() not in BGRA_FORMATS:
+            image = image.convertToFormat(QImage.Format_RGB32)
+        return image
+
+    def capture(self):
+        if self.screen is None:
+            return
+        started = time.perf_counter()
+        try:
+            image = self.grab()
+            if image.isNull():
+                # Wayland 等不允许采集屏幕的环境，或者窗口已经关闭；每次开始采集只记录一次
+                if not self.grab_failed:
+                    logger.warning("屏幕采集失败：没有取到画面")
+                self.grab_failed = True
+                self.timer.start(int(1000 / self.rate.idle_fps))
+                return
+            self._grabs.inc()
+            arr = np.frombuffer(image_bytes(image), dtype=np.uint8).reshape(image.height(), image.width(), 4)
+            send = self.rate.update(self.detector.dirty_ratio(arr), time.monotonic())
+            if send:
+                width, height = self.max_size
+                if image.width() > width or image.height() > height:
+                    image = image.scaled(width, height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                self.sink(image, int(time.time() * 1_000_000))
+            else:
+                self._skipped.inc()
+        except Exception:
+            logger.error(f"屏幕采集出错: \n{traceback.format_exc()}")
+        self.capture_seconds = time.perf_counter() - started
+        self._seconds.observe(self.capture_seconds)
+        self._fps.set(self.rate.current_fps)
+        if self.screen is not None:
+            # 间隔从这次采集开始时算起
+            self.timer.start(max(int((self.rate.interval - self.capture_seconds) * 1000), 0))
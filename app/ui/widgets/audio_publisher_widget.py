@@ -1,28 +1,28 @@
 import os
 import asyncio
 import traceback
-from PyQt5.QtCore import Qt, QUrl, QBuffer, QIODevice
-from PyQt5.QtWidgets import QVBoxLayout, QWidget, QLabel, QPushButton
-from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
-from qfluentwidgets import CardWidget, BodyLabel, PushButton, InfoBar, InfoBarPosition
-from livekit.rtc import LocalAudioTrack, TrackPublishOptions, AudioSource, TrackSource, ChatManager, AudioFrame
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import QVBoxLayout, QHBoxLayout, QWidget, QLabel, QFileDialog
+from qfluentwidgets import CardWidget, BodyLabel, PushButton, SpinBox, InfoBar, InfoBarPosition
+from livekit.rtc import ChatManager
+from app.services.file_publisher import MultiTrackFilePublisher
 from app.utils.logger import logger
-from pydub import AudioSegment
-import numpy as np
 
 
 class AudioPublisherWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setup_ui()
-        self.audio_track = None
         self.room_connected = False
-        self.media_player = QMediaPlayer()
-        self.media_player.stateChanged.connect(self.on_media_state_changed)
-        self.audio_buffer = QBuffer()
         self.is_publishing = False
         self.chat_manager = None
         self.current_room = None  # 添加这行
+        self.publisher = None
+        self.playlist = [os.path.join('app', 'test.mp3')]
+
+        # 定时刷新发布统计
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.update_stats_label)
 
     def setup_ui(self):
         layout = QVBoxLayout(self)
@@ -38,13 +38,37 @@ class AudioPublisherWidget(QWidget):
         self.status_label = QLabel("未连接到房间", self)
         self.status_layout.addWidget(self.status_label)
 
+        # 播放列表与并发轨道数
+        self.options_card = CardWidget(self)
+        self.options_layout = QHBoxLayout(self.options_card)
+        self.playlist_label = QLabel(os.path.join('app', 'test.mp3'), self)
+        self.choose_files_button = PushButton('选择文件', self)
+        self.choose_files_button.clicked.connect(self.choose_files)
+        self.track_count_spin = SpinBox(self)
+        self.track_count_spin.setRange(1, 500)
+        self.track_count_spin.setValue(1)
+        self.options_layout.addWidget(self.playlist_label, 1)
+        self.options_layout.addWidget(self.choose_files_button)
+        self.options_layout.addWidget(QLabel("轨道数", self))
+        self.options_layout.addWidget(self.track_count_spin)
+
         self.publish_button = PushButton('发布音频', self)
         self.publish_button.clicked.connect(self.publish_audio)
         self.publish_button.setEnabled(False)
 
+        self.stats_label = QLabel("", self)
+
         layout.addWidget(self.title_label)
         layout.addWidget(self.status_card)
+        layout.addWidget(self.options_card)
         layout.addWidget(self.publish_button)
+        layout.addWidget(self.stats_label)
+
+    def choose_files(self):
+        files, _ = QFileDialog.getOpenFileNames(self, "选择音频文件", "", "音频文件 (*.mp3 *.wav *.ogg *.flac *.m4a)")
+        if files:
+            self.playlist = files
+            self.playlist_label.setText(", ".join(os.path.basename(f) for f in files))
 
     def update_room_status(self, connected, room=None):
         self.room_connected = connected
@@ -59,7 +83,7 @@ class AudioPublisherWidget(QWidget):
             self.publish_button.setEnabled(False)
             self.chat_manager = None
             self.current_room = None  # 清除 room 对象
-            if self.audio_track:
+            if self.publisher:
                 asyncio.create_task(self.unpublish_audio())
 
     def publish_audio(self):
@@ -79,80 +103,55 @@ class AudioPublisherWidget(QWidget):
             await self.chat_manager.send_message("测试连接")
             self.show_info_bar("成功", "已发送测试消息", InfoBarPosition.TOP)
 
-            audio_file = os.path.join('app', 'test.mp3')
-            if not os.path.exists(audio_file):
-                raise FileNotFoundError(f"音频文件不存在: {audio_file}")
+            for audio_file in self.playlist:
+                if not os.path.exists(audio_file):
+                    raise FileNotFoundError(f"音频文件不存在: {audio_file}")
 
-            # 读取音频文件
-            audio = AudioSegment.from_mp3(audio_file)
-            audio = audio.set_channels(1).set_frame_rate(48000)  # 转换为单声道和48kHz采样率
-            self.audio_buffer = QBuffer(self)
-            self.audio_buffer.open(QIODevice.ReadWrite)
-            self.audio_buffer.write(audio.raw_data)
-            self.audio_buffer.seek(0)
-
-            # 创建音频源和轨道
-            self.audio_source = AudioSource(sample_rate=48000, num_channels=1)  # 提供必需的参数
-            self.audio_track = LocalAudioTrack.create_audio_track("file_audio", source=self.audio_source)
-
-            # 发布音频轨道
-            options = TrackPublishOptions()
-            options.source = TrackSource.SOURCE_MICROPHONE
-            await self.current_room.local_participant.publish_track(self.audio_track, options)
+            # 所有轨道共用一个发布引擎和节拍时钟
+            track_count = self.track_count_spin.value()
+            self.publisher = MultiTrackFilePublisher(self.current_room)
+            for i in range(track_count):
+                name = "file_audio" if track_count == 1 else f"file_audio_{i}"
+                await self.publisher.add_track(name, self.playlist)
 
             # 开始播放音频
+            self.publisher.start()
             self.is_publishing = True
             self.publish_button.setText("停止发布")
-            asyncio.create_task(self.stream_audio())
+            self.stats_timer.start(1000)
 
-            self.show_info_bar("成功", "音频文件已发布到房间并开始播放", InfoBarPosition.TOP)
+            self.show_info_bar("成功", f"已发布 {track_count} 条音频轨道并开始播放", InfoBarPosition.TOP)
         except Exception as e:
             logger.error(f"发布音频文件失败: \n{traceback.format_exc()}")
+            if self.publisher:
+                await self.publisher.stop()
+                self.publisher = None
             self.show_info_bar("错误", f"发布音频文件失败: {str(e)}", InfoBarPosition.TOP, duration=3000, style='error')
 
-    async def stream_audio(self):
-        chunk_size = 960  # 20ms at 48kHz
-        while self.is_publishing:
-            chunk = self.audio_buffer.read(chunk_size * 2)  # 16-bit audio, so 2 bytes per sample
-            if not chunk:
-                self.audio_buffer.seek(0)
-                chunk = self.audio_buffer.read(chunk_size * 2)
-            if chunk:
-                # 将字节数据转换为 numpy 数组
-                audio_data = np.frombuffer(chunk, dtype=np.int16)
-                # 创建 AudioFrame 对象
-                frame = AudioFrame(
-                    data=audio_data,
-                    samples_per_channel=chunk_size,
-                    sample_rate=48000,
-                    num_channels=1  # 使用 num_channels 替代 number_of_channels
-                )
-                await self.audio_source.capture_frame(frame)
-            await asyncio.sleep(0.02)  # 20ms
+    def update_stats_label(self):
+        if not self.publisher:
+            self.stats_label.setText("")
+            return
+        summary = self.publisher.summary()
+        self.stats_label.setText(
+            f"轨道: {summary['tracks']}  平均发送速率: {summary['send_rate']} 帧/秒  "
+            f"平均延迟: {summary['avg_lateness_ms']}ms  最大延迟: {summary['max_lateness_ms']}ms"
+        )
 
     async def unpublish_audio(self):
         self.is_publishing = False
-        if self.audio_track:
+        self.stats_timer.stop()
+        if self.publisher:
             try:
-                main_window = self.window()
-                room = main_window.get_current_room()
-                if room:
-                    await room.local_participant.unpublish_track(self.audio_track)
-                self.audio_track = None
-                self.audio_source = None
-                if self.audio_buffer:
-                    self.audio_buffer.close()
-                    self.audio_buffer = None
+                await self.publisher.stop()
+                self.publisher = None
                 self.publish_button.setText("发布音频")
+                self.stats_label.setText("")
                 self.show_info_bar("信息", "音频文件已从房间中移除", InfoBarPosition.TOP)
             except Exception as e:
                 logger.error(f"取消发布音频文件失败: \n{traceback.format_exc()}")
                 self.show_info_bar("错误", f"取消发布音频文件失败: {str(e)}", InfoBarPosition.TOP, duration=3000, style='error')
 
-    def on_media_state_changed(self, state):
-        if state == QMediaPlayer.StoppedState and self.is_publishing:
-            asyncio.create_task(self.unpublish_audio())
-
     def show_info_bar(self, title, content, position, duration=2000, style='success'):
         if style == 'error':
             InfoBar.error(
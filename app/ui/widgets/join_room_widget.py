@@ -1,16 +1,32 @@
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QTextEdit, QSplitter, QTableWidget, QTableWidgetItem, QHeaderView, QPushButton
-from PyQt5.QtCore import pyqtSignal, Qt, pyqtSlot
+from PyQt5.QtCore import pyqtSignal, Qt, pyqtSlot, QTimer
 from PyQt5.QtGui import QFont
+from datetime import datetime
 from qfluentwidgets import (LineEdit, PushButton, InfoBar, InfoBarPosition, Theme, 
-                            setTheme, IconWidget, ToolButton, CardWidget, TitleLabel, TextEdit, TableWidget)
+                            setTheme, IconWidget, ToolButton, CardWidget, TitleLabel, TextEdit, TableView,
+                            ListView, SearchLineEdit, ComboBox, BodyLabel, CheckBox, SpinBox)
 from qfluentwidgets import FluentIcon as FIF
-import logging
+from app.ui.models.tracks_table_model import TracksTableModel, ButtonDelegate, ACTION_COLUMN
+from app.ui.models.chat_log_model import ChatLogModel
+
+SUBSCRIPTION_POLICIES = [
+    ('all', "订阅全部轨道"),
+    ('audio', "只订阅音频"),
+    ('speakers', "音频 + 活跃发言者视频"),
+    ('visible', "音频 + 可见画面视频"),
+    ('none', "不自动订阅"),
+]
+
 
 class JoinRoomWidget(QWidget):
     join_room_signal = pyqtSignal(str, str)
     refresh_signal = pyqtSignal()
     subscribe_track_signal = pyqtSignal(str, str)
     unsubscribe_track_signal = pyqtSignal(str, str)
+    load_history_signal = pyqtSignal()
+    switch_room_signal = pyqtSignal(str)
+    leave_room_signal = pyqtSignal(str)
+    prewarm_signal = pyqtSignal(str, str)
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -55,6 +71,61 @@ class JoinRoomWidget(QWidget):
         self.join_button.clicked.connect(self.on_join_clicked)
         left_layout.addWidget(self.join_button)
 
+        # 输入完 URL 和令牌后提前解析 DNS、建立 TLS 并校验令牌，缩短加入后看到首帧的时间
+        self.prewarm_checkbox = CheckBox("预热连接", self)
+        self.prewarm_checkbox.setChecked(True)
+        left_layout.addWidget(self.prewarm_checkbox)
+        self.prewarm_timer = QTimer(self)
+        self.prewarm_timer.setSingleShot(True)
+        self.prewarm_timer.setInterval(500)
+        self.prewarm_timer.timeout.connect(self.on_prewarm_timeout)
+        self.url_input.textChanged.connect(self.schedule_prewarm)
+        self.token_input.textChanged.connect(self.schedule_prewarm)
+
+        # 订阅策略：大房间里不必订阅所有音视频轨道
+        self.policy_selector = ComboBox(self)
+        for name, text in SUBSCRIPTION_POLICIES:
+            self.policy_selector.addItem(text, userData=name)
+        left_layout.addWidget(self.policy_selector)
+
+        max_video_layout = QHBoxLayout()
+        max_video_layout.addWidget(BodyLabel("发言者视频路数", self))
+        self.max_video_input = SpinBox(self)
+        self.max_video_input.setRange(1, 49)
+        self.max_video_input.setValue(4)
+        max_video_layout.addWidget(self.max_video_input)
+        left_layout.addLayout(max_video_layout)
+
+        self.allow_input = LineEdit(self)
+        self.allow_input.setPlaceholderText("只订阅这些参与者 (逗号分隔，可留空)")
+        left_layout.addWidget(self.allow_input)
+        self.deny_input = LineEdit(self)
+        self.deny_input.setPlaceholderText("不订阅这些参与者 (逗号分隔，可留空)")
+        left_layout.addWidget(self.deny_input)
+
+        self.connection_label = BodyLabel("", self)
+        self.connection_label.setWordWrap(True)
+        left_layout.addWidget(self.connection_label)
+
+        # 已加入的房间：切换当前显示的房间或离开房间
+        rooms_title = TitleLabel("已加入房间", self)
+        rooms_title.setFont(QFont("Microsoft YaHei", 12))
+        left_layout.addWidget(rooms_title)
+
+        self.room_selector = ComboBox(self)
+        self.room_selector.setEnabled(False)
+        self.room_selector.currentTextChanged.connect(self.on_room_selected)
+        left_layout.addWidget(self.room_selector)
+
+        self.leave_button = PushButton("离开房间", self)
+        self.leave_button.setEnabled(False)
+        self.leave_button.clicked.connect(self.on_leave_clicked)
+        left_layout.addWidget(self.leave_button)
+
+        self.resource_label = BodyLabel("", self)
+        self.resource_label.setWordWrap(True)
+        left_layout.addWidget(self.resource_label)
+
         left_layout.addStretch(1)
 
         return left_widget
@@ -69,20 +140,40 @@ class JoinRoomWidget(QWidget):
         chat_title.setFont(QFont("Microsoft YaHei", 12))
         right_layout.addWidget(chat_title)
 
-        self.chat_display = TextEdit(self)
-        self.chat_display.setReadOnly(True)
+        chat_tools_layout = QHBoxLayout()
+        self.chat_search = SearchLineEdit(self)
+        self.chat_search.setPlaceholderText("搜索聊天和房间事件")
+        self.chat_search.textChanged.connect(self.on_chat_search_changed)
+        self.load_history_button = PushButton("加载更早记录", self)
+        self.load_history_button.clicked.connect(self.load_history_signal.emit)
+        chat_tools_layout.addWidget(self.chat_search)
+        chat_tools_layout.addWidget(self.load_history_button)
+        right_layout.addLayout(chat_tools_layout)
+
+        # 固定容量的日志模型 + 列表视图，只渲染可见的行
+        self.chat_model = ChatLogModel(capacity=5000, parent=self)
+        self.chat_display = ListView(self)
+        self.chat_display.setModel(self.chat_model)
+        self.chat_display.setUniformItemSizes(True)
+        self.chat_display.setWordWrap(False)
         right_layout.addWidget(self.chat_display)
+        self.chat_follow_tail = True
+        self.chat_display.verticalScrollBar().valueChanged.connect(self.on_chat_scrolled)
+        self.chat_model.flushed.connect(self.on_chat_flushed)
 
         tracks_title = TitleLabel("参与者和轨道", self)
         tracks_title.setFont(QFont("Microsoft YaHei", 12))
         right_layout.addWidget(tracks_title)
 
-        self.tracks_table = TableWidget(self)
-        self.tracks_table.setColumnCount(4)
-        self.tracks_table.setHorizontalHeaderLabels(["参与者", "轨道ID", "类型", "操作"])
+        self.tracks_model = TracksTableModel(self)
+        self.tracks_table = TableView(self)
+        self.tracks_table.setModel(self.tracks_model)
+        self.action_delegate = ButtonDelegate(self.tracks_table)
+        self.action_delegate.clicked.connect(self.on_track_action_clicked)
+        self.tracks_table.setItemDelegateForColumn(ACTION_COLUMN, self.action_delegate)
         self.tracks_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.tracks_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.Fixed)
-        self.tracks_table.setColumnWidth(3, 100)
+        self.tracks_table.horizontalHeader().setSectionResizeMode(ACTION_COLUMN, QHeaderView.Fixed)
+        self.tracks_table.setColumnWidth(ACTION_COLUMN, 100)
         right_layout.addWidget(self.tracks_table)
 
         refresh_button = QPushButton("刷新", self)
@@ -99,6 +190,53 @@ class JoinRoomWidget(QWidget):
             return
         self.join_room_signal.emit(url, token)
 
+    def subscription_options(self):
+        def identities(text):
+            return [item.strip() for item in text.split(',') if item.strip()]
+
+        return {
+            'name': self.policy_selector.currentData() or 'all',
+            'max_video': self.max_video_input.value(),
+            'allow': identities(self.allow_input.text()),
+            'deny': identities(self.deny_input.text()),
+        }
+
+    def schedule_prewarm(self):
+        if self.prewarm_checkbox.isChecked():
+            self.prewarm_timer.start()
+
+    def on_prewarm_timeout(self):
+        url = self.url_input.text().strip()
+        token = self.token_input.text().strip()
+        if url and token and self.prewarm_checkbox.isChecked():
+            self.prewarm_signal.emit(url, token)
+
+    def update_connection_state(self, text):
+        self.connection_label.setText(text)
+
+    def on_room_selected(self, key):
+        if key and self.room_selector.isEnabled():
+            self.switch_room_signal.emit(key)
+
+    def on_leave_clicked(self):
+        key = self.room_selector.currentText()
+        if key:
+            self.leave_room_signal.emit(key)
+
+    def update_sessions(self, keys, active_key):
+        self.room_selector.setEnabled(False)
+        self.room_selector.clear()
+        self.room_selector.addItems(keys)
+        if active_key in keys:
+            self.room_selector.setCurrentIndex(keys.index(active_key))
+        self.room_selector.setEnabled(bool(keys))
+        self.leave_button.setEnabled(bool(keys))
+        if not keys:
+            self.resource_label.setText("")
+
+    def update_resource_stats(self, text):
+        self.resource_label.setText(text)
+
     def on_refresh_clicked(self):
         self.refresh_signal.emit()
 
@@ -108,38 +246,51 @@ class JoinRoomWidget(QWidget):
     def show_error_message(self, message):
         InfoBar.error(title='错误', content=message, orient=InfoBarPosition.TOP, parent=self)
 
-    def add_chat_message(self, message):
-        self.chat_display.append(message)
-        self.chat_display.verticalScrollBar().setValue(self.chat_display.verticalScrollBar().maximum())
-        logging.info(f"添加聊天消息: {message}")
+    def add_chat_message(self, message, kind='chat'):
+        self.chat_model.append(message, kind)
+
+    def prepend_history(self, records):
+        # records 为 HistoryStore.page 返回的一页记录 (按时间倒序)
+        items = [(self.format_history_record(r), r['kind'], r['ts']) for r in reversed(records)]
+        inserted = self.chat_model.prepend(items)
+        if records and not inserted:
+            self.show_error_message("聊天记录已达到显示上限")
+        return inserted
+
+    @staticmethod
+    def format_history_record(record):
+        timestamp = datetime.fromtimestamp(record['ts']).strftime("%m-%d %H:%M:%S")
+        return f"[{timestamp}] {record['content']}"
+
+    def on_chat_search_changed(self, text):
+        self.chat_model.set_filter(text.strip())
+
+    def on_chat_scrolled(self, value):
+        # 用户向上翻看历史时不再自动滚动到底部
+        self.chat_follow_tail = value >= self.chat_display.verticalScrollBar().maximum()
+
+    def on_chat_flushed(self):
+        if self.chat_follow_tail:
+            self.chat_display.scrollToBottom()
 
     @pyqtSlot(list)
     def update_tracks_table(self, tracks_data):
-        self.tracks_table.setRowCount(0)
-        for track in tracks_data:
-            row_position = self.tracks_table.rowCount()
-            self.tracks_table.insertRow(row_position)
-            
-            self.tracks_table.setItem(row_position, 0, QTableWidgetItem(track['participant']))
-            self.tracks_table.setItem(row_position, 1, QTableWidgetItem(track['id']))
-            self.tracks_table.setItem(row_position, 2, QTableWidgetItem(track['type']))
-            
-            if track['subscribed']:
-                unsubscribe_button = PushButton("取消订阅")
-                unsubscribe_button.clicked.connect(lambda checked, p=track['participant'], t=track['id']: self.unsubscribe_track_signal.emit(p, t))
-                self.tracks_table.setCellWidget(row_position, 3, unsubscribe_button)
-            else:
-                subscribe_button = PushButton("订阅")
-                subscribe_button.clicked.connect(lambda checked, p=track['participant'], t=track['id']: self.subscribe_track_signal.emit(p, t))
-                self.tracks_table.setCellWidget(row_position, 3, subscribe_button)
+        # 模型只对比差异并更新变化的行
+        self.tracks_model.set_tracks(tracks_data)
+
+    def on_track_action_clicked(self, row):
+        track = self.tracks_model.track_at(row)
+        if track['subscribed']:
+            self.unsubscribe_track_signal.emit(track['participant'], track['id'])
+        else:
+            self.subscribe_track_signal.emit(track['participant'], track['id'])
 
     def update_connection_status(self, is_connected):
         if is_connected:
             self.show_success_message("已成功连接到房间")
-            self.join_button.setEnabled(False)
-            self.join_button.setText("已连接")
-            self.url_input.setReadOnly(True)
-            self.token_input.setReadOnly(True)
+            # 已连接时仍可以继续加入其他房间
+            self.join_button.setEnabled(True)
+            self.join_button.setText("加入其他房间")
         else:
             self.show_error_message("未连接到房间")
             self.join_button.setEnabled(True)
@@ -147,5 +298,6 @@ class JoinRoomWidget(QWidget):
             self.url_input.setReadOnly(False)
             self.token_input.setReadOnly(False)
 
-    def add_room_event(self, event_type, details):
-        self.add_chat_message(f"房间事件: {event_type}\n详情: {details}")
\ No newline at end of file
+    def add_room_event(self, event_type, details, room=None):
+        prefix = f"[{room}] " if room else ""
+        self.add_chat_message(f"{prefix}房间事件: {event_type} | 详情: {details}", kind='event')
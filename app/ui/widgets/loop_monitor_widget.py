@@ -0,0 +1,123 @@
+import time
+import traceback
+from datetime import datetime
+
+import numpy as np
+import pyqtgraph as pg
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import QVBoxLayout, QHBoxLayout, QWidget, QFileDialog, QTableWidgetItem, QHeaderView
+from qfluentwidgets import CardWidget, BodyLabel, PushButton, SpinBox, TableWidget
+
+from app.utils.logger import logger
+from app.utils.loop_monitor import MAX_SLOW_CALLBACKS
+
+
+# 事件循环监控页面：实时延迟曲线、慢回调列表、导出火焰图数据
+class LoopMonitorWidget(QWidget):
+    def __init__(self, monitor, parent=None):
+        super().__init__(parent)
+        self.monitor = monitor
+        self.shown_slow = 0
+        self.setup_ui()
+
+        # 页面不可见时不刷新曲线
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(500)
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(36, 36, 36, 36)
+        layout.setSpacing(16)
+
+        self.title_label = BodyLabel('事件循环监控', self)
+        self.title_label.setObjectName('titleLabel')
+
+        self.stats_label = BodyLabel("", self)
+
+        self.plot = pg.PlotWidget(self)
+        self.plot.setLabel('left', '延迟 (ms)')
+        self.plot.setLabel('bottom', '时间 (s)')
+        self.plot.showGrid(x=True, y=True, alpha=0.3)
+        self.lag_curve = self.plot.plot(pen=pg.mkPen('#3A86FF', width=1.5))
+        self.threshold_line = pg.InfiniteLine(angle=0, pen=pg.mkPen('#FF006E', style=Qt.DashLine))
+        self.plot.addItem(self.threshold_line)
+
+        self.options_card = CardWidget(self)
+        options_layout = QHBoxLayout(self.options_card)
+        self.threshold_spin = SpinBox(self)
+        self.threshold_spin.setRange(10, 5000)
+        self.threshold_spin.setValue(int(self.monitor.slow_threshold * 1000))
+        self.threshold_spin.valueChanged.connect(self.on_threshold_changed)
+        self.dump_button = PushButton('导出火焰图', self)
+        self.dump_button.clicked.connect(self.on_dump_profile)
+        self.reset_button = PushButton('清空', self)
+        self.reset_button.clicked.connect(self.on_reset)
+        options_layout.addWidget(BodyLabel("慢回调阈值 (ms)", self))
+        options_layout.addWidget(self.threshold_spin)
+        options_layout.addStretch(1)
+        options_layout.addWidget(self.reset_button)
+        options_layout.addWidget(self.dump_button)
+
+        self.slow_table = TableWidget(self)
+        self.slow_table.setColumnCount(4)
+        self.slow_table.setHorizontalHeaderLabels(['时间', '回调', '耗时 (ms)', '卡在'])
+        self.slow_table.verticalHeader().hide()
+        self.slow_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
+
+        layout.addWidget(self.title_label)
+        layout.addWidget(self.stats_label)
+        layout.addWidget(self.plot, 2)
+        layout.addWidget(self.options_card)
+        layout.addWidget(self.slow_table, 1)
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+        history = list(self.monitor.lag_history)
+        if history:
+            now = time.monotonic()
+            data = np.array(history)
+            self.lag_curve.setData(data[:, 0] - now, data[:, 1] * 1000)
+        self.threshold_line.setValue(self.monitor.slow_threshold * 1000)
+        p50, p99 = self.monitor.lag_percentiles(50, 99)
+        self.stats_label.setText(
+            f"p50: {p50 * 1000:.1f}ms  p99: {p99 * 1000:.1f}ms  最大: {self.monitor.max_lag * 1000:.1f}ms  "
+            f"慢回调: {len(self.monitor.slow_callbacks)}  栈采样: {self.monitor.total_samples}")
+        self.refresh_slow_table()
+
+    def refresh_slow_table(self):
+        # 只追加新记录，最新的在最上面
+        count = self.monitor.slow_count
+        if count < self.shown_slow:
+            self.slow_table.setRowCount(0)
+            self.shown_slow = 0
+        new = min(count - self.shown_slow, MAX_SLOW_CALLBACKS)
+        records = list(self.monitor.slow_callbacks)[-new:] if new else []
+        for record in records:
+            self.slow_table.insertRow(0)
+            values = (datetime.fromtimestamp(record.ended_at).strftime('%H:%M:%S'), record.name,
+                      f"{record.duration * 1000:.1f}", record.top_frame)
+            for column, value in enumerate(values):
+                self.slow_table.setItem(0, column, QTableWidgetItem(value))
+        self.slow_table.setRowCount(min(self.slow_table.rowCount(), MAX_SLOW_CALLBACKS))
+        self.shown_slow = count
+
+    def on_threshold_changed(self, value):
+        self.monitor.slow_threshold = value / 1000
+
+    def on_reset(self):
+        self.monitor.reset()
+        self.slow_table.setRowCount(0)
+        self.shown_slow = 0
+
+    def on_dump_profile(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "导出火焰图数据", f"loop_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.folded",
+            "Collapsed stacks (*.folded *.txt)")
+        if not path:
+            return
+        try:
+            self.monitor.dump_collapsed(path)
+        except OSError:
+            logger.error(f"导出火焰图数据失败: \n{traceback.format_exc()}")
@@ -10,6 +10,7 @@ from qfluentwidgets import FluentIcon as FIF
 import tempfile
 import os
 from app.utils.logger import logger
+from app.utils.media_loop import run_in_room
 from livekit.rtc import LocalAudioTrack, TrackPublishOptions, AudioSource, TrackSource
 
 class MicrophoneWidget(QWidget):
@@ -222,7 +223,7 @@ class MicrophoneWidget(QWidget):
                 # 发布音频 track
                 options = TrackPublishOptions()
                 options.source = TrackSource.SOURCE_MICROPHONE
-                await room.local_participant.publish_track(self.audio_track, options)
+                await run_in_room(room, room.local_participant.publish_track(self.audio_track, options))
                 self.show_info_bar("成功", "麦克风音频已发布到房间", InfoBarPosition.TOP)
             else:
                 self.show_info_bar("错误", "无法获取当前房间", InfoBarPosition.TOP, duration=3000, style='error')
@@ -284,7 +285,7 @@ class MicrophoneWidget(QWidget):
                         # 增加超时时间
                         options = TrackPublishOptions()
                         options.source = TrackSource.SOURCE_MICROPHONE
-                        await room.local_participant.publish_track(self.audio_track, options)
+                        await run_in_room(room, room.local_participant.publish_track(self.audio_track, options))
                         self.show_info_bar("成功", "麦克风已启用", InfoBarPosition.TOP)
                     else:
                         self.show_info_bar("错误", "无法获取当前房间", InfoBarPosition.TOP, duration=3000, style='error')
@@ -303,10 +304,10 @@ class MicrophoneWidget(QWidget):
                     if room:
                         # 检查 audio_track 是否有 sid 属性
                         if hasattr(self.audio_track, 'sid'):
-                            await room.local_participant.unpublish_track(self.audio_track.sid)
+                            await run_in_room(room, room.local_participant.unpublish_track(self.audio_track.sid))
                         else:
                             # 如果没有 sid，尝试直接传递 audio_track 对象
-                            await room.local_participant.unpublish_track(self.audio_track)
+                            await run_in_room(room, room.local_participant.unpublish_track(self.audio_track))
                         self.show_info_bar("成功", "麦克风已禁用", InfoBarPosition.TOP)
                     else:
                         self.show_info_bar("错误", "无法获取当前房间", InfoBarPosition.TOP, duration=3000, style='error')
@@ -3,13 +3,16 @@ from PyQt5.QtCore import QProcess, QTimer, pyqtSlot
 from qfluentwidgets import (LineEdit, PushButton, TableWidget, ComboBox, 
                             MessageBox, InfoBar, InfoBarPosition, RadioButton,
                             BodyLabel, StrongBodyLabel, TextEdit)
-from livekit import api
 import asyncio
 import traceback
 from qasync import asyncSlot, asyncClose
-import aiohttp
+from app.utils.lazy_import import lazy_import
 from app.utils.logger import logger
 
+# 连接服务时才用到，不占用启动时间
+api = lazy_import('livekit.api')
+aiohttp = lazy_import('aiohttp')
+
 class RoomManagementWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -0,0 +1,185 @@
+import asyncio
+import traceback
+
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QGuiApplication
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel
+from qfluentwidgets import (SwitchButton, ComboBox, LineEdit, SpinBox, InfoBar, InfoBarPosition, IconWidget,
+                            FluentIcon as FIF, SubtitleLabel, CardWidget)
+
+from app.services.screen_share import ScreenSharePublisher
+from app.ui.screen_capture import ScreenCapture, image_bytes
+from app.utils.logger import logger
+
+
+class ScreenShareWidget(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.parent = parent
+        self.room_connected = False
+        self.current_room = None
+        self.publisher = None
+        self.capture = ScreenCapture(self.send_frame, parent=self)
+        self.initUI()
+
+        # 定时刷新采集统计
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.update_stats_label)
+
+    def initUI(self):
+        main_layout = QVBoxLayout(self)
+        main_layout.setContentsMargins(20, 20, 20, 20)
+        main_layout.setSpacing(20)
+        main_layout.setAlignment(Qt.AlignTop)
+
+        main_layout.addWidget(self.create_status_card())
+        main_layout.addWidget(self.create_options_card())
+
+        self.stats_label = QLabel("", self)
+        main_layout.addWidget(self.stats_label)
+
+    def create_status_card(self):
+        status_card = CardWidget(self)
+        status_layout = QHBoxLayout(status_card)
+        status_layout.setContentsMargins(16, 16, 16, 16)
+        status_layout.setSpacing(16)
+
+        self.status_icon = IconWidget(FIF.CANCEL_MEDIUM, self)
+        self.status_icon.setFixedSize(24, 24)
+        self.status_label = SubtitleLabel("未连接到房间")
+
+        self.share_switch = SwitchButton("共享屏幕", self)
+        self.share_switch.checkedChanged.connect(self.toggle_share)
+
+        status_layout.addWidget(self.status_icon)
+        status_layout.addWidget(self.status_label)
+        status_layout.addStretch()
+        status_layout.addWidget(self.share_switch)
+        return status_card
+
+    def create_options_card(self):
+        options_card = CardWidget(self)
+        options_layout = QHBoxLayout(options_card)
+        options_layout.setContentsMargins(16, 16, 16, 16)
+
+        self.screen_combo = ComboBox(self)
+        for screen in QGuiApplication.screens():
+            size = screen.size()
+            self.screen_combo.addItem(f"{screen.name()} ({size.width()}x{size.height()})")
+
+        # 只共享某个窗口时填原生窗口句柄 (十进制或 0x 开头的十六进制)
+        self.window_edit = LineEdit(self)
+        self.window_edit.setPlaceholderText("窗口句柄 (留空共享整个屏幕)")
+
+        self.fps_spin = SpinBox(self)
+        self.fps_spin.setRange(1, 30)
+        self.fps_spin.setValue(self.capture.rate.fps)
+
+        options_layout.addWidget(QLabel("屏幕", self))
+        options_layout.addWidget(self.screen_combo, 1)
+        options_layout.addWidget(self.window_edit, 1)
+        options_layout.addWidget(QLabel("最高帧率", self))
+        options_layout.addWidget(self.fps_spin)
+        return options_card
+
+    def update_room_status(self, is_connected, room=None):
+        self.room_connected = is_connected
+        self.current_room = room if is_connected else None
+        if is_connected:
+            self.status_label.setText("已连接到房间")
+            self.status_icon.setIcon(FIF.ACCEPT_MEDIUM)
+            if self.publisher and self.publisher.room is not room:
+                # 重连后换了新的 Room，在新房间里重新发布
+                asyncio.ensure_future(self.restart_share())
+        else:
+            self.status_label.setText("未连接到房间")
+            self.status_icon.setIcon(FIF.CANCEL_MEDIUM)
+            # 房间已经断开，不用再取消发布；publisher 立即摘下，紧接着绑定到别的房间时不会被当成重连而重新发布
+            publisher = self.detach_publisher()
+            if publisher:
+                asyncio.ensure_future(publisher.stop(unpublish=False))
+
+    def toggle_share(self, checked):
+        if checked and not self.publisher:
+            asyncio.ensure_future(self.start_share())
+        elif not checked and self.publisher:
+            asyncio.ensure_future(self.stop_share())
+
+    async def restart_share(self):
+        await self.stop_share(unpublish=False)
+        self.share_switch.setChecked(True)
+
+    def selected_target(self):
+        screens = QGuiApplication.screens()
+        index = self.screen_combo.currentIndex()
+        screen = screens[index] if 0 <= index < len(screens) else None
+        text = self.window_edit.text().strip()
+        return screen, int(text, 0) if text else 0
+
+    async def start_share(self):
+        if not self.room_connected or not self.current_room:
+            self.show_error_message("未连接到房间")
+            self.share_switch.setChecked(False)
+            return
+        publisher = None
+        try:
+            screen, window_id = self.selected_target()
+            self.capture.rate.fps = self.fps_spin.value()
+            publisher = self.publisher = ScreenSharePublisher(self.current_room)
+            await publisher.publish()
+            if self.publisher is not publisher:
+                # 发布过程中开关被关掉 (或重连换了房间)：stop_share 那时还没有 publication，这里补上取消发布
+                await publisher.stop()
+                return
+            self.capture.start(screen, window_id)
+            self.stats_timer.start(1000)
+            self.fps_spin.setEnabled(False)
+        except Exception as e:
+            logger.error(f"开始屏幕共享失败: \n{traceback.format_exc()}")
+            if publisher is not None and self.publisher is not publisher:
+                await publisher.stop()
+                return
+            await self.stop_share()
+            self.share_switch.setChecked(False)
+            self.show_error_message(f"开始屏幕共享失败: {str(e)}")
+
+    async def stop_share(self, unpublish=True):
+        publisher = self.detach_publisher()
+        if publisher:
+            await publisher.stop(unpublish)
+
+    def detach_publisher(self):
+        # 停止采集并复位界面，返回还需要 stop 的 publisher
+        self.capture.stop()
+        self.stats_timer.stop()
+        self.stats_label.setText("")
+        self.fps_spin.setEnabled(True)
+        publisher, self.publisher = self.publisher, None
+        if self.share_switch.isChecked():
+            self.share_switch.setChecked(False)
+        return publisher
+
+    def send_frame(self, image, timestamp_us):
+        # 界面线程采集的画面交给媒体线程发送，发送完成前由 publisher 持有 image
+        if self.publisher:
+            self.publisher.push(image_bytes(image), image.width(), image.height(), timestamp_us, owner=image)
+
+    def update_stats_label(self):
+        if not self.publisher:
+            return
+        rate = self.capture.rate
+        self.stats_label.setText(
+            f"当前采集频率: {rate.current_fps:.1f} 帧/秒  采集: {rate.captured}  发送: {self.publisher.frames_sent}  "
+            f"未变化跳过: {rate.skipped}  单次采集耗时: {self.capture.capture_seconds * 1000:.1f}ms"
+        )
+
+    def show_error_message(self, message):
+        InfoBar.error(
+            title='错误',
+            content=message,
+            orient=Qt.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.TOP,
+            duration=3000,
+            parent=self
+        )
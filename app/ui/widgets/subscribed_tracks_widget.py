@@ -1,32 +1,58 @@
 import traceback
-import pyaudio
-import numpy as np
 import asyncio
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QGridLayout, QScrollArea, QPushButton, QHBoxLayout
-from PyQt5.QtCore import Qt, pyqtSignal
-from PyQt5.QtGui import QImage, QPixmap, QColor
-from PyQt5.QtMultimedia import QAudioOutput, QAudioFormat
-from PyQt5.QtMultimediaWidgets import QVideoWidget
+from PyQt5.QtCore import Qt, pyqtSignal, QTimer
+from PyQt5.QtGui import QImage, QPixmap, QColor, QPainter
 from qfluentwidgets import (CardWidget, TitleLabel, SubtitleLabel, BodyLabel, 
                             ScrollArea, PushButton, FluentIcon, Theme, setTheme, 
                             setThemeColor, isDarkTheme, ProgressBar)
 
 from livekit import rtc
+from app.headless import recorder
+from app.services.latency_probe import (LatencyStats, ProbeMatcher, AudioOnsetDetector,
+                                        decode_video_marker, latency_since, now_ms)
+from app.ui.qt_bridge import QtBridge
+from app.utils.frame_change import FrameChangeDetector
+from app.utils.frame_pool import FramePool
+from app.utils.media_clock import MediaClock, PresentationScheduler
+from app.utils.lazy_import import lazy_import
 from app.utils.logger import logger
-import os
-import wave
-import cv2
-import sounddevice as sd
+from app.utils.metrics import metrics
 import queue
 import threading
+import time
 import ctypes
-import datetime
+
+# 这几个库导入很慢，第一次播放/显示延迟统计时才加载
+np = lazy_import('numpy')
+pg = lazy_import('pyqtgraph')
 
 CHUNK = 1024
-FORMAT = pyaudio.paInt16
 CHANNELS = 1
 RATE = 48000
 
+# 活跃发言者的画面放大并全帧率渲染，其余画面缩小并限制到 5fps
+FEATURED_VIDEO_SIZE = (480, 360)
+NORMAL_VIDEO_SIZE = (320, 240)
+THROTTLED_RENDER_INTERVAL = 0.2
+# 每条视频轨道只在前这么多帧里找延迟探针的视觉码，找到过才继续逐帧解码
+MARKER_PROBE_FRAMES = 30
+
+async def audio_blocks(audio_stream):
+    async for frame_event in audio_stream:
+        audio_data = frame_event.frame.data
+        if isinstance(audio_data, np.ndarray):
+            yield audio_data.astype(np.int16)
+        else:
+            yield np.frombuffer(audio_data, dtype=np.int16)
+
+
+async def video_frames(video_stream):
+    async for frame_event in video_stream:
+        buffer = frame_event.frame
+        yield buffer.data, buffer.width, buffer.height, frame_event.timestamp_us
+
+
 class SubscribedTracksWidget(QWidget):
     play_track_signal = pyqtSignal(str, str)
     record_track_signal = pyqtSignal(str, str)
@@ -36,7 +62,6 @@ class SubscribedTracksWidget(QWidget):
         super().__init__(parent)
         self.initUI()
         self.tracks = {}
-        self.p = pyaudio.PyAudio()
         self.stream = None
         self.audio_output = None
         self.audio_buffer = None
@@ -45,6 +70,28 @@ class SubscribedTracksWidget(QWidget):
         self.is_playing = False
         self.video_playing = {}  # 用于跟踪每个视频流的播放状态
 
+        # 所有画面按时间戳对齐到这个时钟，时钟的延迟包含音频播放延迟，画面与声音同步
+        self.media_clock = MediaClock()
+        self.output_latency = 0.0
+
+        # 音视频流在媒体线程上消费，画面和音量经这个桥转到界面线程，同一轨道只保留最新一帧
+        self.bridge = QtBridge(self)
+        self.audio_overflows = metrics.counter("audio_playback_overflows_total", "播放队列满时丢弃的音频块数")
+
+        # 发言者排名：决定画面大小、排列顺序和渲染帧率
+        self.featured = ()
+        self.speaking = set()
+        self.render_interval = {}
+        self.last_render = {}
+
+        # 端到端延迟探针：视频走画面内的视觉码，音频走数据通道 + 起音检测
+        self.latency_stats = {}
+        self.onset_detectors = {}
+        self.probe_matcher = ProbeMatcher(on_match=self.on_audio_probe_matched)
+        self.latency_timer = QTimer(self)
+        self.latency_timer.timeout.connect(self.refresh_latency_views)
+        self.latency_timer.start(1000)
+
     def initUI(self):
         layout = QVBoxLayout(self)
         layout.setContentsMargins(36, 36, 36, 36)
@@ -69,13 +116,13 @@ class SubscribedTracksWidget(QWidget):
         layout.addWidget(subtitle)
 
         # 滚动区域
-        scroll_area = ScrollArea(self)
+        self.scroll_area = ScrollArea(self)
         content_widget = QWidget()
         self.tracks_grid = QGridLayout(content_widget)
         self.tracks_grid.setSpacing(20)
-        scroll_area.setWidget(content_widget)
-        scroll_area.setWidgetResizable(True)
-        layout.addWidget(scroll_area)
+        self.scroll_area.setWidget(content_widget)
+        self.scroll_area.setWidgetResizable(True)
+        layout.addWidget(self.scroll_area)
 
     def add_track(self, participant, track_id, track_type):
         if track_id in self.tracks:
@@ -98,7 +145,7 @@ class SubscribedTracksWidget(QWidget):
         if track_type == "Video":
             video_label = QLabel(self)
             video_label.setAlignment(Qt.AlignCenter)
-            video_label.setMinimumSize(320, 240)
+            video_label.setMinimumSize(*NORMAL_VIDEO_SIZE)
             card_layout.addWidget(video_label)
             self.tracks[track_id] = {'card': track_card, 'video_label': video_label}
         elif track_type == "Audio":
@@ -115,14 +162,23 @@ class SubscribedTracksWidget(QWidget):
             
             self.tracks[track_id] = {'card': track_card, 'audio_label': audio_label, 'volume_bar': volume_bar}
 
+        # 延迟统计，收到第一个探针后才显示
+        latency_label = BodyLabel("", self)
+        latency_label.setVisible(False)
+        card_layout.addWidget(latency_label)
+        info = self.tracks[track_id]
+        info.update({'id': track_id, 'participant': participant, 'type': track_type, 'layout': card_layout,
+                     'info_label': track_info, 'latency_label': latency_label, 'latency_plot': None})
+
         # 按钮布局
         button_layout = QHBoxLayout()
         play_button = PushButton("播放直播", self, FluentIcon.PLAY)
-        play_button.clicked.connect(lambda: self.play_track_signal.emit(track_id, track_type))
+        # 重连后轨道 sid 可能变化 (见 rename_track)，按钮总是读取卡片当前的 sid
+        play_button.clicked.connect(lambda: self.play_track_signal.emit(info['id'], track_type))
         stop_button = PushButton("停止播放", self, FluentIcon.STOP_WATCH)  # 新增停止按钮
-        stop_button.clicked.connect(lambda: self.stop_track_signal.emit(track_id, track_type))
+        stop_button.clicked.connect(lambda: self.stop_track_signal.emit(info['id'], track_type))
         record_button = PushButton("录制存储", self, FluentIcon.SAVE)
-        record_button.clicked.connect(lambda: self.record_track_signal.emit(track_id, track_type))
+        record_button.clicked.connect(lambda: self.record_track_signal.emit(info['id'], track_type))
 
         button_layout.addWidget(play_button)
         button_layout.addWidget(stop_button)  # 添加停止按钮到布局
@@ -133,10 +189,112 @@ class SubscribedTracksWidget(QWidget):
 
     def remove_track(self, track_id):
         if track_id in self.tracks:
-            track_card = self.tracks[track_id]
+            track_card = self.tracks[track_id]['card']
             self.tracks_grid.removeWidget(track_card)
             track_card.deleteLater()
             del self.tracks[track_id]
+        self.latency_stats.pop(track_id, None)
+        self.onset_detectors.pop(track_id, None)
+        self.render_interval.pop(track_id, None)
+        self.last_render.pop(track_id, None)
+        self.bridge.discard(('frame', track_id))
+        self.bridge.discard(('volume', track_id))
+
+    def apply_speaker_ranking(self, identities, max_featured=4):
+        # identities 为按音量排序的正在发言者；没有人发言时所有画面都全帧率渲染
+        top = identities[:max_featured]
+        # 仍在前列的发言者保持原来的位置，新进入的按音量排在后面；
+        # 只有成员变化才重排网格，音量名次互换不会每 100ms 重建一次布局
+        featured = tuple([identity for identity in self.featured if identity in top] +
+                         [identity for identity in top if identity not in self.featured])
+        speaking = set(identities)
+        for track_id, info in self.tracks.items():
+            is_speaking = info['participant'] in speaking
+            if info['type'] == "Audio":
+                if is_speaking != (info['participant'] in self.speaking):
+                    info['audio_label'].setText("音频轨道 (正在发言)" if is_speaking else "音频轨道")
+            elif featured and info['participant'] not in featured:
+                self.render_interval[track_id] = THROTTLED_RENDER_INTERVAL
+            else:
+                self.render_interval.pop(track_id, None)
+        self.speaking = speaking
+        if featured != self.featured:
+            self.featured = featured
+            self.relayout_tracks()
+
+    def relayout_tracks(self):
+        # 发言者的卡片排在最前面并放大，其余保持加入顺序
+        rank = {identity: i for i, identity in enumerate(self.featured)}
+        order = sorted(self.tracks.items(), key=lambda item: rank.get(item[1]['participant'], len(rank)))
+        for track_id, info in order:
+            self.tracks_grid.removeWidget(info['card'])
+        for row, (track_id, info) in enumerate(order):
+            if 'video_label' in info:
+                size = FEATURED_VIDEO_SIZE if info['participant'] in rank else NORMAL_VIDEO_SIZE
+                info['video_label'].setMinimumSize(*size)
+            self.tracks_grid.addWidget(info['card'], row, 0)
+
+    def visible_track_ids(self):
+        # 当前滚动区域内可见的轨道卡片；页面没显示时视为都不可见
+        if not self.isVisible():
+            return []
+        viewport = self.scroll_area.viewport()
+        visible_rect = viewport.rect()
+        result = []
+        for track_id, info in self.tracks.items():
+            card = info['card']
+            top_left = card.mapTo(viewport, card.rect().topLeft())
+            if visible_rect.intersects(card.rect().translated(top_left)):
+                result.append(track_id)
+        return result
+
+    def rename_track(self, old_id, new_id):
+        # 重连后同一条轨道换了 sid：保留原有卡片，只更新它对应的 sid
+        if old_id not in self.tracks or old_id == new_id:
+            return
+        if new_id in self.tracks:
+            # 新 sid 已经有了一张卡片 (例如重连时先到的订阅事件)，留下原来带统计的卡片
+            self.remove_track(new_id)
+        info = self.tracks.pop(old_id)
+        info['id'] = new_id
+        info['info_label'].setText(f"轨道ID: {new_id}\n类型: {info['type']}")
+        self.tracks[new_id] = info
+        if old_id in self.latency_stats:
+            self.latency_stats[new_id] = self.latency_stats.pop(old_id)
+        if old_id in self.onset_detectors:
+            self.onset_detectors[new_id] = self.onset_detectors.pop(old_id)
+
+    def on_probe_packet(self, identity, payload):
+        self.probe_matcher.on_probe_packet(identity, payload)
+
+    def on_audio_probe_matched(self, identity, seq, latency_ms):
+        for track_id, info in self.tracks.items():
+            if info['participant'] == identity and info['type'] == "Audio":
+                self.latency_stats.setdefault(track_id, LatencyStats()).add(latency_ms, seq)
+                break
+
+    def refresh_latency_views(self):
+        # 媒体线程可能同时在添加新轨道的统计
+        for track_id, stats in list(self.latency_stats.items()):
+            info = self.tracks.get(track_id)
+            if not info or not stats.samples:
+                continue
+            p = stats.percentiles()
+            info['latency_label'].setText(
+                f"延迟 p50: {p['p50']:.0f}ms  p95: {p['p95']:.0f}ms  p99: {p['p99']:.0f}ms  样本: {stats.total}")
+            info['latency_label'].setVisible(True)
+
+            if info['latency_plot'] is None:
+                plot = pg.PlotWidget(self)
+                plot.setFixedHeight(120)
+                plot.setLabel('bottom', '延迟 (ms)')
+                plot.setMouseEnabled(x=False, y=False)
+                info['layout'].addWidget(plot)
+                info['latency_plot'] = plot
+            counts, edges = stats.histogram()
+            plot = info['latency_plot']
+            plot.clear()
+            plot.addItem(pg.BarGraphItem(x0=edges[:-1], x1=edges[1:], height=counts, brush='#3A86FF'))
 
     def update_track_status(self, track_id, status):
         if track_id in self.tracks:
@@ -153,29 +311,43 @@ class SubscribedTracksWidget(QWidget):
             volume_bar.setValue(int(volume * 100))
 
     async def play_audio_stream(self, audio_stream):
+        try:
+            await self.play_audio_blocks(audio_stream._track.sid, audio_blocks(audio_stream))
+        finally:
+            await audio_stream.aclose()
+
+    async def play_audio_ring(self, ring, track_id):
+        # 媒体工作进程解码的音频经共享内存环传过来，按顺序读出
+        blocks = (np.frombuffer(data, dtype=np.int16) async for data, *_ in ring.frames())
+        await self.play_audio_blocks(track_id, blocks)
+
+    async def play_audio_blocks(self, track_id, blocks):
         try:
             self.is_playing = True
             self.audio_thread = threading.Thread(target=self._audio_playback_thread)
             self.audio_thread.start()
 
-            track_id = audio_stream._track.sid
-
-            async for frame_event in audio_stream:
-                audio_frame = frame_event.frame
-                audio_data = audio_frame.data
+            frames_received = metrics.counter("audio_frames_received_total", "收到的音频帧数", track=track_id)
+            queue_depth = metrics.gauge("audio_playback_queue_depth", "音频播放队列长度")
 
-                if isinstance(audio_data, memoryview):
-                    audio_data = np.frombuffer(audio_data, dtype=np.int16)
-                elif isinstance(audio_data, np.ndarray):
-                    audio_data = audio_data.astype(np.int16)
-                else:
-                    audio_data = np.frombuffer(audio_data, dtype=np.int16)
+            async for audio_data in blocks:
+                frames_received.inc()
 
                 # 计算音量
                 volume = np.abs(audio_data).mean() / 32768.0
-                self.update_volume(track_id, volume)
-
-                self.audio_queue.put(audio_data)
+                self.bridge.post(self.update_volume, track_id, volume, key=('volume', track_id))
+
+                # 只有发送过延迟探针的参与者才做起音检测
+                identity = self.tracks.get(track_id, {}).get('participant')
+                if identity in self.probe_matcher.pending_probes:
+                    detector = self.onset_detectors.setdefault(track_id, AudioOnsetDetector())
+                    if detector.feed(audio_data):
+                        self.bridge.post(self.probe_matcher.on_onset, identity, now_ms())
+
+                self.enqueue_audio(audio_data)
+                queue_depth.set(self.audio_queue.qsize())
+                # 音频从入队到播出的延迟 = 队列里的时长 + 声卡延迟，画面按这个延迟推迟显示
+                self.media_clock.set_audio_latency(self.audio_queue.qsize() * len(audio_data) / RATE + self.output_latency)
                 await asyncio.sleep(0)
 
         except asyncio.CancelledError:
@@ -186,38 +358,141 @@ class SubscribedTracksWidget(QWidget):
             self.is_playing = False
             if self.audio_thread:
                 self.audio_thread.join()
-            await audio_stream.aclose()
+            self.media_clock.reset_audio_latency()
+            metrics.remove(track=track_id)
+            # 播放队列所有轨道共用，不带 track 标签，remove 删不掉；播放停止后归零
+            metrics.gauge("audio_playback_queue_depth", "音频播放队列长度").set(0)
+
+    def enqueue_audio(self, audio_data):
+        # 播放跟不上时丢掉最旧的一块，不阻塞媒体线程
+        try:
+            self.audio_queue.put_nowait(audio_data)
+            return
+        except queue.Full:
+            self.audio_overflows.inc()
+        try:
+            self.audio_queue.get_nowait()
+            self.audio_queue.put_nowait(audio_data)
+        except (queue.Empty, queue.Full):
+            pass
 
     async def play_video_stream(self, video_stream):
         try:
-            track_id = video_stream._track.sid
-            self.video_playing[track_id] = True
+            await self.play_video_frames(video_stream._track.sid, video_frames(video_stream))
+        finally:
+            await video_stream.aclose()
 
-            async for frame_event in video_stream:
+    async def play_video_ring(self, ring, track_id):
+        # 媒体工作进程解码的画面经共享内存环传过来，界面跟不上时只取最新一帧；
+        # 不先拷出共享内存，直接复制进帧缓冲池，复制完用 ring.valid 确认没被工作进程覆盖
+        await self.play_video_frames(track_id, ring.frames(latest_only=True, copy=False), intact=ring.valid)
+
+    async def play_video_frames(self, track_id, frames, intact=None):
+        # frames: 异步产出 (RGB24 数据, 宽, 高, 时间戳 (微秒))；时间戳为空时收到就显示。
+        # intact 不为空时数据是会被覆盖的共享内存视图，收到后立即复制进帧缓冲池 (唯一的一次复制)，之后都用池里的缓冲
+        pool = None
+        change_detector = None
+        scheduler = None
+        try:
+            self.video_playing[track_id] = True
+            frames_received = metrics.counter("video_frames_received_total", "收到的视频帧数", track=track_id)
+            frames_rendered = metrics.counter("video_frames_rendered_total", "渲染的视频帧数", track=track_id)
+            frames_throttled = metrics.counter("video_frames_throttled_total", "限帧率跳过的视频帧数", track=track_id)
+            frames_duplicate = metrics.counter("video_frames_duplicate_total", "与上一帧相同而跳过的视频帧数", track=track_id)
+            frames_late = metrics.counter("video_frames_late_total", "错过显示时刻而丢弃的视频帧数", track=track_id)
+            render_seconds = metrics.histogram("video_render_seconds", "单帧复制到缓冲池的耗时", track=track_id)
+            render_fps = metrics.gauge("video_render_fps", "最近一秒的渲染帧率", track=track_id)
+            fps_window_start = time.monotonic()
+            fps_window_frames = 0
+            pool = FramePool(track_id)
+            change_detector = FrameChangeDetector()
+            scheduler = PresentationScheduler(self.media_clock)
+            marker_frames = 0
+            has_marker = False
+
+            async for data, width, height, timestamp_us in frames:
                 if not self.video_playing[track_id]:
                     break
-
-                buffer = frame_event.frame
+                frames_received.inc()
 
                 # 将视频帧转换为 numpy 数组
-                arr = np.frombuffer(buffer.data, dtype=np.uint8)
-                arr = arr.reshape((buffer.height, buffer.width, 3))
-
-                # 将 RGB 转换为 BGR（OpenCV 使用 BGR 格式）
-                arr = cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
-
-                # 将 numpy 数组转换为 QImage
-                height, width, channel = arr.shape
-                bytes_per_line = 3 * width
-                q_img = QImage(arr.data, width, height, bytes_per_line, QImage.Format_RGB888).rgbSwapped()
-
-                # 将 QImage 转换为 QPixmap 并设置到 QLabel
-                pixmap = QPixmap.fromImage(q_img)
-                video_label = self.tracks[track_id]['video_label']
-                video_label.setPixmap(pixmap.scaled(video_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+                arr = np.frombuffer(data, dtype=np.uint8)
+                arr = arr.reshape((height, width, 3))
+                buffer = None
+                if intact is not None:
+                    buffer = pool.acquire(arr.shape)
+                    np.copyto(buffer.array, arr)
+                    if not intact():
+                        # 复制时被工作进程覆盖了 (计入 ring.dropped)，等下一帧
+                        pool.release(buffer)
+                        continue
+                    arr = buffer.array
+
+                # 按时间戳等到显示时刻 (成批到达的帧被均匀摊开，并与音频播放对齐)，迟到的帧丢弃
+                if timestamp_us:
+                    delay = scheduler.delay_for(timestamp_us)
+                    if delay is None:
+                        frames_late.inc()
+                        self.release_frame(pool, buffer)
+                        await asyncio.sleep(0)
+                        continue
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                        if not self.video_playing[track_id]:
+                            self.release_frame(pool, buffer)
+                            break
+
+                # 解码画面中的延迟探针 (只有带视觉码的轨道才逐帧解码)
+                if has_marker or marker_frames < MARKER_PROBE_FRAMES:
+                    marker_frames += 1
+                    marker = decode_video_marker(arr)
+                    if marker:
+                        has_marker = True
+                        seq, sent_ms = marker
+                        latency = latency_since(sent_ms)
+                        if latency is not None:
+                            self.latency_stats.setdefault(track_id, LatencyStats()).add(latency, seq)
+
+                # 非发言者的画面限制渲染帧率，跳过的帧不做颜色转换和缩放
+                interval = self.render_interval.get(track_id)
+                if interval:
+                    now = time.monotonic()
+                    if now - self.last_render.get(track_id, 0.0) < interval:
+                        frames_throttled.inc()
+                        self.release_frame(pool, buffer)
+                        await asyncio.sleep(0)
+                        continue
+                    self.last_render[track_id] = now
+
+                # 与上一次渲染的画面相同 (屏幕共享、幻灯片常见) 时跳过复制、缩放和重绘
+                if not change_detector.changed(arr):
+                    frames_duplicate.inc()
+                    self.release_frame(pool, buffer)
+                    await asyncio.sleep(0)
+                    continue
 
-                # 给 Qt 事件循环一些时间来更新 UI
-                await asyncio.sleep(0.01)  # 增加一个小的延迟以避免UI卡顿
+                render_started = time.perf_counter()
+                # 复制到帧缓冲池的缓冲区里 (界面线程的 QImage 直接包在缓冲区上按 RGB888 解释，不需要颜色转换)，
+                # 不再每帧分配数组和 QImage
+                if buffer is None:
+                    buffer = pool.acquire(arr.shape)
+                    np.copyto(buffer.array, arr)
+                pool.publish(buffer)
+
+                # QPixmap 只能在界面线程创建；界面忙时同一轨道积压的帧只画最新一帧
+                self.bridge.post(self.show_frame, track_id, pool, key=('frame', track_id))
+
+                render_done = time.perf_counter()
+                render_seconds.observe(render_done - render_started)
+                frames_rendered.inc()
+                fps_window_frames += 1
+                if render_done - fps_window_start >= 1.0:
+                    render_fps.set(round(fps_window_frames / (render_done - fps_window_start), 2))
+                    fps_window_start = render_done
+                    fps_window_frames = 0
+
+                # 让同一媒体线程上的其他流有机会处理
+                await asyncio.sleep(0)
 
         except asyncio.CancelledError:
             pass
@@ -225,69 +500,60 @@ class SubscribedTracksWidget(QWidget):
             logger.error(f"播放视频时发生错误: \n{traceback.format_exc()}")
         finally:
             self.video_playing[track_id] = False
-            await video_stream.aclose()
-
-    async def record_audio_stream(self, audio_stream: rtc.AudioStream, track_id):
+            if pool is not None:
+                pool.close()
+            if change_detector is not None and change_detector.duplicates:
+                logger.info(f"轨道 {track_id} 共 {change_detector.frames} 帧，"
+                            f"其中 {change_detector.duplicates} 帧与上一帧相同已跳过 ({change_detector.duplicate_ratio:.1%})")
+            if scheduler is not None and scheduler.late:
+                logger.info(f"轨道 {track_id} 有 {scheduler.late} 帧错过显示时刻被丢弃，重新对齐 {scheduler.resyncs} 次")
+            metrics.remove(track=track_id)
+
+    @staticmethod
+    def release_frame(pool, buffer):
+        if buffer is not None:
+            pool.release(buffer)
+
+    def show_frame(self, track_id, pool):
+        buffer = pool.take()
+        if buffer is None:
+            return
         try:
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"audio_{track_id}_{timestamp}.wav"
-            filepath = os.path.join("recorded_audio", filename)
-            os.makedirs("recorded_audio", exist_ok=True)
-
-            with wave.open(filepath, 'wb') as wav_file:
-                wav_file.setnchannels(1)  # 假设为单声道
-                wav_file.setsampwidth(2)  # 16-bit
-                wav_file.setframerate(48000)  # 假设采样率为 48kHz
-
-                async for audio_frame_event in audio_stream:
-                    audio_frame = audio_frame_event.frame
-                    audio_data = audio_frame.data
-
-                    if isinstance(audio_data, memoryview):
-                        audio_data = audio_data.tobytes()
-                    elif isinstance(audio_data, np.ndarray):
-                        audio_data = audio_data.astype(np.int16).tobytes()
-
-                    wav_file.writeframes(audio_data)
-
-            logger.info(f"音频已录制并保存到 {filepath}")
-
-        except asyncio.CancelledError:
-            logger.info("频录制已取消")
-        except Exception as e:
-            logger.error(f"录制音频时发生错误: \n{traceback.format_exc()}")
+            info = self.tracks.get(track_id)
+            if not info or 'video_label' not in info or not self.video_playing.get(track_id):
+                return
+            if buffer.image is None:
+                height, width, _ = buffer.shape
+                buffer.image = QImage(buffer.array.data, width, height, 3 * width, QImage.Format_RGB888)
+            self.paint_frame(info, buffer.image)
         finally:
-            await audio_stream.aclose()
-
-    async def record_video_stream(self, video_stream, track_id):
-        try:
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"video_{track_id}_{timestamp}.mp4"
-            filepath = os.path.join("recorded_video", filename)
-            os.makedirs("recorded_video", exist_ok=True)
-
-            # 这里应该添加视频录制的逻辑
-            # 例如，如果使用 OpenCV：
-            # fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            # out = cv2.VideoWriter(filepath, fourcc, 30.0, (frame_width, frame_height))
-
-            async for video_frame_event in video_stream:
-                video_frame = video_frame_event.frame
-                # 这里应该添加将视频帧写入文件的逻辑
-                # 例如，如果使用 OpenCV：
-                # out.write(video_frame.to_ndarray())
-                logger.info(f"录制视频帧: {video_frame}")
+            pool.release(buffer)
+
+    def paint_frame(self, info, image):
+        # 按比例缩放画到画布上；每个画面两块画布轮流用，标签持有一块时画另一块，
+        # 不会触发 QPixmap 的写时复制，只有画面或标签尺寸变化时才重新创建画布
+        video_label = info['video_label']
+        size = image.size().scaled(video_label.size(), Qt.KeepAspectRatio)
+        if size.isEmpty():
+            return
+        index = 1 - info.get('canvas', 0)
+        canvases = info.setdefault('canvases', [None, None])
+        canvas = canvases[index]
+        if canvas is None or canvas.size() != size:
+            canvas = canvases[index] = QPixmap(size)
+        painter = QPainter(canvas)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        painter.drawImage(canvas.rect(), image)
+        painter.end()
+        info['canvas'] = index
+        video_label.setPixmap(canvas)
 
-            logger.info(f"视频已录制并保存到 {filepath}")
+    async def record_audio_stream(self, audio_stream: rtc.AudioStream, track_id):
+        # 录制逻辑在无界面核心中实现，GUI 与命令行共用
+        return await recorder.record_audio_stream(audio_stream, track_id)
 
-        except asyncio.CancelledError:
-            logger.info("视频录制已取消")
-        except Exception as e:
-            logger.error(f"录制视频时发生错误: \n{traceback.format_exc()}")
-        finally:
-            # 如果使用了 OpenCV 的 VideoWriter，应该在这里释放：
-            # out.release()
-            await video_stream.aclose()
+    async def record_video_stream(self, video_stream, track_id):
+        return await recorder.record_video_stream(video_stream, track_id)
 
     async def stop_audio_stream(self):
         self.is_playing = False
@@ -299,19 +565,23 @@ class SubscribedTracksWidget(QWidget):
     async def stop_video_stream(self, video_stream):
         try:
             track_id = video_stream._track.sid if video_stream else None
-            if track_id:
-                self.video_playing[track_id] = False
             if video_stream:
                 await video_stream.aclose()
-            if track_id in self.tracks:
-                video_label = self.tracks[track_id]['video_label']
-                video_label.clear()  # 清除视频标签的内容
-                video_label.setText("视频已停止")  # 添加一个文本提示
-            logger.info(f"视频流已停止: {track_id}")
+            if track_id:
+                self.stop_video_track(track_id)
         except Exception as e:
             logger.error(f"停止视频流时发生错误: {str(e)}")
             logger.error(traceback.format_exc())
 
+    def stop_video_track(self, track_id):
+        self.video_playing[track_id] = False
+        self.bridge.discard(('frame', track_id))
+        if track_id in self.tracks and 'video_label' in self.tracks[track_id]:
+            video_label = self.tracks[track_id]['video_label']
+            video_label.clear()  # 清除视频标签的内容
+            video_label.setText("视频已停止")  # 添加一个文本提示
+        logger.info(f"视频流已停止: {track_id}")
+
     def pause_audio(self):
         if self.audio_output:
             self.audio_output.suspend()
@@ -325,12 +595,16 @@ class SubscribedTracksWidget(QWidget):
             self.audio_output.setVolume(volume)
 
     def _audio_playback_thread(self):
+        import sounddevice as sd
+        underruns = metrics.counter("audio_playback_underruns_total", "播放线程等不到音频数据的次数")
         with sd.OutputStream(samplerate=RATE, channels=CHANNELS, dtype='int16') as stream:
+            self.output_latency = stream.latency
             while self.is_playing:
                 try:
                     audio_chunk = self.audio_queue.get(timeout=0.1)
                     stream.write(audio_chunk)
                 except queue.Empty:
+                    underruns.inc()
                     continue
 
     def closeEvent(self, event):
@@ -344,7 +618,5 @@ class SubscribedTracksWidget(QWidget):
             self.is_playing = False
             if hasattr(self, 'audio_thread') and self.audio_thread:
                 self.audio_thread.join()
-            if hasattr(self, 'p') and self.p:
-                self.p.terminate()
         except:
             pass  # 忽略在删除过程中可能发生的任何错误
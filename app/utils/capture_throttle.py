@@ -0,0 +1,84 @@
+from app.utils.lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+
+# 按块比较两次采集的画面，返回变化的块占比 (0 表示没有变化)。
+# 只取每隔 row_step 行的像素，32 位像素按 uint32 整体比较；块大小 tile x tile 像素，
+# 光标闪烁、时钟跳秒这类只改动一两块的小变化和翻页、滚动这类大面积变化可以区分开
+# 落在采样行之间的细小变化会漏掉，由 AdaptiveCaptureRate 的定期重发补上
+class DirtyTileDetector:
+    def __init__(self, tile=64, row_step=4):
+        self.tile = tile
+        self.row_step = row_step
+        self._previous = None
+
+    def dirty_ratio(self, arr):
+        # arr: (高, 宽, 4) 的 uint8 画面
+        sample = arr[::self.row_step].view(np.uint32)[:, :, 0]
+        previous = self._previous
+        if previous is None or previous.shape != sample.shape:
+            self._previous = sample.copy()
+            return 1.0
+        if np.array_equal(previous, sample):
+            return 0.0
+        rows, width = sample.shape
+        band = max(self.tile // self.row_step, 1)
+        tile_rows, tile_cols = max(rows // band, 1), max(width // self.tile, 1)
+        diff = sample != previous
+        # 右边和下边不满一块的部分并入最后一块
+        cols = np.add.reduceat(diff, np.arange(tile_cols) * self.tile, axis=1)
+        tiles = np.add.reduceat(cols, np.arange(tile_rows) * band, axis=0)
+        np.copyto(previous, sample)
+        return np.count_nonzero(tiles) / tiles.size
+
+    def reset(self):
+        self._previous = None
+
+
+# 自适应采集间隔：画面有大面积变化时按 fps 采集；连续 idle_after 次没有变化 (或只有小于 minor_change 的小变化)
+# 后间隔按 backoff 倍数逐步拉长，最慢 idle_fps；一旦出现大面积变化立即恢复 fps。
+# 画面静止时即使采集到了也不发送，只每隔 keepalive 秒重发一次，保证新加入的订阅者能收到画面
+class AdaptiveCaptureRate:
+    def __init__(self, fps=15, idle_fps=1, idle_after=5, minor_change=0.02, backoff=1.5, keepalive=2.0):
+        self.fps = fps
+        self.idle_fps = idle_fps
+        self.idle_after = idle_after
+        self.minor_change = minor_change
+        self.backoff = backoff
+        self.keepalive = keepalive
+        self.interval = 1 / fps
+        self.captured = 0
+        self.sent = 0
+        self.skipped = 0
+        self._quiet = 0
+        self._last_sent = None
+
+    @property
+    def current_fps(self):
+        return 1 / self.interval
+
+    def update(self, dirty_ratio, now):
+        # 记录一次采集结果，返回这一帧是否需要发送；self.interval 更新为下一次采集的间隔
+        self.captured += 1
+        if dirty_ratio >= self.minor_change:
+            self._quiet = 0
+            self.interval = 1 / self.fps
+        else:
+            self._quiet += 1
+            if self._quiet >= self.idle_after:
+                self.interval = min(self.interval * self.backoff, 1 / self.idle_fps)
+
+        send = dirty_ratio > 0 or self._last_sent is None or now - self._last_sent >= self.keepalive
+        if send:
+            self.sent += 1
+            self._last_sent = now
+        else:
+            self.skipped += 1
+        return send
+
+    def reset(self):
+        self.interval = 1 / self.fps
+        self.captured = self.sent = self.skipped = 0
+        self._quiet = 0
+        self._last_sent = None
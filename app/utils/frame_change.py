@@ -0,0 +1,43 @@
+import time
+
+from app.utils.lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+
+# 判断视频帧与上一帧是否相同：只比较每隔 row_step 行的整行像素 (默认 1/4 的数据)，
+# 高度不小于 row_step 的变化 (光标、翻页、打字) 一定会落在采样行上。
+# 屏幕共享、幻灯片这类画面经常几秒不变，相同的帧可以跳过复制、缩放和重绘；
+# 为了不漏掉采样行之间的细小变化，连续相同超过 refresh_interval 秒时仍然当作变化渲染一次
+class FrameChangeDetector:
+    def __init__(self, row_step=4, refresh_interval=2.0):
+        self.row_step = row_step
+        self.refresh_interval = refresh_interval
+        self.frames = 0
+        self.duplicates = 0
+        self._previous = None
+        self._last_changed = 0.0
+
+    @property
+    def duplicate_ratio(self):
+        return self.duplicates / self.frames if self.frames else 0.0
+
+    def changed(self, arr, now=None):
+        # arr: (高, 宽, 通道) 的画面；返回 False 表示与上一帧相同，可以跳过
+        now = time.monotonic() if now is None else now
+        self.frames += 1
+        sample = arr[::self.row_step]
+        previous = self._previous
+        if (previous is not None and previous.shape == sample.shape and np.array_equal(previous, sample)
+                and now - self._last_changed < self.refresh_interval):
+            self.duplicates += 1
+            return False
+        if previous is None or previous.shape != sample.shape:
+            self._previous = sample.copy()
+        else:
+            np.copyto(previous, sample)
+        self._last_changed = now
+        return True
+
+    def reset(self):
+        self._previous = None
@@ -0,0 +1,106 @@
+import threading
+
+from app.utils.lazy_import import lazy_import
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+np = lazy_import('numpy')
+
+
+class FrameBuffer:
+    __slots__ = ('array', 'shape', 'nbytes', 'image')
+
+    def __init__(self, shape):
+        self.array = np.empty(shape, dtype=np.uint8)
+        self.shape = shape
+        self.nbytes = self.array.nbytes
+        # 界面线程包在 array 上的 QImage，随缓冲区复用，不用每帧重新创建
+        self.image = None
+
+
+# 每条视频轨道一个的帧缓冲池：媒体线程 acquire 一块缓冲写入转换后的画面，publish 交给界面线程；
+# 界面线程 take 取出最新一帧，画完后 release 归还。界面跟不上时被新帧覆盖的旧帧直接回到池里。
+# 同时在用的缓冲最多三块 (写入中、待显示、显示中)，按画面尺寸预先分配，分辨率变化时才重新分配
+class FramePool:
+    def __init__(self, track_id=None, slots=3):
+        self.track_id = track_id
+        self.slots = slots
+        self.shape = None
+        self.hits = 0
+        self.misses = 0
+        self.allocated_bytes = 0
+        self.peak_bytes = 0
+        self.closed = False
+        self._free = []
+        self._pending = None
+        self._lock = threading.Lock()
+        self._hits = metrics.counter("video_pool_hits_total", "直接从帧缓冲池取到缓冲的次数", track=track_id)
+        self._misses = metrics.counter("video_pool_misses_total", "帧缓冲池为空、临时分配缓冲的次数", track=track_id)
+        self._bytes = metrics.gauge("video_pool_bytes", "帧缓冲池当前占用的内存 (字节)", track=track_id)
+        self._peak = metrics.gauge("video_pool_peak_bytes", "帧缓冲池占用内存的峰值 (字节)", track=track_id)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 1.0
+
+    def _allocate(self, shape):
+        buffer = FrameBuffer(shape)
+        self.allocated_bytes += buffer.nbytes
+        self.peak_bytes = max(self.peak_bytes, self.allocated_bytes)
+        self._bytes.set(self.allocated_bytes)
+        self._peak.set(self.peak_bytes)
+        return buffer
+
+    def _drop(self, buffer):
+        self.allocated_bytes -= buffer.nbytes
+        self._bytes.set(self.allocated_bytes)
+
+    def acquire(self, shape):
+        with self._lock:
+            if shape != self.shape:
+                # 分辨率变化：释放旧尺寸的空闲缓冲，按新尺寸预分配；还在用的旧缓冲归还时丢弃
+                for buffer in self._free:
+                    self._drop(buffer)
+                self.shape = shape
+                self._free = [self._allocate(shape) for _ in range(self.slots)]
+                logger.info(f"轨道 {self.track_id} 的帧缓冲池按 {shape[1]}x{shape[0]} 重新分配")
+            if self._free:
+                self.hits += 1
+                self._hits.inc()
+                return self._free.pop()
+            self.misses += 1
+            self._misses.inc()
+            return self._allocate(shape)
+
+    def publish(self, buffer):
+        # 待显示的只保留最新一帧，被覆盖的那一帧直接回到池里
+        with self._lock:
+            superseded, self._pending = self._pending, buffer
+        if superseded is not None:
+            self.release(superseded)
+
+    def take(self):
+        with self._lock:
+            buffer, self._pending = self._pending, None
+            return buffer
+
+    def release(self, buffer):
+        with self._lock:
+            if self.closed or buffer.shape != self.shape or len(self._free) >= self.slots:
+                self._drop(buffer)
+            else:
+                self._free.append(buffer)
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            for buffer in self._free:
+                self._drop(buffer)
+            self._free = []
+            pending, self._pending = self._pending, None
+            if pending is not None:
+                self._drop(pending)
+        if self.hits or self.misses:
+            logger.info(f"轨道 {self.track_id} 的帧缓冲池: 命中率 {self.hit_rate:.1%}，"
+                        f"峰值内存 {self.peak_bytes / 1024 / 1024:.1f}MB")
@@ -0,0 +1,21 @@
+import importlib
+import importlib.util
+import types
+
+
+# 第一次访问属性时才真正导入的模块代理，取到的属性缓存在代理上，之后的访问和普通模块一样快。
+# 真正的导入走 importlib (自带模块级的锁)，媒体线程和界面线程同时第一次访问也是安全的
+class LazyModule(types.ModuleType):
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        value = getattr(module, attr)
+        setattr(self, attr, value)
+        return value
+
+
+# 延迟导入 numpy / cv2 / pyqtgraph 这类导入很慢、但启动时用不到的库；
+# 模块不存在时和普通 import 一样立即报错
+def lazy_import(name):
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    return LazyModule(name)
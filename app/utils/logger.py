@@ -1,15 +1,127 @@
+import atexit
 import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
-# 配置日志记录器
+LOG_FILE = 'livekit_manager.log'
+# 单个日志文件上限与保留的历史文件数
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# 文件日志攒够这么多条或超过这么久才写盘一次；ERROR 及以上立即写盘
+LOG_BATCH_SIZE = 200
+LOG_FLUSH_INTERVAL = 0.5
+# 每个调用位置 (文件 + 行号) 的 DEBUG/INFO 日志每秒最多输出的条数与突发上限
+SITE_RATE = float(os.environ.get('LIVEKIT_LOG_SITE_RATE', 20))
+SITE_BURST = float(os.environ.get('LIVEKIT_LOG_SITE_BURST', 50))
+
+
+# 文件写入在日志线程里按批次刷盘，并按大小轮转
+class BatchedRotatingFileHandler(RotatingFileHandler):
+    def __init__(self, filename, batch_size=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_INTERVAL, **kwargs):
+        super().__init__(filename, encoding='utf-8', **kwargs)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def emit(self, record):
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            self._pending += 1
+            if (self._pending >= self.batch_size or record.levelno >= logging.ERROR
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        super().flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+
+# 队列空闲时也定期刷盘，最后一批日志不会一直留在缓冲区里
+class BatchingQueueListener(QueueListener):
+    def __init__(self, log_queue, *handlers, flush_interval=LOG_FLUSH_INTERVAL):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.flush_interval = flush_interval
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.flush_interval)
+            except queue.Empty:
+                for handler in self.handlers:
+                    handler.flush()
+
+
+# 进程内队列不需要序列化，跳过 QueueHandler 默认在调用线程里做的格式化
+class LocalQueueHandler(QueueHandler):
+    def prepare(self, record):
+        return record
+
+
+# 按调用位置限流和采样：
+# - DEBUG/INFO 日志每个调用位置是令牌桶限流，超出部分丢弃，恢复后在下一条里注明丢了多少条
+# - 调用时传 extra={'sample_every': N} 则该位置每 N 条只输出 1 条
+# WARNING 及以上不受影响
+class CallSiteFilter(logging.Filter):
+    def __init__(self, rate=SITE_RATE, burst=SITE_BURST):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                # [令牌数, 上次补充时间, 采样计数, 被丢弃条数]
+                site = self._sites[key] = [self.burst, now, 0, 0]
+
+            sample_every = getattr(record, 'sample_every', 1)
+            if sample_every > 1:
+                site[2] += 1
+                if site[2] % sample_every != 1:
+                    return False
+
+            site[0] = min(self.burst, site[0] + (now - site[1]) * self.rate)
+            site[1] = now
+            if site[0] < 1:
+                site[3] += 1
+                return False
+            site[0] -= 1
+            dropped, site[3] = site[3], 0
+
+        if dropped:
+            record.msg = f"{record.msg} (该位置此前 {dropped} 条日志被限流丢弃)"
+        return True
+
+
+# 配置日志记录器：调用方只把记录放进队列，控制台输出和文件写入都在后台日志线程里完成
 logger = logging.getLogger('livekit_manager')
 logger.setLevel(logging.DEBUG)
+logger.propagate = False
+logger.addFilter(CallSiteFilter())
 
 # 创建控制台处理程序
 console_handler = logging.StreamHandler()
 console_handler.setLevel(logging.DEBUG)
 
 # 创建文件处理程序
-file_handler = logging.FileHandler('livekit_manager.log')
+file_handler = BatchedRotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
 file_handler.setLevel(logging.DEBUG)
 
 # 创建格式化器
@@ -19,6 +131,9 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 console_handler.setFormatter(formatter)
 file_handler.setFormatter(formatter)
 
-# 将处理程序添加到记录器
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
+# 记录器只挂一个队列处理程序
+log_queue = queue.SimpleQueue()
+logger.addHandler(LocalQueueHandler(log_queue))
+log_listener = BatchingQueueListener(log_queue, console_handler, file_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
@@ -0,0 +1,200 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from asyncio import events
+
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+# 超过这么多毫秒的回调记为慢回调；可用环境变量调整
+SLOW_CALLBACK_MS = float(os.environ.get('LIVEKIT_SLOW_CALLBACK_MS', 100))
+# 保留最近多少秒的延迟曲线和多少条慢回调记录
+LAG_HISTORY_SECONDS = 60
+MAX_SLOW_CALLBACKS = 200
+# 采样的调用栈最多保留多少层
+MAX_STACK_DEPTH = 64
+
+
+class SlowCallback:
+    __slots__ = ('name', 'duration', 'ended_at', 'samples')
+
+    def __init__(self, name, duration, ended_at, samples):
+        self.name = name
+        self.duration = duration
+        self.ended_at = ended_at
+        # 卡顿期间采到的调用栈 [(frame, ...)]，从最外层到最内层
+        self.samples = samples
+
+    @property
+    def top_frame(self):
+        return self.samples[-1][-1] if self.samples else ""
+
+
+def describe_callback(callback):
+    # Task 的回调是 task.__step，显示协程名；其他回调显示函数的限定名
+    owner = getattr(callback, '__self__', None)
+    if isinstance(owner, asyncio.Task):
+        coro = owner.get_coro()
+        return f"Task {getattr(coro, '__qualname__', repr(coro))}"
+    func = getattr(callback, 'func', callback)  # functools.partial
+    return getattr(func, '__qualname__', None) or repr(func)
+
+
+def format_stack(frame):
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+# 事件循环监控：
+# - 探测协程每 interval 秒醒来一次，实际多睡的时间就是循环延迟，同时作为心跳
+# - 包装 asyncio Handle._run，记录超过阈值的回调/协程步骤 (qasync 的回调也走这里)
+# - 看门狗线程发现心跳停住超过阈值时，定期采样事件循环线程的调用栈，
+#   Qt 直接调用的槽函数 (不经过 asyncio) 卡住循环时也能采到
+# 采到的调用栈累积成 collapsed stacks 格式，可以直接交给 flamegraph.pl / speedscope
+class LoopMonitor:
+    def __init__(self, interval=0.05, slow_threshold=SLOW_CALLBACK_MS / 1000, sample_interval=0.005):
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.sample_interval = sample_interval
+        self.lag_history = deque(maxlen=int(LAG_HISTORY_SECONDS / interval))
+        self.slow_callbacks = deque(maxlen=MAX_SLOW_CALLBACKS)
+        self.profile = Counter()
+        self.max_lag = 0.0
+        self.total_samples = 0
+        self.slow_count = 0
+
+        self._lag_metric = metrics.histogram("event_loop_lag_seconds", "事件循环调度延迟")
+        self._slow_metric = metrics.counter("event_loop_slow_callbacks_total", "超过阈值的慢回调数")
+        self._loop = None
+        self._loop_thread = None
+        self._probe_task = None
+        self._watchdog = None
+        self._stop = threading.Event()
+        self._heartbeat = time.monotonic()
+        # 正在执行的回调 (回调对象, 开始时间)，看门狗线程只读
+        self._current = None
+        self._stall_samples = []
+        self._original_run = None
+
+    @property
+    def running(self):
+        return self._probe_task is not None
+
+    def start(self, loop=None):
+        if self.running:
+            return
+        self._loop = loop or asyncio.get_event_loop()
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._install_handle_hook()
+        self._probe_task = asyncio.ensure_future(self._probe(), loop=self._loop)
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"事件循环监控已启动，慢回调阈值 {self.slow_threshold * 1000:.0f}ms")
+
+    def stop(self):
+        if not self.running:
+            return
+        self._probe_task.cancel()
+        self._probe_task = None
+        self._stop.set()
+        self._watchdog.join()
+        self._watchdog = None
+        self._remove_handle_hook()
+
+    def _install_handle_hook(self):
+        monitor = self
+        original = self._original_run = events.Handle._run
+
+        def timed_run(handle):
+            if threading.get_ident() != monitor._loop_thread:
+                return original(handle)
+            started = time.perf_counter()
+            monitor._current = (handle._callback, started)
+            try:
+                return original(handle)
+            finally:
+                monitor._current = None
+                duration = time.perf_counter() - started
+                if duration >= monitor.slow_threshold:
+                    monitor._record_slow(describe_callback(handle._callback), duration)
+
+        events.Handle._run = timed_run
+
+    def _remove_handle_hook(self):
+        if self._original_run is not None:
+            events.Handle._run = self._original_run
+            self._original_run = None
+
+    def _record_slow(self, name, duration):
+        samples, self._stall_samples = self._stall_samples, []
+        self.slow_callbacks.append(SlowCallback(name, duration, time.time(), samples))
+        self.slow_count += 1
+        self._slow_metric.inc()
+        top = samples[-1][-1] if samples else "无调用栈采样"
+        logger.warning(f"慢回调: {name} 耗时 {duration * 1000:.1f}ms, 位置: {top}")
+
+    async def _probe(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                started = loop.time()
+                self._heartbeat = time.monotonic()
+                await asyncio.sleep(self.interval)
+                lag = max(loop.time() - started - self.interval, 0.0)
+                self._heartbeat = time.monotonic()
+                self.lag_history.append((time.monotonic(), lag))
+                self.max_lag = max(self.max_lag, lag)
+                self._lag_metric.observe(lag)
+                # 慢的 asyncio 回调结束时会取走卡顿采样；还有剩余说明卡在 asyncio 之外
+                # (比如 Qt 直接调用的槽函数)，由心跳补记一条
+                if self._stall_samples and lag >= self.slow_threshold:
+                    self._record_slow("Qt 回调", lag)
+        except asyncio.CancelledError:
+            pass
+
+    def _watch(self):
+        limit = self.interval + self.slow_threshold
+        while not self._stop.wait(self.sample_interval):
+            if time.monotonic() - self._heartbeat < limit:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = format_stack(frame)
+            current = self._current
+            if current is not None:
+                stack = (describe_callback(current[0]),) + stack
+            self._stall_samples.append(stack)
+            self.profile[stack] += 1
+            self.total_samples += 1
+
+    def lag_percentiles(self, *percentiles):
+        values = sorted(lag for _, lag in self.lag_history)
+        if not values:
+            return [0.0 for _ in percentiles]
+        return [values[min(int(len(values) * p / 100), len(values) - 1)] for p in percentiles]
+
+    def dump_collapsed(self, path):
+        # 每行 "frame;frame;frame 采样数"，flamegraph.pl / speedscope / inferno 都能直接读取
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.profile.most_common():
+                f.write(";".join(s.replace(";", ":") for s in stack) + f" {count}\n")
+        logger.info(f"已导出事件循环卡顿火焰图数据: {path}, 共 {self.total_samples} 个采样")
+        return path
+
+    def reset(self):
+        self.profile.clear()
+        self.slow_callbacks.clear()
+        self.total_samples = 0
+        self.slow_count = 0
+        self.max_lag = 0.0
@@ -0,0 +1,72 @@
+import time
+
+
+# 播放端的媒体时钟：所有轨道共用，决定画面在本地什么时候显示。
+# 音频帧没有时间戳，只能按到达顺序播放，播放延迟就是播放队列里还没播出的时长加上声卡延迟；
+# 画面在按时间戳排好的时刻上再推迟同样的时长，就能和声音对齐 (口型同步)
+class MediaClock:
+    def __init__(self, playout_delay=0.05, smoothing=0.1):
+        # playout_delay: 给网络抖动留的缓冲 (秒)
+        self.playout_delay = playout_delay
+        self.smoothing = smoothing
+        self.audio_latency = 0.0
+
+    def now(self):
+        return time.monotonic()
+
+    def set_audio_latency(self, seconds):
+        # 播放队列深度每块都在变，做指数平滑，避免画面跟着抖
+        self.audio_latency += (max(0.0, seconds) - self.audio_latency) * self.smoothing
+
+    def reset_audio_latency(self):
+        self.audio_latency = 0.0
+
+    def delay(self):
+        return self.playout_delay + self.audio_latency
+
+
+# 按 VideoFrameEvent 的时间戳排定每一帧的显示时刻：
+#   本地时钟与时间戳的差取历史最小值 (到得最早的一帧代表没有网络抖动)，
+#   显示时刻 = 时间戳 + 这个差 + 媒体时钟的延迟 (抖动缓冲 + 音频播放延迟)。
+# 成批到达的帧按时间戳间隔依次显示；比显示时刻晚了 late_threshold 以上的帧直接丢弃；
+# 连续 resync_after 帧都迟到 (网络延迟变大) 或时间戳倒退/跳变时重新对齐
+class PresentationScheduler:
+    def __init__(self, clock, late_threshold=0.05, resync_after=15, max_gap=1.0, max_wait=0.5):
+        self.clock = clock
+        self.late_threshold = late_threshold
+        self.resync_after = resync_after
+        self.max_gap = max_gap
+        self.max_wait = max_wait
+        self.offset = None
+        self.last_pts = None
+        self.scheduled = 0
+        self.late = 0
+        self.resyncs = 0
+        self._late_run = 0
+
+    def delay_for(self, timestamp_us, now=None):
+        # 返回距离显示时刻还要等待的秒数 (不大于 0 表示立即显示)；迟到应该丢弃时返回 None
+        now = self.clock.now() if now is None else now
+        pts = timestamp_us / 1_000_000
+        offset = now - pts
+        if self.offset is None:
+            self.offset = offset
+        elif pts < self.last_pts or pts - self.last_pts > self.max_gap:
+            self.offset = offset
+            self.resyncs += 1
+        elif offset < self.offset:
+            self.offset = offset
+        self.last_pts = pts
+
+        delay = pts + self.offset + self.clock.delay() - now
+        if delay < -self.late_threshold:
+            self.late += 1
+            self._late_run += 1
+            if self._late_run >= self.resync_after:
+                self.offset = offset
+                self.resyncs += 1
+                self._late_run = 0
+            return None
+        self._late_run = 0
+        self.scheduled += 1
+        return min(delay, self.max_wait)
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import traceback
+
+from app.utils.logger import logger
+
+
+async def run_in_loop(loop, coro):
+    # 在 loop 上执行协程，在当前事件循环里等待结果；取消等待方会一并取消 loop 上的任务
+    if loop is None or loop is asyncio.get_running_loop():
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+async def run_in_room(room, coro):
+    # Room 的事件监听、publish_track/unpublish_track 的回调都在创建 Room 时指定的事件循环上，
+    # 这类协程必须在那个循环里执行
+    return await run_in_loop(getattr(room, '_loop', None), coro)
+
+
+# 独立线程上的 asyncio 事件循环：Room 和所有 AudioStream/VideoStream 的消费都在这里，
+# 界面线程 (qasync) 的表格重建、窗口缩放等重活不会再卡住音视频
+class MediaLoop:
+    def __init__(self, name="media-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logger.info("媒体事件循环线程已启动")
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def in_loop(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        # 从任意线程提交协程，返回 concurrent.futures.Future (可以 cancel)
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def run(self, coro):
+        return await run_in_loop(self.loop, coro)
+
+    def call(self, callback, *args):
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def stop(self, timeout=5.0):
+        if not self.running:
+            return
+
+        async def shutdown():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            self.submit(shutdown()).result(timeout)
+        except Exception:
+            logger.warning(f"媒体事件循环退出时仍有任务未结束: \n{traceback.format_exc()}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        logger.info("媒体事件循环线程已停止")
@@ -0,0 +1,107 @@
+import time
+from collections import deque
+
+NGRAM = 3
+
+
+class StoredMessage:
+    __slots__ = ('seq', 'kind', 'text', 'ts')
+
+    def __init__(self, seq, kind, text, ts):
+        self.seq = seq
+        self.kind = kind
+        self.text = text
+        self.ts = ts
+
+
+def _ngrams(text):
+    text = text.lower()
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+# 固定容量的消息/事件环形缓冲区，超出容量时丢弃最旧的记录；
+# 维护三元组倒排索引，子串搜索不需要扫描全部历史
+class MessageStore:
+    def __init__(self, capacity=5000):
+        self.capacity = capacity
+        self.messages = deque()
+        self.next_seq = 0
+        self._index = {}
+
+    def __len__(self):
+        return len(self.messages)
+
+    @property
+    def first_seq(self):
+        return self.messages[0].seq if self.messages else self.next_seq
+
+    def at(self, position):
+        return self.messages[position]
+
+    def by_seq(self, seq):
+        position = seq - self.first_seq
+        if 0 <= position < len(self.messages):
+            return self.messages[position]
+        return None
+
+    def append(self, text, kind='chat', ts=None):
+        # 返回被挤出缓冲区的消息数
+        message = StoredMessage(self.next_seq, kind, text, ts if ts is not None else time.time())
+        self.next_seq += 1
+        self.messages.append(message)
+        for gram in _ngrams(text):
+            self._index.setdefault(gram, set()).add(message.seq)
+
+        evicted = max(len(self.messages) - self.capacity, 0)
+        self.evict_oldest(evicted)
+        return evicted
+
+    def prepend(self, text, kind='chat', ts=None):
+        # 在最前面插入更早的历史记录，缓冲区已满时不插入
+        if len(self.messages) >= self.capacity:
+            return False
+        message = StoredMessage(self.first_seq - 1, kind, text, ts if ts is not None else time.time())
+        self.messages.appendleft(message)
+        for gram in _ngrams(text):
+            self._index.setdefault(gram, set()).add(message.seq)
+        return True
+
+    def evict_oldest(self, count):
+        for _ in range(min(count, len(self.messages))):
+            self._unindex(self.messages.popleft())
+
+    def clear(self):
+        self.messages.clear()
+        self._index.clear()
+
+    def _unindex(self, message):
+        for gram in _ngrams(message.text):
+            seqs = self._index.get(gram)
+            if seqs is not None:
+                seqs.discard(message.seq)
+                if not seqs:
+                    del self._index[gram]
+
+    def search(self, query):
+        # 返回按时间排序的匹配消息序号
+        query = query.lower()
+        if not query:
+            return [m.seq for m in self.messages]
+        if len(query) < NGRAM:
+            return [m.seq for m in self.messages if query in m.text.lower()]
+
+        candidates = None
+        for gram in sorted(_ngrams(query), key=lambda g: len(self._index.get(g, ()))):
+            seqs = self._index.get(gram)
+            if not seqs:
+                return []
+            candidates = set(seqs) if candidates is None else candidates & seqs
+            if not candidates:
+                return []
+        # 三元组全部命中不代表子串一定连续出现，需要再确认一次
+        result = []
+        for seq in sorted(candidates):
+            message = self.by_seq(seq)
+            if message and query in message.text.lower():
+                result.append(seq)
+        return result
@@ -0,0 +1,264 @@
+import bisect
+import json
+import os
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.utils.logger import logger
+
+# LIVEKIT_METRICS=1 开启指标采集；LIVEKIT_METRICS_PORT 开启 Prometheus 文本格式的 HTTP 接口，
+# LIVEKIT_METRICS_JSON 指定定期写出 JSON 快照的文件路径
+ENABLE_ENV = "LIVEKIT_METRICS"
+PORT_ENV = "LIVEKIT_METRICS_PORT"
+JSON_ENV = "LIVEKIT_METRICS_JSON"
+
+# 默认的直方图分桶 (秒)，覆盖 1ms 到 1s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class Counter:
+    __slots__ = ('value',)
+    kind = 'counter'
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ('value',)
+    kind = 'gauge'
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+    kind = 'histogram'
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+# 关闭指标时所有指标都是这个空对象，热路径上的调用只是一次空方法调用
+class NoopMetric:
+    __slots__ = ()
+    value = 0
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+NOOP = NoopMetric()
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+# 指标注册表：按 (名称, 标签) 保存计数器、仪表和直方图。
+# 调用方应在轨道/房间开始时取一次指标对象并缓存，不要在每帧里按名称查找
+class MetricsRegistry:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._metrics = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        if not self.enabled:
+            return NOOP
+        key = (name, _label_key(labels))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = cls(**kwargs)
+                    if help:
+                        self._help.setdefault(name, help)
+        return metric
+
+    def counter(self, name, help="", **labels):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help="", **labels):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS, **labels):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def remove(self, **labels):
+        # 轨道/房间结束时删除带这些标签的所有指标，注册表不会随时间增长
+        if not self.enabled:
+            return
+        wanted = set(_label_key(labels))
+        with self._lock:
+            for key in [k for k in self._metrics if wanted <= set(k[1])]:
+                del self._metrics[key]
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._metrics.items())
+
+    def render_prometheus(self):
+        lines = []
+        declared = set()
+        for (name, labels), metric in sorted(self.snapshot(), key=lambda item: item[0]):
+            if name not in declared:
+                declared.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+            if metric.kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), metric.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float('inf') else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {metric.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {metric.count}")
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {metric.value}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self):
+        result = []
+        for (name, labels), metric in self.snapshot():
+            item = {'name': name, 'labels': dict(labels), 'type': metric.kind}
+            if metric.kind == 'histogram':
+                item.update({'buckets': list(metric.buckets), 'counts': list(metric.counts),
+                             'sum': metric.sum, 'count': metric.count})
+            else:
+                item['value'] = metric.value
+            result.append(item)
+        return {'ts': time.time(), 'metrics': result}
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (k + '="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+               for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+class MetricsHTTPServer:
+    def __init__(self, registry, port, host='127.0.0.1'):
+        self.registry = registry
+        registry_ref = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = registry_ref.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        logger.info(f"指标接口已启动: http://{self.server.server_address[0]}:{self.port}/metrics")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class JsonDumper:
+    def __init__(self, registry, path, interval=10.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-json", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.dump()
+
+    def dump(self):
+        # 先写临时文件再替换，读取方不会读到写了一半的文件
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.registry.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError:
+            logger.error(f"写入指标快照失败: \n{traceback.format_exc()}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+
+metrics = MetricsRegistry(enabled=os.environ.get(ENABLE_ENV, "") not in ("", "0")
+                          or bool(os.environ.get(PORT_ENV)) or bool(os.environ.get(JSON_ENV)))
+
+
+def start_exporters(port=None, json_path=None, json_interval=10.0):
+    # 参数为空时读环境变量；返回启动的导出器列表，退出时调用各自的 stop()
+    port = port if port is not None else os.environ.get(PORT_ENV)
+    json_path = json_path or os.environ.get(JSON_ENV)
+    exporters = []
+    if port or json_path:
+        metrics.enabled = True
+    if port:
+        server = MetricsHTTPServer(metrics, int(port))
+        server.start()
+        exporters.append(server)
+    if json_path:
+        dumper = JsonDumper(metrics, json_path, json_interval)
+        dumper.start()
+        exporters.append(dumper)
+    return exporters
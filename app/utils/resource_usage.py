@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+
+try:
+    import psutil
+except ImportError:  # psutil 是可选依赖
+    psutil = None
+
+
+def current_rss():
+    # 当前进程常驻内存 (字节)，拿不到时返回 None
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 上单位是字节，Linux 上是 KB；这里只能拿到峰值
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return None
+
+
+class ResourceSample:
+    __slots__ = ('rss', 'cpu', 'wall')
+
+    def __init__(self):
+        self.rss = current_rss()
+        self.cpu = time.process_time()
+        self.wall = time.monotonic()
+
+
+def cpu_percent_between(start, end):
+    wall = end.wall - start.wall
+    if wall <= 0:
+        return 0.0
+    return (end.cpu - start.cpu) / wall * 100
+
+
+def format_bytes(value):
+    if value is None:
+        return "未知"
+    return f"{value / (1024 * 1024):.1f}MB"
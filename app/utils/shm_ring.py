@@ -0,0 +1,157 @@
+import asyncio
+from multiprocessing import shared_memory
+
+from app.utils.lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+# 共享内存布局 (全部为 int64，数据区按 8 字节对齐)：
+#   头部: [已写入帧数, 槽数, 每槽容量 (字节), 写端已关闭]
+#   每个槽: [序号, 宽, 高, 数据字节数, 时间戳 (微秒)] + 数据区
+# 槽序号是 seqlock：写第 n 帧时先置为 2n+1，写完置为 2n+2；
+# 读端拷贝前后各读一次序号，不一致说明读的过程中被覆盖了，丢弃这一帧
+HEADER_FIELDS = 4
+SLOT_FIELDS = 5
+_COUNT, _SLOTS, _CAPACITY, _CLOSED = range(HEADER_FIELDS)
+_SEQ, _WIDTH, _HEIGHT, _NBYTES, _PTS = range(SLOT_FIELDS)
+
+
+def _aligned(size):
+    return (size + 7) // 8 * 8
+
+
+# 单写单读的帧环形缓冲区：写端 (媒体工作进程) 写入解码后的帧，读端 (界面进程) 按序号读取，
+# 帧数据不经过 pickle，也不需要锁
+class FrameRing:
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        self.slots = int(self.header[_SLOTS])
+        self.capacity = int(self.header[_CAPACITY])
+        self._stride = SLOT_FIELDS * 8 + _aligned(self.capacity)
+        self._slot_headers = []
+        self._slot_data = []
+        for i in range(self.slots):
+            offset = HEADER_FIELDS * 8 + i * self._stride
+            self._slot_headers.append(np.ndarray((SLOT_FIELDS,), dtype=np.int64, buffer=shm.buf, offset=offset))
+            self._slot_data.append(np.ndarray((self.capacity,), dtype=np.uint8, buffer=shm.buf,
+                                              offset=offset + SLOT_FIELDS * 8))
+        # 读端状态：下一个要读的帧号，以及被覆盖/读到一半被改写而丢掉的帧数
+        self.next_frame = 0
+        self.dropped = 0
+        self.current = None
+
+    @classmethod
+    def create(cls, slots, capacity):
+        size = HEADER_FIELDS * 8 + slots * (SLOT_FIELDS * 8 + _aligned(capacity))
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = (0, slots, capacity, 0)
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(shared_memory.SharedMemory(name=name))
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def written(self):
+        return int(self.header[_COUNT])
+
+    @property
+    def closed(self):
+        return bool(self.header[_CLOSED])
+
+    def write(self, data, width=0, height=0, pts_us=0):
+        payload = np.frombuffer(data, dtype=np.uint8)
+        if payload.size > self.capacity:
+            raise ValueError(f"帧大小 {payload.size} 超过共享内存槽容量 {self.capacity}")
+        n = int(self.header[_COUNT])
+        slot = self._slot_headers[n % self.slots]
+        slot[_SEQ] = 2 * n + 1
+        self._slot_data[n % self.slots][:payload.size] = payload
+        slot[_WIDTH] = width
+        slot[_HEIGHT] = height
+        slot[_NBYTES] = payload.size
+        slot[_PTS] = pts_us
+        slot[_SEQ] = 2 * n + 2
+        self.header[_COUNT] = n + 1
+
+    def mark_closed(self):
+        self.header[_CLOSED] = 1
+
+    def intact(self, n):
+        # 第 n 帧是否仍在槽里、没有被写端覆盖或正在改写
+        slots = self._slot_headers
+        return bool(slots) and slots[n % self.slots][_SEQ] == 2 * n + 2
+
+    def read_frame(self, n, copy=True):
+        # 返回 (数据, 宽, 高, 时间戳)；这一帧已经被覆盖或正在被改写时返回 None。
+        # copy=False 时数据是共享内存上的视图，不复制：用完之前写端可能覆盖它，读端处理完要用 intact(n) 确认
+        slot = self._slot_headers[n % self.slots]
+        expected = 2 * n + 2
+        if slot[_SEQ] != expected:
+            return None
+        width, height, nbytes, pts = (int(v) for v in slot[_WIDTH:])
+        data = self._slot_data[n % self.slots][:nbytes]
+        if copy:
+            data = data.copy()
+        if slot[_SEQ] != expected:
+            return None
+        return data, width, height, pts
+
+    def read_new(self, latest_only=False, copy=True):
+        # 读取上次之后写入的帧，返回 [(帧号, 帧)]；latest_only 时只取最新一帧 (视频)，否则按顺序全部读出 (音频)，
+        # 落后超过一圈的部分计入 dropped
+        written = self.written
+        if written <= self.next_frame:
+            return []
+        first = written - 1 if latest_only else max(self.next_frame, written - self.slots)
+        self.dropped += first - self.next_frame
+        frames = []
+        for n in range(first, written):
+            frame = self.read_frame(n, copy)
+            if frame is None:
+                self.dropped += 1
+            else:
+                frames.append((n, frame))
+        self.next_frame = written
+        return frames
+
+    async def frames(self, latest_only=False, poll_interval=0.005, copy=True):
+        # 轮询写入计数，写端关闭且没有新帧时结束；copy=False 时产出共享内存上的视图，
+        # 读端处理完用 valid() 确认刚产出的这一帧没有被覆盖
+        while True:
+            frames = self.read_new(latest_only, copy)
+            if frames:
+                for n, frame in frames:
+                    self.current = n
+                    yield frame
+                continue
+            if self.closed:
+                return
+            await asyncio.sleep(poll_interval)
+
+    def valid(self):
+        # frames() 最近产出的一帧是否仍然完整，不完整时计入 dropped
+        if self.current is not None and self.intact(self.current):
+            return True
+        self.dropped += 1
+        return False
+
+    def close(self):
+        # 先释放所有指向共享内存的 numpy 视图，否则 SharedMemory.close 会报 BufferError
+        self.header = None
+        self._slot_headers = []
+        self._slot_data = []
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
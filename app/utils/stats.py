@@ -0,0 +1,30 @@
+import math
+
+
+def percentile(values, p):
+    # 线性插值的百分位数，values 为空时返回 None
+    if not values:
+        return None
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * p / 100
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return ordered[low]
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values, scale=1.0, digits=3):
+    # 生成 count/mean/p50/p95/p99/max 摘要，常用于报告
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values) * scale, digits),
+        'p50': round(percentile(values, 50) * scale, digits),
+        'p95': round(percentile(values, 95) * scale, digits),
+        'p99': round(percentile(values, 99) * scale, digits),
+        'max': round(max(values) * scale, digits),
+    }
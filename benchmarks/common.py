@@ -0,0 +1,108 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+# 各基准共用的工具：统计、报告格式 (JSON，可按提交对比) 和报告之间的对比
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def summarize(values):
+    # values 的单位是秒，报告里统一用毫秒
+    return {
+        'median_ms': round(statistics.median(values) * 1000, 4),
+        'min_ms': round(min(values) * 1000, 4),
+        'max_ms': round(max(values) * 1000, 4),
+    }
+
+
+def measure(fn, runs, warmup=1):
+    # 同步调用 fn()，返回每次的耗时 (秒)；预热的几次不计入
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def measure_async(make_coro, runs, warmup=1):
+    for _ in range(warmup):
+        await make_coro()
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await make_coro()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def make_report(benchmark, runs, results, **extra):
+    report = {
+        'benchmark': benchmark,
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': runs,
+        'results': results,
+    }
+    report.update(extra)
+    return report
+
+
+def write_report(report, output=None, history=None):
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    if history:
+        with open(history, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(report, ensure_ascii=False) + "\n")
+
+
+def load_report(path):
+    # 报告文件，或 --history 追加的 JSONL 文件 (取最后一行)
+    with open(path, encoding='utf-8') as f:
+        text = f.read().strip()
+    if path.endswith('.jsonl'):
+        return json.loads(text.splitlines()[-1])
+    return json.loads(text)
+
+
+def compare_reports(baseline, current, threshold=0.1):
+    # 按中位数对比两份报告中都有的条目，返回 [(名称, 基线 ms, 当前 ms, 变化比例, 是否退化)]；
+    # 只统计带 median_ms 的条目 (计数类的结果不比较)
+    rows = []
+    for name, result in current['results'].items():
+        old = baseline['results'].get(name)
+        if not isinstance(result, dict) or not isinstance(old, dict):
+            continue
+        if 'median_ms' not in result or 'median_ms' not in old or not old['median_ms']:
+            continue
+        change = result['median_ms'] / old['median_ms'] - 1
+        rows.append((name, old['median_ms'], result['median_ms'], change, change > threshold))
+    return rows
+
+
+def format_comparison(rows, baseline, current):
+    lines = [f"基线 {baseline.get('commit')} -> 当前 {current.get('commit')}"]
+    width = max([len(row[0]) for row in rows] + [4])
+    for name, old, new, change, regressed in rows:
+        flag = "  <-- 退化" if regressed else ""
+        lines.append(f"{name:<{width}}  {old:>10.3f}ms  {new:>10.3f}ms  {change:+7.1%}{flag}")
+    return "\n".join(lines)
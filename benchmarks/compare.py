@@ -0,0 +1,28 @@
+import argparse
+import sys
+
+from benchmarks.common import compare_reports, format_comparison, load_report
+
+# 对比两份基准报告 (startup、media 都可以)，中位数变慢超过阈值的条目视为退化，退出码为 1。
+# 用法: python -m benchmarks.compare base.json new.json [--threshold 0.1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="对比两份基准报告")
+    parser.add_argument('baseline', help="基线报告 (JSON，或 JSONL 历史文件的最后一行)")
+    parser.add_argument('current', help="当前报告")
+    parser.add_argument('--threshold', type=float, default=0.1, help="中位数变慢超过这个比例视为退化")
+    args = parser.parse_args(argv)
+
+    baseline = load_report(args.baseline)
+    current = load_report(args.current)
+    if baseline.get('benchmark') != current.get('benchmark'):
+        print(f"两份报告不是同一个基准: {baseline.get('benchmark')} / {current.get('benchmark')}")
+        return 2
+    rows = compare_reports(baseline, current, args.threshold)
+    print(format_comparison(rows, baseline, current))
+    return 1 if any(row[4] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
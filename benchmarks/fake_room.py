@@ -0,0 +1,339 @@
+import asyncio
+import contextlib
+import itertools
+import random
+import time
+
+from livekit import rtc
+from livekit.rtc import TrackKind, TrackSource
+
+# 进程内的假 LiveKit：实现 LiveKitManager / SessionManager 用到的 rtc.Room、RemoteParticipant、
+# RemoteTrackPublication、AudioStream 和 VideoStream 接口，不连接服务器，
+# 按脚本 (Scenario) 以指定速率发出参与者、轨道事件，订阅的轨道按帧率产出合成的音视频帧。
+# 和真正的 Room 一样，事件在创建时指定的事件循环 (界面程序里是媒体线程) 上发出，
+# 所以 add_participant 等方法和 Scenario.play 必须在那个循环里调用。
+# 同样的种子和脚本每次产生同样的 sid、事件顺序和帧内容
+AUDIO_SAMPLE_RATE = 48000
+
+
+# 订阅后的轨道产出帧的参数
+class MediaOptions:
+    def __init__(self, video_size=(320, 240), video_fps=30, audio_block_ms=10):
+        self.video_size = video_size
+        self.video_fps = video_fps
+        self.audio_block_ms = audio_block_ms
+
+
+class FakeTrack:
+    def __init__(self, sid, kind, name, participant, options):
+        self.sid = sid
+        self.kind = kind
+        self.name = name
+        self.participant = participant
+        self.options = options
+
+
+class FakeTrackPublication:
+    def __init__(self, sid, participant, kind, name):
+        self.participant = participant
+        self.sid = sid
+        self.kind = kind
+        self.name = name
+        self.source = TrackSource.SOURCE_MICROPHONE if kind == TrackKind.KIND_AUDIO else TrackSource.SOURCE_CAMERA
+        self.muted = False
+        self.subscribed = False
+        self.track = None
+
+    def set_subscribed(self, subscribed):
+        room = self.participant.room
+        if subscribed == self.subscribed or room is None:
+            return
+        self.subscribed = subscribed
+        if subscribed:
+            self.track = FakeTrack(self.sid, self.kind, self.name, self.participant, room.media)
+            room.emit("track_subscribed", self.track, self, self.participant)
+        else:
+            track, self.track = self.track, None
+            room.emit("track_unsubscribed", track, self, self.participant)
+
+
+class FakeParticipant:
+    def __init__(self, sid, identity, room=None, audio_level=0.2):
+        self.sid = sid
+        self.identity = identity
+        self.name = identity
+        self.metadata = ""
+        self.room = room
+        # 合成音频的幅度 (0~1)，不同参与者音量不同，发言者检测才有排名
+        self.audio_level = audio_level
+        self.track_publications = {}
+
+
+class FakeLocalParticipant(FakeParticipant):
+    async def publish_data(self, payload, reliable=True, destination_identities=None, topic=""):
+        pass
+
+
+class FakeRoom(rtc.EventEmitter):
+    def __init__(self, name="bench-room", loop=None, media=None, seed=0):
+        super().__init__()
+        self._loop = loop or asyncio.get_event_loop()
+        self.name = name
+        self.media = media or MediaOptions()
+        self.random = random.Random(seed)
+        self._sids = itertools.count(1)
+        self.local_participant = FakeLocalParticipant(self.next_sid("PA"), "bench-local", self)
+        self.remote_participants = {}
+        self.auto_subscribe = True
+        self.connected = False
+
+    def next_sid(self, prefix):
+        return f"{prefix}_{next(self._sids):06d}"
+
+    def isconnected(self):
+        return self.connected
+
+    async def connect(self, url, token, options=None):
+        if options is not None:
+            self.auto_subscribe = options.auto_subscribe
+        self.connected = True
+
+    async def disconnect(self):
+        self.connected = False
+
+    def add_participant(self, identity, kinds=(TrackKind.KIND_AUDIO, TrackKind.KIND_VIDEO)):
+        # 参与者入会并发布 kinds 中的轨道；自动订阅时紧接着发出 track_subscribed
+        participant = FakeParticipant(self.next_sid("PA"), identity, self,
+                                      audio_level=round(self.random.uniform(0.05, 0.5), 3))
+        self.remote_participants[identity] = participant
+        self.emit("participant_connected", participant)
+        for kind in kinds:
+            self.publish(participant, kind)
+        return participant
+
+    def publish(self, participant, kind, name=None):
+        name = name or ("microphone" if kind == TrackKind.KIND_AUDIO else "camera")
+        publication = FakeTrackPublication(self.next_sid("TR"), participant, kind, name)
+        participant.track_publications[publication.sid] = publication
+        self.emit("track_published", publication, participant)
+        if self.auto_subscribe:
+            publication.set_subscribed(True)
+        return publication
+
+    def unpublish(self, participant, publication):
+        if publication.subscribed:
+            publication.set_subscribed(False)
+        participant.track_publications.pop(publication.sid, None)
+        self.emit("track_unpublished", publication, participant)
+
+    def remove_participant(self, identity):
+        participant = self.remote_participants.get(identity)
+        if participant is None:
+            return
+        for publication in list(participant.track_publications.values()):
+            self.unpublish(participant, publication)
+        del self.remote_participants[identity]
+        self.emit("participant_disconnected", participant)
+
+
+async def _paced(interval, capacity, closed):
+    # 按固定间隔产出帧序号，与 SyntheticAudioTrack 一样以开始时间为基准，误差不累积；
+    # 消费方落后超过 capacity 帧时跳过积压的帧 (和真正的流队列满时丢弃旧帧一样)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    tick = 0
+    while not closed():
+        yield tick
+        tick += 1
+        delay = started + tick * interval - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        elif capacity and -delay > capacity * interval:
+            tick = int((loop.time() - started) / interval)
+
+
+class FakeAudioStream:
+    def __init__(self, track=None, loop=None, capacity=0, sample_rate=AUDIO_SAMPLE_RATE, num_channels=1, **kwargs):
+        import numpy as np
+
+        self._track = track
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+        self.samples_per_block = sample_rate * track.options.audio_block_ms // 1000
+        self._closed = False
+        # 一秒的正弦波循环取用，频率按参与者区分，幅度取参与者的 audio_level
+        frequency = 200 + int(track.participant.sid[3:]) % 50 * 10
+        t = np.arange(sample_rate) / sample_rate
+        wave = (np.sin(2 * np.pi * frequency * t) * track.participant.audio_level * 32767).astype(np.int16)
+        self._wave = np.repeat(wave, num_channels)
+
+    def __aiter__(self):
+        return self._frames()
+
+    async def _frames(self):
+        block = self.samples_per_block * self.num_channels
+        interval = self.samples_per_block / self.sample_rate
+        async for tick in _paced(interval, self.capacity, lambda: self._closed):
+            start = tick * block % len(self._wave)
+            data = self._wave[start:start + block]
+            if len(data) < block:
+                data = self._wave[:block]
+            frame = rtc.AudioFrame(data.tobytes(), self.sample_rate, self.num_channels, self.samples_per_block)
+            yield rtc.AudioFrameEvent(frame)
+
+    async def aclose(self):
+        self._closed = True
+
+
+class FakeVideoStream:
+    # 同一尺寸的几帧噪声画面在所有流之间共享，生成画面的开销不算到被测代码上
+    _images = {}
+
+    def __init__(self, track=None, loop=None, capacity=0, format=None, **kwargs):
+        self._track = track
+        self.capacity = capacity
+        # format 为 None 时产出 RGBA (真正的 VideoStream 此时是 I420，转换要经过 FFI，这里做不到)
+        self.format = rtc.VideoBufferType.RGBA if format is None else format
+        self._closed = False
+
+    @classmethod
+    def images(cls, width, height, channels):
+        key = (width, height, channels)
+        if key not in cls._images:
+            import numpy as np
+
+            rng = np.random.default_rng(0)
+            cls._images[key] = [rng.integers(0, 256, width * height * channels, dtype=np.uint8).tobytes()
+                                for _ in range(4)]
+        return cls._images[key]
+
+    def __aiter__(self):
+        return self._frames()
+
+    async def _frames(self):
+        if self.format not in (rtc.VideoBufferType.RGB24, rtc.VideoBufferType.RGBA):
+            raise ValueError(f"假视频流只支持 RGB24/RGBA，请求的格式为 {self.format}")
+        width, height = self._track.options.video_size
+        channels = 3 if self.format == rtc.VideoBufferType.RGB24 else 4
+        images = self.images(width, height, channels)
+        interval = 1 / self._track.options.video_fps
+        started = time.time()
+        async for tick in _paced(interval, self.capacity, lambda: self._closed):
+            frame = rtc.VideoFrame(width, height, self.format, images[tick % len(images)])
+            yield rtc.VideoFrameEvent(frame, int((started + tick * interval) * 1_000_000), 0)
+
+    async def aclose(self):
+        self._closed = True
+
+
+@contextlib.contextmanager
+def patch_streams():
+    # 应用代码通过 rtc.AudioStream(...) / rtc.VideoStream(...) 创建流，替换 livekit.rtc 上的这两个名字即可；
+    # 不是假轨道时仍然创建真正的流
+    real_audio, real_video = rtc.AudioStream, rtc.VideoStream
+
+    def audio_stream(track=None, *args, **kwargs):
+        if isinstance(track, FakeTrack):
+            return FakeAudioStream(track, *args, **kwargs)
+        return real_audio(track, *args, **kwargs)
+
+    def video_stream(track=None, *args, **kwargs):
+        if isinstance(track, FakeTrack):
+            return FakeVideoStream(track, *args, **kwargs)
+        return real_video(track, *args, **kwargs)
+
+    rtc.AudioStream, rtc.VideoStream = audio_stream, video_stream
+    try:
+        yield
+    finally:
+        rtc.AudioStream, rtc.VideoStream = real_audio, real_video
+
+
+KINDS = {'audio': TrackKind.KIND_AUDIO, 'video': TrackKind.KIND_VIDEO}
+
+
+# 房间事件脚本：每一步在 over 秒内均匀地发出 count 次事件 (over 为 0 时一次性发出)，
+# 例如 Scenario().join(500, over=2.0) 表示 2 秒内进来 500 个参与者。
+# 也可以从 JSON 读取: {"steps": [{"action": "join", "count": 500, "over": 2}, {"action": "wait", "seconds": 5}]}
+class Scenario:
+    def __init__(self, prefix="user"):
+        self.prefix = prefix
+        self.steps = []
+        self.joined = 0
+
+    @classmethod
+    def from_dict(cls, data):
+        scenario = cls(data.get('prefix', "user"))
+        for step in data.get('steps', []):
+            step = dict(step)
+            action = step.pop('action')
+            if 'kinds' in step:
+                step['kinds'] = [KINDS[kind] for kind in step['kinds']]
+            getattr(scenario, action)(**step)
+        return scenario
+
+    def join(self, count, over=0.0, kinds=(TrackKind.KIND_AUDIO, TrackKind.KIND_VIDEO)):
+        identities = [f"{self.prefix}-{self.joined + i:05d}" for i in range(count)]
+        self.joined += count
+        self.steps.append(('join', identities, over, tuple(kinds)))
+        return self
+
+    def leave(self, count=None, over=0.0):
+        # 按入会顺序离开，count 为 None 时全部离开
+        self.steps.append(('leave', count, over, None))
+        return self
+
+    def wait(self, seconds):
+        self.steps.append(('wait', None, seconds, None))
+        return self
+
+    async def play(self, room):
+        # 在 room 的事件循环上执行；返回每一步的实际耗时和事件最多比计划晚了多少 (秒)
+        loop = asyncio.get_running_loop()
+        present = list(room.remote_participants)
+        report = []
+        for action, arg, over, kinds in self.steps:
+            if action == 'wait':
+                await asyncio.sleep(over)
+                continue
+            if action == 'join':
+                targets = arg
+                present.extend(arg)
+                emit = lambda identity: room.add_participant(identity, kinds)
+            else:
+                count = len(present) if arg is None else min(arg, len(present))
+                targets, present = present[:count], present[count:]
+                emit = room.remove_participant
+            started = loop.time()
+            max_late = 0.0
+            for i, identity in enumerate(targets):
+                delay = started + over * i / len(targets) - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    max_late = max(max_late, -delay)
+                emit(identity)
+            report.append({'action': action, 'count': len(targets), 'seconds': loop.time() - started,
+                           'max_late': max_late})
+        return report
+
+
+# 代替 rtc.AudioStream / rtc.VideoStream：按顺序产出事先准备好的帧事件 (AudioFrameEvent / VideoFrameEvent)，
+# 不按帧率等待，用于只关心单帧处理耗时的微基准
+class ScriptedStream:
+    def __init__(self, events):
+        self.events = events
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for event in self.events:
+            if self.closed:
+                return
+            yield event
+
+    async def aclose(self):
+        self.closed = True
@@ -0,0 +1,557 @@
+import argparse
+import asyncio
+import json
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from livekit.rtc import TrackKind
+
+from benchmarks.common import (compare_reports, format_comparison, load_report, make_report, measure,
+                               measure_async, summarize, write_report)
+from benchmarks.fake_room import FakeRoom, MediaOptions, Scenario, ScriptedStream, patch_streams
+
+# 媒体热路径基准：全部使用合成数据，不需要网络和 LiveKit 服务。
+#   video.*        RGB24 帧写入帧缓冲池 (play_video_frames，与真实播放一样跑在媒体线程上)、画面不变时的重复帧检测
+#                  和界面线程上的 show_frame
+#   audio.*        音频帧的音量计算和入播放队列 (play_audio_blocks，声卡换成只取数据的空输出)
+#   wav.*          录制 5 秒音频到 WAV (直接写 / 交给写盘线程)
+#   workers.*      媒体工作进程的共享内存环：界面进程读一帧进帧缓冲池的耗时 (零拷贝 / 先拷出再复制)；
+#                  N 条 720p@30fps 轨道的解码 (I420 转 RGB) 放在界面进程里和放在 N 个工作进程里时，
+#                  界面进程每帧的 CPU 时间和每条轨道实际的帧间隔
+#   tracks_table.* 参与者轨道表格 update_tracks_table：从空表填满、10% 的行变化、数据不变，各自包含一次重绘
+#   room_list.*    房间管理页 update_room_list 填充房间表格并重绘
+#   e2e.*          假房间 (benchmarks/fake_room.py) 驱动完整的 LiveKitManager：按脚本以指定速率入会/离开，
+#                  测到轨道表格刷新完成的耗时；再让 --play 个参与者的画面以 30fps 播放，测实际的渲染间隔
+# 视频、音频按单帧/单块计时，其余按单次操作计时。结果写成 JSON，可以用 benchmarks.compare 按提交对比。
+# 用法: python -m benchmarks.media --runs 10 --output media.json [--history media_history.jsonl] [--compare base.json]
+VIDEO_SIZES = ((320, 240), (640, 360), (1280, 720))
+VIDEO_FRAMES_PER_RUN = 60
+AUDIO_BLOCKS_PER_RUN = 500
+AUDIO_SAMPLES_PER_BLOCK = 480
+AUDIO_SAMPLE_RATE = 48000
+WAV_SECONDS = 5
+TABLE_SIZES = (10, 100, 1000)
+FAKE_URL = "ws://fake.invalid"
+PLAYBACK_VIDEO_SIZE = (640, 360)
+PLAYBACK_SECONDS = 2.0
+WORKER_VIDEO_SIZE = (1280, 720)
+WORKER_TRACKS = (1, 2, 4)
+WORKER_FPS = 30
+SETTLE_TIMEOUT = 60.0
+
+
+def synthetic_video(width, height, count=4):
+    import numpy as np
+
+    # 几帧内容不同的噪声画面循环使用，避免重复同一块内存
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, width * height * 3, dtype=np.uint8).tobytes() for _ in range(count)]
+
+
+async def frame_source(frames, width, height, count):
+    # 不带时间戳，收到就处理，测的是单帧处理耗时
+    for i in range(count):
+        yield frames[i % len(frames)], width, height, None
+
+
+def synthetic_audio_events(blocks):
+    import numpy as np
+    from livekit import rtc
+
+    # 440Hz 正弦波，每块 10ms
+    t = np.arange(AUDIO_SAMPLES_PER_BLOCK * blocks) / AUDIO_SAMPLE_RATE
+    samples = (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16)
+    events = []
+    for i in range(blocks):
+        block = samples[i * AUDIO_SAMPLES_PER_BLOCK:(i + 1) * AUDIO_SAMPLES_PER_BLOCK].tobytes()
+        frame = rtc.AudioFrame(block, AUDIO_SAMPLE_RATE, 1, AUDIO_SAMPLES_PER_BLOCK)
+        events.append(rtc.AudioFrameEvent(frame))
+    return events
+
+
+def synthetic_tracks(count, toggled=False):
+    # toggled 时每 10 行有一行的订阅状态不同
+    tracks = []
+    for i in range(count):
+        tracks.append({
+            'participant': f"user-{i // 2:04d}",
+            'id': f"TR_{i:06d}",
+            'type': 'Audio' if i % 2 == 0 else 'Video',
+            'subscribed': toggled and i % 10 == 0,
+        })
+    return tracks
+
+
+async def wait_until(predicate, timeout=SETTLE_TIMEOUT):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("等待界面刷新超时")
+        await asyncio.sleep(0.001)
+
+
+def bench_video(widget, media, runs, results):
+    loop = asyncio.get_event_loop()
+    for width, height in VIDEO_SIZES:
+        size = f"{width}x{height}"
+        frames = synthetic_video(width, height)
+        track_id = f"bench-video-{size}"
+        widget.add_track("bench", track_id, "Video")
+
+        async def play():
+            await media.run(widget.play_video_frames(track_id, frame_source(frames, width, height,
+                                                                            VIDEO_FRAMES_PER_RUN)))
+
+        samples = loop.run_until_complete(measure_async(play, runs))
+        results[f"video.frame_to_qimage.{size}"] = summarize([s / VIDEO_FRAMES_PER_RUN for s in samples])
+
+        # 画面一直不变 (屏幕共享、幻灯片)：除第一帧外都被判为重复帧跳过
+        async def play_static():
+            await media.run(widget.play_video_frames(track_id, frame_source(frames[:1], width, height,
+                                                                            VIDEO_FRAMES_PER_RUN)))
+
+        samples = loop.run_until_complete(measure_async(play_static, runs))
+        results[f"video.static_frame.{size}"] = summarize([s / VIDEO_FRAMES_PER_RUN for s in samples])
+
+        # 界面线程上的部分：从帧缓冲池取出最新一帧，缩放画到画面上
+        from app.utils.frame_pool import FramePool
+        pool = FramePool(track_id)
+        widget.video_playing[track_id] = True
+
+        def show():
+            pool.publish(pool.acquire((height, width, 3)))
+            widget.show_frame(track_id, pool)
+
+        results[f"video.show_frame.{size}"] = summarize(measure(show, runs))
+        pool.close()
+        widget.stop_video_track(track_id)
+        widget.remove_track(track_id)
+
+
+def bench_audio(widget, media, runs, results):
+    from app.ui.widgets.subscribed_tracks_widget import audio_blocks
+
+    def null_sink():
+        # 代替声卡输出：只从播放队列取走数据，测的是计量和入队而不是设备
+        while widget.is_playing:
+            try:
+                widget.audio_queue.get(timeout=0.01)
+            except queue.Empty:
+                pass
+
+    widget._audio_playback_thread = null_sink
+    events = synthetic_audio_events(AUDIO_BLOCKS_PER_RUN)
+
+    async def play():
+        await media.run(widget.play_audio_blocks("bench-audio", audio_blocks(ScriptedStream(events))))
+
+    samples = asyncio.get_event_loop().run_until_complete(measure_async(play, runs))
+    results["audio.meter_and_queue"] = summarize([s / AUDIO_BLOCKS_PER_RUN for s in samples])
+
+
+def bench_wav(directory, runs, results):
+    from app.headless import recorder
+
+    events = synthetic_audio_events(WAV_SECONDS * AUDIO_SAMPLE_RATE // AUDIO_SAMPLES_PER_BLOCK)
+    loop = asyncio.get_event_loop()
+    counter = iter(range(10 ** 9))
+
+    async def record(writer=None):
+        # 每次用新的轨道名，避免同一秒内的文件名相同
+        await recorder.record_audio_stream(ScriptedStream(events), f"bench{next(counter)}", directory, writer)
+
+    results[f"wav.record_{WAV_SECONDS}s_direct"] = summarize(loop.run_until_complete(measure_async(record, runs)))
+    writer = recorder.RecordingWriter()
+    writer.start()
+    try:
+        samples = loop.run_until_complete(measure_async(lambda: record(writer), runs))
+    finally:
+        writer.stop()
+    results[f"wav.record_{WAV_SECONDS}s_writer"] = summarize(samples)
+
+
+def synthetic_i420(width, height):
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (height * 3 // 2, width), dtype=np.uint8)
+
+
+def decode_i420(i420):
+    # 代替解码：和 VideoStream 输出 RGB24 时一样做一次 I420 -> RGB 转换
+    import cv2
+
+    return cv2.cvtColor(i420, cv2.COLOR_YUV2RGB_I420)
+
+
+def ring_writer(name, width, height, fps, seconds):
+    # 工作进程：按帧率“解码”合成画面写进共享内存环
+    from app.utils.shm_ring import FrameRing
+
+    ring = FrameRing.attach(name)
+    i420 = synthetic_i420(width, height)
+    started = time.perf_counter()
+    tick = 0
+    while tick < fps * seconds:
+        ring.write(decode_i420(i420), width, height, 0)
+        tick += 1
+        delay = started + tick / fps - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    ring.mark_closed()
+    ring.close()
+
+
+def bench_workers(runs, results):
+    import multiprocessing
+
+    import numpy as np
+
+    from app.utils.frame_pool import FramePool
+    from app.utils.shm_ring import FrameRing
+
+    width, height = WORKER_VIDEO_SIZE
+    size = f"{width}x{height}"
+    frame = decode_i420(synthetic_i420(width, height))
+    shape = frame.shape
+
+    # 1. 界面进程读一帧：零拷贝读出后直接复制进帧缓冲池，对比先拷出共享内存再复制
+    ring = FrameRing.create(3, frame.nbytes)
+    ring.write(frame, width, height, 0)
+    pool = FramePool("bench-ring")
+    for copy in (False, True):
+        def read():
+            data, w, h, _ = ring.read_frame(0, copy=copy)
+            buffer = pool.acquire(shape)
+            np.copyto(buffer.array, np.frombuffer(data, dtype=np.uint8).reshape(shape))
+            if not ring.intact(0):
+                raise RuntimeError("读的过程中帧被覆盖")
+            pool.release(buffer)
+
+        name = "ring_copy_to_pool" if copy else "ring_to_pool"
+        results[f"workers.{name}.{size}"] = summarize(measure(read, runs * 10))
+    pool.close()
+    ring.close()
+
+    # 2. N 条轨道按 30fps 解码并交给界面进程：解码在本进程 (媒体线程上的协程) / 在 N 个工作进程里
+    loop = asyncio.get_event_loop()
+    ctx = multiprocessing.get_context('spawn')
+    i420 = synthetic_i420(width, height)
+
+    async def inprocess_track(pool, counts, index):
+        started = loop.time()
+        tick = 0
+        while tick < WORKER_FPS * PLAYBACK_SECONDS:
+            buffer = pool.acquire(shape)
+            np.copyto(buffer.array, decode_i420(i420))
+            pool.release(buffer)
+            counts[index] += 1
+            tick += 1
+            delay = started + tick / WORKER_FPS - loop.time()
+            await asyncio.sleep(max(delay, 0))
+
+    async def read_track(ring, pool, counts, index):
+        async for data, *_ in ring.frames(latest_only=True, copy=False):
+            buffer = pool.acquire(shape)
+            np.copyto(buffer.array, np.frombuffer(data, dtype=np.uint8).reshape(shape))
+            if ring.valid():
+                counts[index] += 1
+            pool.release(buffer)
+
+    for tracks in WORKER_TRACKS:
+        for mode in ("inprocess", "processes"):
+            cpu_samples, interval_samples = [], []
+            for _ in range(runs):
+                counts = [0] * tracks
+                pools = [FramePool(f"bench-worker-{i}") for i in range(tracks)]
+                rings, processes = [], []
+                if mode == "processes":
+                    for i in range(tracks):
+                        ring = FrameRing.create(3, frame.nbytes)
+                        process = ctx.Process(target=ring_writer, daemon=True,
+                                              args=(ring.name, width, height, WORKER_FPS, PLAYBACK_SECONDS))
+                        process.start()
+                        rings.append(ring)
+                        processes.append(process)
+                    # 子进程启动 (导入 numpy、cv2) 的时间不计入
+                    loop.run_until_complete(wait_until(lambda: all(r.written for r in rings)))
+                    coros = [read_track(ring, pools[i], counts, i) for i, ring in enumerate(rings)]
+                else:
+                    coros = [inprocess_track(pools[i], counts, i) for i in range(tracks)]
+                cpu = time.process_time()
+                started = time.perf_counter()
+                loop.run_until_complete(asyncio.gather(*coros))
+                elapsed = time.perf_counter() - started
+                cpu_samples.append((time.process_time() - cpu) / max(1, sum(counts)))
+                interval_samples.append(elapsed * tracks / max(1, sum(counts)))
+                for process in processes:
+                    process.join()
+                for ring in rings:
+                    ring.close()
+                for pool in pools:
+                    pool.close()
+            results[f"workers.{mode}_{tracks}_tracks.gui_cpu_per_frame"] = summarize(cpu_samples)
+            results[f"workers.{mode}_{tracks}_tracks.frame_interval"] = summarize(interval_samples)
+
+
+def bench_tracks_table(runs, results):
+    from app.ui.widgets.join_room_widget import JoinRoomWidget
+
+    widget = JoinRoomWidget()
+    widget.resize(900, 700)
+    widget.show()
+    viewport = widget.tracks_table.viewport()
+    for count in TABLE_SIZES:
+        tracks = synthetic_tracks(count)
+        toggled = synthetic_tracks(count, toggled=True)
+
+        def fill():
+            widget.update_tracks_table(tracks)
+            viewport.repaint()
+
+        samples = []
+        for _ in range(runs + 1):
+            widget.update_tracks_table([])
+            samples.append(measure(fill, 1, warmup=0)[0])
+        results[f"tracks_table.fill.{count}"] = summarize(samples[1:])
+
+        states = iter([toggled, tracks] * (runs + 1))
+
+        def toggle():
+            widget.update_tracks_table(next(states))
+            viewport.repaint()
+
+        results[f"tracks_table.update_10pct.{count}"] = summarize(measure(toggle, runs))
+        results[f"tracks_table.unchanged.{count}"] = summarize(measure(fill, runs))
+    widget.close()
+
+
+class FakeRoomService:
+    # 代替 api.LiveKitAPI 的 room 服务，list_rooms 返回固定数量的房间
+    def __init__(self, count):
+        from livekit import api
+
+        self.rooms = [api.Room(name=f"room-{i:04d}", num_participants=i % 50) for i in range(count)]
+
+    async def list_rooms(self, request):
+        from livekit import api
+
+        return api.ListRoomsResponse(rooms=self.rooms)
+
+
+class FakeLiveKitAPI:
+    def __init__(self, count):
+        self.room = FakeRoomService(count)
+
+
+def bench_room_list(runs, results):
+    from app.ui.widgets.room_management_widget import RoomManagementWidget
+
+    widget = RoomManagementWidget()
+    widget.resize(900, 700)
+    widget.show()
+    loop = asyncio.get_event_loop()
+    for count in TABLE_SIZES:
+        widget.livekit_client = FakeLiveKitAPI(count)
+
+        async def update():
+            await widget.update_room_list()
+            widget.room_table.viewport().repaint()
+
+        results[f"room_list.update.{count}"] = summarize(loop.run_until_complete(measure_async(update, runs)))
+    widget.livekit_client = None
+    widget.close()
+
+
+def bench_room_events(args, runs, results):
+    from app.ui.main_window import LiveKitManager
+
+    loop = asyncio.get_event_loop()
+    window = LiveKitManager()
+    window.show()
+    room = FakeRoom(loop=window.media.loop, media=MediaOptions(video_size=PLAYBACK_VIDEO_SIZE))
+    window.prewarmed = (FAKE_URL, room)
+    loop.run_until_complete(window.async_join_room(FAKE_URL, "fake-token"))
+    session = window.sessions.active
+    model = window.join_room.tracks_model
+    if args.scenario:
+        with open(args.scenario, encoding='utf-8') as f:
+            scenario = Scenario.from_dict(json.load(f))
+    else:
+        scenario = Scenario().join(args.participants, over=args.join_over).leave()
+    rendered = Counter()
+    show_frame = window.subscribed_tracks.show_frame
+
+    def counting_show_frame(track_id, pool):
+        rendered[track_id] += 1
+        show_frame(track_id, pool)
+
+    window.subscribed_tracks.show_frame = counting_show_frame
+
+    def play(scenario):
+        return loop.run_until_complete(window.media.run(scenario.play(room)))
+
+    async def playback(video_ids):
+        # 和点击“播放直播”/“停止播放”按钮一样，从界面线程开始和停止播放
+        for sid in video_ids:
+            window.on_play_track(sid, "Video")
+        await asyncio.sleep(PLAYBACK_SECONDS)
+        for sid in video_ids:
+            window.stop_track(sid, "Video")
+
+    def settle():
+        # 脚本的一步发完以后，等轨道表格的行数与房间里的轨道数一致
+        expected = sum(len(p.track_publications) for p in room.remote_participants.values())
+        started = time.perf_counter()
+        loop.run_until_complete(wait_until(lambda: model.rowCount() == expected))
+        return time.perf_counter() - started
+
+    samples = {}
+    try:
+        # 1. 房间事件：只发布不订阅，测事件处理和表格刷新
+        room.auto_subscribe = False
+        for _ in range(runs):
+            window.loop_monitor.max_lag = 0.0
+            cpu, calls = session.handler_cpu, session.handler_calls
+            names = set()
+            for index, step in enumerate(play_steps(scenario)):
+                reports = play(step)
+                if not reports:
+                    continue
+                report = reports[0]
+                prefix = f"e2e.{report['action']}_{report['count']}"
+                if prefix in names:
+                    prefix = f"{prefix}_step{index}"
+                names.add(prefix)
+                samples.setdefault(f"{prefix}.emit", []).append(report['seconds'])
+                samples.setdefault(f"{prefix}.settle", []).append(settle())
+                samples.setdefault(f"{prefix}.emit_late", []).append(report['max_late'])
+            samples.setdefault("e2e.handler_cpu_per_event", []).append(
+                (session.handler_cpu - cpu) / max(1, session.handler_calls - calls))
+            samples.setdefault("e2e.ui_loop_max_lag", []).append(window.loop_monitor.max_lag)
+
+        # 2. 播放：自动订阅，假流按帧率产出画面，测实际渲染间隔 (越接近 1/帧率越好)
+        if args.play:
+            room.auto_subscribe = True
+            play(Scenario(prefix="player").join(args.play))
+            settle()
+            video_ids = [sid for sid, entry in session.track_index.tracks.items()
+                         if entry.kind == TrackKind.KIND_VIDEO]
+            for _ in range(runs):
+                rendered.clear()
+                window.loop_monitor.max_lag = 0.0
+                loop.run_until_complete(playback(video_ids))
+                frames = sum(rendered[sid] for sid in video_ids)
+                samples.setdefault(f"e2e.playback_{len(video_ids)}_tracks.frame_interval", []).append(
+                    PLAYBACK_SECONDS * len(video_ids) / max(1, frames))
+                samples.setdefault(f"e2e.playback_{len(video_ids)}_tracks.ui_loop_max_lag", []).append(
+                    window.loop_monitor.max_lag)
+            play(Scenario().leave())
+            settle()
+    finally:
+        loop.run_until_complete(window.async_leave_room(session.key))
+        window.history.close()
+        window.loop_monitor.stop()
+        window.media.stop()
+        window.close()
+
+    for name, values in samples.items():
+        results[name] = summarize(values)
+
+
+def play_steps(scenario):
+    # 把脚本拆成单步，每步之后单独等待界面刷新
+    for step in scenario.steps:
+        single = Scenario(scenario.prefix)
+        single.steps.append(step)
+        yield single
+
+
+def run_suite(args, workdir):
+    from app.ui.widgets.subscribed_tracks_widget import SubscribedTracksWidget
+    from app.utils.media_loop import MediaLoop
+
+    results = {}
+    selected = lambda group: not args.only or any(group.startswith(name) for name in args.only)
+    media = MediaLoop(name="bench-media")
+    media.start()
+    try:
+        if selected('video') or selected('audio'):
+            widget = SubscribedTracksWidget()
+            widget.resize(900, 700)
+            widget.show()
+            if selected('video'):
+                bench_video(widget, media, args.runs, results)
+            if selected('audio'):
+                bench_audio(widget, media, args.runs, results)
+            widget.latency_timer.stop()
+            widget.close()
+        if selected('wav'):
+            bench_wav(os.path.join(workdir, "recorded_audio"), args.runs, results)
+        if selected('workers'):
+            bench_workers(args.runs, results)
+        if selected('tracks_table'):
+            bench_tracks_table(args.runs, results)
+        if selected('room_list'):
+            bench_room_list(args.runs, results)
+        if selected('e2e'):
+            bench_room_events(args, args.runs, results)
+    finally:
+        media.stop()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="媒体热路径基准 (合成数据，不需要网络)")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--participants', type=int, default=200, help="端到端场景中一批入会的参与者数")
+    parser.add_argument('--join-over', type=float, default=0.0, help="这批参与者在多少秒内均匀入会，0 为一次性入会")
+    parser.add_argument('--scenario', help="端到端场景的 JSON 脚本，代替 --participants/--join-over")
+    parser.add_argument('--play', type=int, default=4, help="端到端场景中同时播放画面的参与者数")
+    parser.add_argument('--only', nargs='*', help="只跑这些组: video audio wav workers tracks_table room_list e2e")
+    parser.add_argument('--output', help="结果 JSON 文件，不指定时打印到标准输出")
+    parser.add_argument('--history', help="每次结果追加一行到这个 JSONL 文件，用于跨版本对比")
+    parser.add_argument('--compare', help="与这份基线报告对比，有退化时退出码为 1")
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    # 输出文件路径相对于启动目录；日志、历史数据库和录音写到临时目录，跑完删掉
+    output = os.path.abspath(args.output) if args.output else None
+    history = os.path.abspath(args.history) if args.history else None
+    baseline = load_report(args.compare) if args.compare else None
+    if args.scenario:
+        args.scenario = os.path.abspath(args.scenario)
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    workdir = tempfile.mkdtemp(prefix="livekit-bench-")
+    os.chdir(workdir)
+
+    from PyQt5.QtWidgets import QApplication
+    from qasync import QEventLoop
+
+    app = QApplication(sys.argv)
+    loop = QEventLoop(app)
+    asyncio.set_event_loop(loop)
+    try:
+        with loop, patch_streams():
+            results = run_suite(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = make_report('media', args.runs, results, participants=args.participants, join_over=args.join_over,
+                         scenario=args.scenario, play=args.play)
+    write_report(report, output, history)
+    if baseline is not None:
+        rows = compare_reports(baseline, report, args.threshold)
+        print(format_comparison(rows, baseline, report), file=sys.stderr)
+        if any(row[4] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
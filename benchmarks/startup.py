@@ -0,0 +1,134 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import ROOT, make_report, summarize, write_report
+
+# 启动耗时基准：每轮在新进程里启动主窗口，记录导入、构建窗口和首次绘制的耗时，
+# 另外用 python -X importtime 找出最慢的模块。结果写成 JSON，可以按提交对比。
+# 用法: python -m benchmarks.startup --runs 5 --output startup.json [--history startup_history.jsonl]
+PAINT_TIMEOUT = 20.0
+
+
+def measure_child():
+    # 子进程：各阶段相对解释器开始执行本脚本的时间 (秒)，以一行 JSON 输出
+    started = time.perf_counter()
+    from PyQt5.QtCore import QEvent, QObject
+    from PyQt5.QtWidgets import QApplication
+    from qasync import QEventLoop
+    from qfluentwidgets import setTheme, Theme
+
+    app = QApplication(sys.argv)
+    loop = QEventLoop(app)
+    asyncio.set_event_loop(loop)
+    qt_ready = time.perf_counter()
+
+    from app.ui.main_window import LiveKitManager
+    imported = time.perf_counter()
+
+    setTheme(Theme.DARK)
+    window = LiveKitManager()
+    constructed = time.perf_counter()
+
+    painted = loop.create_future()
+
+    class PaintWatcher(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint and not painted.done():
+                painted.set_result(time.perf_counter())
+            return False
+
+    watcher = PaintWatcher()
+    window.installEventFilter(watcher)
+    window.show()
+    with loop:
+        first_paint = loop.run_until_complete(asyncio.wait_for(painted, PAINT_TIMEOUT))
+        window.loop_monitor.stop()
+        window.media.stop()
+
+    print(json.dumps({
+        'qt_init': qt_ready - started,
+        'import': imported - qt_ready,
+        'construct': constructed - imported,
+        'first_paint': first_paint - started,
+        'modules': len(sys.modules),
+    }))
+    sys.stdout.flush()
+    # 不走正常退出流程，避免 Qt 对象析构顺序的噪声计入下一轮
+    os._exit(0)
+
+
+def child_env():
+    # 子进程在临时目录里运行 (主窗口会在当前目录创建 livekit_history.db 和 livekit_manager.log)，
+    # 通过 PYTHONPATH 找到仓库里的模块
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+    return env
+
+
+def run_once(workdir):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-m', 'benchmarks.startup', '--child'], cwd=workdir, env=child_env(),
+                            capture_output=True, text=True, timeout=PAINT_TIMEOUT * 2)
+    wall = time.perf_counter() - started
+    lines = [line for line in result.stdout.splitlines() if line.startswith('{')]
+    if result.returncode != 0 or not lines:
+        raise RuntimeError(f"启动基准子进程失败 (退出码 {result.returncode}):\n{result.stderr[-2000:]}")
+    sample = json.loads(lines[-1])
+    sample['process_wall'] = wall
+    return sample
+
+
+def slowest_imports(workdir, limit=15):
+    # -X importtime 输出到 stderr: "import time: self [us] | cumulative | imported package"
+    code = "from PyQt5.QtWidgets import QApplication; from app.ui.main_window import LiveKitManager"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=workdir, env=child_env(),
+                            capture_output=True, text=True)
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        # 按顶层包统计 (qfluentwidgets、livekit、numpy 等)，包内子模块的耗时已经计入包的 cumulative
+        if '.' not in name and name not in packages:
+            packages[name] = int(cumulative_us) / 1000
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [{'module': name, 'cumulative_ms': ms} for name, ms in slowest]
+
+
+def summarize_samples(samples):
+    summary = {}
+    for key in samples[0]:
+        values = [sample[key] for sample in samples]
+        if key == 'modules':
+            summary[key] = max(values)
+            continue
+        summary[key] = summarize(values)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="主窗口启动耗时基准")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', help="结果 JSON 文件，不指定时打印到标准输出")
+    parser.add_argument('--history', help="每次结果追加一行到这个 JSONL 文件，用于跨版本对比")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        measure_child()
+        return
+
+    with tempfile.TemporaryDirectory(prefix="livekit-startup-") as workdir:
+        samples = [run_once(workdir) for _ in range(args.runs)]
+        report = make_report('startup', args.runs, summarize_samples(samples), slowest_imports=slowest_imports(workdir))
+    write_report(report, args.output, args.history)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import signal
+import sys
+import traceback
+
+from app.core.subscription_policy import SubscriptionPolicy
+from app.headless.recorder_daemon import RecorderDaemon
+from app.headless.runtime import HeadlessRuntime
+from app.services.livekit_service import make_access_token
+from app.utils.logger import logger
+from app.utils.metrics import start_exporters
+
+
+def add_connection_args(parser):
+    parser.add_argument('--url', required=True, help="LiveKit 服务器 URL，例如 ws://localhost:7880")
+    parser.add_argument('--token', help="访问令牌；不提供时用 API key/secret 生成")
+    parser.add_argument('--api-key', help="LiveKit API key")
+    parser.add_argument('--api-secret', help="LiveKit API secret")
+    parser.add_argument('--room', help="房间名 (生成令牌时需要)")
+    parser.add_argument('--identity', default="headless-client", help="参与者身份 (生成令牌时使用)")
+    parser.add_argument('--metrics-port', type=int, help="在 127.0.0.1 的该端口提供 Prometheus 文本格式的 /metrics 接口")
+    parser.add_argument('--metrics-json', metavar='FILE', help="定期把指标快照写入该 JSON 文件")
+    parser.add_argument('--metrics-interval', type=float, default=10.0, help="JSON 指标快照的写入间隔 (秒)")
+    parser.add_argument('--profile-output', metavar='FILE',
+                        help="退出时 (或收到 SIGUSR1 时) 把事件循环卡顿的调用栈采样写成火焰图 collapsed 格式")
+
+
+def resolve_token(args, **grants):
+    if args.token:
+        return args.token
+    if not (args.api_key and args.api_secret and args.room):
+        raise SystemExit("需要 --token，或者同时提供 --api-key、--api-secret 和 --room")
+    return make_access_token(args.api_key, args.api_secret, args.room, args.identity, **grants)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="LiveKit 无界面客户端")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    join = commands.add_parser('join', help="加入房间，可选录制远程轨道和发布本地音频文件")
+    add_connection_args(join)
+    join.add_argument('--subscribe', choices=['all', 'none', 'audio', 'speakers'], default='all',
+                      help="订阅策略：全部、不订阅、只订阅音频、音频 + 活跃发言者视频")
+    join.add_argument('--max-video', type=int, default=4, help="speakers 策略下最多订阅几路视频")
+    join.add_argument('--allow', action='append', default=[], metavar='IDENTITY', help="只订阅这些参与者，可重复指定")
+    join.add_argument('--deny', action='append', default=[], metavar='IDENTITY', help="不订阅这些参与者，可重复指定")
+    join.add_argument('--record', action='store_true', help="录制所有已订阅的轨道")
+    join.add_argument('--output-dir', default='.', help="录制文件保存目录")
+    join.add_argument('--publish', action='append', default=[], metavar='FILE', help="发布音频文件，可重复指定")
+    join.add_argument('--no-loop', action='store_true', help="音频文件播放一遍后停止")
+    join.add_argument('--duration', type=float, help="运行多少秒后退出，默认一直运行")
+    join.set_defaults(handler=run_join)
+
+    record = commands.add_parser('record', help="常驻录制：自动录制房间内所有轨道，房间空了之后退出")
+    add_connection_args(record)
+    record.set_defaults(identity="recorder")
+    record.add_argument('--output-dir', default='.', help="录制文件保存目录")
+    record.add_argument('--audio-only', action='store_true', help="只录制音频轨道")
+    record.add_argument('--fps', type=int, default=15, help="视频录制帧率")
+    record.add_argument('--idle-timeout', type=float, default=30.0, help="房间里没有其他参与者多少秒后退出")
+    record.add_argument('--wait-timeout', type=float, default=300.0, help="启动后等待第一个参与者的最长时间 (秒)")
+    record.add_argument('--stats-interval', type=float, default=60.0, help="打印资源统计的间隔 (秒)")
+    record.set_defaults(handler=run_record)
+
+    return parser
+
+
+def install_stop_handlers(runtime, profile_output=None):
+    loop = asyncio.get_running_loop()
+    handlers = [(signal.SIGINT, runtime.request_stop), (signal.SIGTERM, runtime.request_stop)]
+    if profile_output and hasattr(signal, 'SIGUSR1'):
+        handlers.append((signal.SIGUSR1, lambda: runtime.loop_monitor.dump_collapsed(profile_output)))
+    for sig, handler in handlers:
+        try:
+            loop.add_signal_handler(sig, handler)
+        except (NotImplementedError, RuntimeError):
+            # Windows 上的事件循环不支持信号处理，Ctrl+C 时直接抛 KeyboardInterrupt
+            pass
+
+
+def dump_profile(runtime, profile_output):
+    if profile_output:
+        runtime.loop_monitor.dump_collapsed(profile_output)
+
+
+async def run_join(args):
+    policy = SubscriptionPolicy.from_name(args.subscribe, max_video=args.max_video, allow=args.allow, deny=args.deny)
+    runtime = HeadlessRuntime(args.url, resolve_token(args), subscribe=policy, record=args.record,
+                              output_dir=args.output_dir, publish=args.publish, loop_publish=not args.no_loop)
+    install_stop_handlers(runtime, args.profile_output)
+    await runtime.run(args.duration)
+    dump_profile(runtime, args.profile_output)
+    if runtime.recordings:
+        logger.info(f"共保存 {len(runtime.recordings)} 个录制文件")
+
+
+async def run_record(args):
+    # 自行生成令牌时录制端对其他参与者不可见，也不发布任何轨道
+    token = resolve_token(args, hidden=True, can_publish=False)
+    daemon = RecorderDaemon(args.url, token, output_dir=args.output_dir, idle_timeout=args.idle_timeout,
+                            wait_timeout=args.wait_timeout, stats_interval=args.stats_interval,
+                            audio_only=args.audio_only, fps=args.fps)
+    install_stop_handlers(daemon, args.profile_output)
+    await daemon.run()
+    dump_profile(daemon, args.profile_output)
+    logger.info(f"共保存 {len(daemon.recordings)} 个录制文件")
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # 不指定时读取 LIVEKIT_METRICS_PORT / LIVEKIT_METRICS_JSON；都没有时指标采集保持关闭
+    exporters = start_exporters(args.metrics_port, args.metrics_json, args.metrics_interval)
+    try:
+        asyncio.run(args.handler(args))
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        logger.error(f"运行失败: \n{traceback.format_exc()}")
+        return 1
+    finally:
+        for exporter in exporters:
+            exporter.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
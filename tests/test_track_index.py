@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from livekit.rtc import TrackKind
+
+from app.core.track_index import TrackIndex, TrackIndexError
+from benchmarks.fake_room import FakeRoom
+
+EVENTS = {
+    "participant_connected": "add_participant",
+    "participant_disconnected": "remove_participant",
+    "track_published": "add_publication",
+    "track_unpublished": "remove_publication",
+}
+
+
+@pytest.fixture
+def room():
+    loop = asyncio.new_event_loop()
+    yield FakeRoom(loop=loop)
+    loop.close()
+
+
+def bind(room, index, events=EVENTS):
+    # 和 LiveKitManager 一样由房间事件增量维护索引；check_consistency 打开后每次更新都和全量扫描对比。
+    # EventEmitter 会吞掉回调里的异常，检查失败记在返回的列表里
+    errors = []
+
+    def handler(update):
+        def handle(*args):
+            try:
+                update(*args)
+            except TrackIndexError as e:
+                errors.append(e)
+        return handle
+
+    for event in events:
+        room.on(event, handler(getattr(index, EVENTS[event])))
+    return errors
+
+
+def test_events_keep_index_consistent(room):
+    room.add_participant("alice")
+    index = TrackIndex(check_consistency=True)
+    index.rebuild(room)
+    errors = bind(room, index)
+
+    bob = room.add_participant("bob")
+    screen = room.publish(bob, TrackKind.KIND_VIDEO, name="screen")
+    assert index.get(screen.sid).participant is bob
+    assert len(index.tracks_of("bob")) == 3
+
+    room.unpublish(bob, screen)
+    assert screen.sid not in index
+
+    room.remove_participant("alice")
+    assert index.get_participant("alice") is None
+    assert set(index.participants) == {"bob"}
+    assert len(index) == 2
+
+    room.remove_participant("bob")
+    assert len(index) == 0
+    assert errors == []
+    index.verify(room)
+
+
+def test_missed_event_is_reported(room):
+    index = TrackIndex(check_consistency=True)
+    index.rebuild(room)
+    # 只监听了入会事件：发布轨道时索引落下，下一次更新的检查会发现
+    errors = bind(room, index, events=["participant_connected"])
+
+    carol = room.add_participant("carol", kinds=())
+    room.publish(carol, TrackKind.KIND_AUDIO)
+    assert errors == []
+    room.add_participant("dave", kinds=())
+    assert len(errors) == 1
+    assert "索引缺少轨道" in str(errors[0])